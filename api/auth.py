@@ -1,20 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, delete, insert
 from pydantic import BaseModel
-from typing import List, Optional, Dict
+from typing import List, NamedTuple, Optional, Dict, Tuple
 from enum import Enum
 import jwt
+from cryptography.exceptions import InvalidTag
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from functools import lru_cache
+import asyncio
+import hashlib
+import ipaddress
 import os
 import json
+import time
 
 from secure_vault.core.database import get_db
-from secure_vault.models.models import User, RecoveryQuestions, AuditLog
+from secure_vault.models.models import User, RecoveryQuestions
+from secure_vault.models.schemas import PasswordStrengthRequest
+from secure_vault.core.audit import record_audit
 from secure_vault.core.crypto import CryptoSystem
+from secure_vault.core.ratelimit import get_rate_limiter
+from secure_vault.core.rotation import RotationInProgress, latest_rotation, start_rotation
 from secure_vault.utils.password import PasswordValidator
 from secure_vault.core.config import get_settings
+from secure_vault.utils.cache import LRUCache
+from secure_vault.utils.http import etag_matches
+from secure_vault.utils.metrics import metrics
 
 class Language(str, Enum):
     DE = "de"
@@ -278,12 +292,184 @@ RECOVERY_QUESTIONS = [
     })
 ]
 
+QUESTIONS_BY_ID: Dict[int, RecoveryQuestion] = {q.id: q for q in RECOVERY_QUESTIONS}
+
+
+class QuestionCatalogue(NamedTuple):
+    """Fertig serialisierte Antwort von GET /auth/recovery-questions"""
+    questions: Tuple[Dict, ...]
+    body: bytes
+    etag: str
+
+
+def _build_catalogue(lang: Language) -> QuestionCatalogue:
+    questions = tuple(
+        {"id": q.id, "question": q.translations[lang.value]}
+        for q in RECOVERY_QUESTIONS
+    )
+    body = json.dumps(
+        {"questions": questions},
+        ensure_ascii=False,
+        separators=(",", ":")
+    ).encode()
+    return QuestionCatalogue(questions, body, f'"{hashlib.sha256(body).hexdigest()}"')
+
+
+# Ändert sich nur mit einem Deployment, daher einmal beim Import
+QUESTION_CATALOGUE: Dict[Language, QuestionCatalogue] = {
+    lang: _build_catalogue(lang) for lang in Language
+}
+
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 settings = get_settings()
 crypto = CryptoSystem()
 password_validator = PasswordValidator(settings)
 
+
+@dataclass(frozen=True)
+class Principal:
+    """Schlanke Projektion des angemeldeten Benutzers für die Autorisierung.
+
+    Enthält bewusst weder ``master_key_encrypted`` noch ``public_key``;
+    Endpunkte, die den vollständigen Benutzer ändern, laden ihn selbst.
+    """
+    user_id: str
+    password_hash: str
+    session_id: Optional[str] = None  # jti des Tokens
+
+
+# Token-Hash -> Principal; die TTL begrenzt, wie lange ein anderer Worker
+# nach einer Passwortänderung noch den alten Stand sieht
+_principal_cache = LRUCache(
+    maxsize=settings.principal_cache_size,
+    ttl=settings.principal_cache_ttl_seconds
+)
+
+_credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"}
+)
+
+
+@lru_cache()
+def _proxy_networks(proxies: Tuple[str, ...]) -> tuple:
+    return tuple(ipaddress.ip_network(proxy, strict=False) for proxy in proxies)
+
+
+def _is_trusted_proxy(address: str, networks: tuple) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+
+def client_ip(request: Request) -> Optional[str]:
+    """Client-Adresse für das Rate Limiting.
+
+    ``X-Forwarded-For`` zählt nur, wenn die Verbindung von einer Adresse
+    aus ``trusted_proxies`` kommt. Dann gilt der rechteste Eintrag, der
+    kein vertrauenswürdiger Proxy ist; alles links davon kann der Client
+    selbst gesetzt haben.
+    """
+    host = request.client.host if request.client else None
+    networks = _proxy_networks(tuple(settings.trusted_proxies))
+    if host is None or not networks or not _is_trusted_proxy(host, networks):
+        return host
+
+    forwarded = [
+        address.strip()
+        for header in request.headers.getlist("x-forwarded-for")
+        for address in header.split(",")
+        if address.strip()
+    ]
+    for address in reversed(forwarded):
+        if not _is_trusted_proxy(address, networks):
+            return address
+    return forwarded[0] if forwarded else host
+
+
+def _token_cache_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+def invalidate_principal(user_id: str) -> int:
+    """Entfernt alle gecachten Principals und entsperrten Private Keys
+    eines Benutzers"""
+    crypto.lock_user(user_id)
+    return _principal_cache.invalidate(lambda key, principal: principal.user_id == user_id)
+
+
+async def _authenticate(token: str, db: AsyncSession) -> Principal:
+    cache_key = _token_cache_key(token)
+    principal = _principal_cache.get(cache_key)
+    if principal is not None:
+        metrics.increment("auth.principal_cache.hits")
+        return principal
+    metrics.increment("auth.principal_cache.misses")
+
+    try:
+        payload = jwt.decode(token, crypto.jwt_secret, algorithms=["HS256"])
+    except jwt.PyJWTError:
+        raise _credentials_exception
+    user_id = payload.get("sub")
+    if not user_id:
+        raise _credentials_exception
+
+    row = (await db.execute(
+        select(User.user_id, User.password_hash).where(User.user_id == user_id)
+    )).first()
+    if row is None:
+        raise _credentials_exception
+
+    principal = Principal(
+        user_id=row.user_id,
+        password_hash=row.password_hash,
+        session_id=payload.get("jti")
+    )
+    # Nie länger cachen, als das Token gültig ist
+    ttl = min(settings.principal_cache_ttl_seconds, payload["exp"] - time.time())
+    if ttl > 0:
+        _principal_cache.set(cache_key, principal, ttl=ttl)
+    return principal
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+) -> Principal:
+    """Authentifiziert den Request anhand des Bearer-Tokens"""
+    return await _authenticate(token, db)
+
+
+async def get_optional_user(
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+) -> Optional[Principal]:
+    """Wie get_current_user, aber None für anonyme Requests"""
+    if not token:
+        return None
+    return await _authenticate(token, db)
+
+
+async def unlock_master_key(user: User, password: str) -> bytes:
+    """Entsperrt den Master Key (KEK) eines Benutzers mit seinem Passwort"""
+    if user.master_salt is None or user.master_key_wrapped is None:
+        # Konten aus der Zeit vor der Schlüsselhierarchie: das Salt für den
+        # Passwort-Schlüssel wurde nie gespeichert, ihr Private Key lässt
+        # sich serverseitig nicht mehr entsperren
+        raise HTTPException(
+            status_code=409,
+            detail="Key material not available for this account"
+        )
+    try:
+        return await crypto.unlock_master_key(password, user.master_salt, user.master_key_wrapped)
+    except InvalidTag:
+        raise HTTPException(status_code=401, detail="Invalid password")
+
 class RecoverySystem:
     def __init__(self, crypto: CryptoSystem, db: AsyncSession):
         self.crypto = crypto
@@ -293,52 +479,55 @@ class RecoverySystem:
 
     def get_available_questions(self, lang: Language) -> List[Dict]:
         """Gibt alle verfügbaren Fragen in der gewählten Sprache zurück"""
-        return [
-            {
-                "id": q.id,
-                "question": q.translations[lang]
-            }
-            for q in RECOVERY_QUESTIONS
-        ]
+        return list(QUESTION_CATALOGUE[lang].questions)
 
     async def setup_questions(
         self,
         user: User,
+        master_key: bytes,
         question_answers: List[Dict[str, str]]  # [{"question_id": int, "answer": str}]
     ):
         """Speichert die Recovery-Fragen und Antworten"""
         if len(question_answers) < self.min_questions:
             raise ValueError(f"At least {self.min_questions} questions required")
 
-        # Lösche alte Fragen falls vorhanden
-        await self.db.execute(
-            delete(RecoveryQuestions).where(RecoveryQuestions.user_id == user.user_id)
+        # Sortiert wie in get_user_questions/verify_answers
+        question_answers = sorted(
+            ({"question_id": int(qa["question_id"]), "answer": qa["answer"]} for qa in question_answers),
+            key=lambda qa: qa["question_id"]
         )
+        question_ids = [qa["question_id"] for qa in question_answers]
+        if len(set(question_ids)) != len(question_ids):
+            raise ValueError("Questions must be distinct")
+        if not all(question_id in QUESTIONS_BY_ID for question_id in question_ids):
+            raise ValueError("Unknown question")
 
-        # Kombiniere alle Antworten für den Recovery-Key
+        # Alle Antwort-Hashes und den Recovery-Key gleichzeitig im KDF-Pool
         answers = [qa["answer"] for qa in question_answers]
-        recovery_key = self.crypto.derive_key_from_answers(answers)
-
-        # Hole und verschlüssele Master-Key
-        master_key = self.crypto.decrypt_master_key(
-            user.master_key_encrypted,
-            user.current_password_key
+        recovery_salt = os.urandom(16)
+        answer_hashes, recovery_key = await asyncio.gather(
+            self.crypto.hash_answers_async(answers),
+            self.crypto.derive_key_from_answers_async(answers, recovery_salt)
         )
-        encrypted_master_key = self.crypto.encrypt_master_key(
+
+        # Master Key zusätzlich mit dem Recovery-Key verpacken
+        encrypted_master_key = self.crypto.wrap_master_key(
             master_key,
-            recovery_key
+            recovery_key,
+            user.key_id or 1
         )
 
-        # Speichere Fragen und verschlüsselten Master-Key
-        for qa in question_answers:
-            question = RecoveryQuestions(
-                user_id=user.user_id,
-                question_id=qa["question_id"],
-                answer_hash=self.crypto.hash_answer(qa["answer"])
-            )
-            self.db.add(question)
+        # Alte Fragen ersetzen, neue in einem Statement einfügen
+        await self.db.execute(
+            delete(RecoveryQuestions).where(RecoveryQuestions.user_id == user.user_id)
+        )
+        await self.db.execute(insert(RecoveryQuestions), [
+            {"user_id": user.user_id, "question_id": question_id, "answer_hash": answer_hash}
+            for question_id, answer_hash in zip(question_ids, answer_hashes)
+        ])
 
         user.recovery_key_encrypted = encrypted_master_key
+        user.recovery_salt = recovery_salt.hex()
         user.has_recovery = True
         await self.db.commit()
 
@@ -348,15 +537,16 @@ class RecoverySystem:
         lang: Language
     ) -> List[str]:
         """Holt die Fragen eines Users in der gewünschten Sprache"""
-        questions = await self.db.execute(
-            select(RecoveryQuestions)
+        question_ids = (await self.db.execute(
+            select(RecoveryQuestions.question_id)
             .where(RecoveryQuestions.user_id == user_id)
-        )
-        questions = questions.scalars().all()
+            .order_by(RecoveryQuestions.question_id)
+        )).scalars().all()
 
         return [
-            RECOVERY_QUESTIONS[q.question_id].translations[lang]
-            for q in questions
+            QUESTIONS_BY_ID[question_id].translations[lang.value]
+            for question_id in question_ids
+            if question_id in QUESTIONS_BY_ID
         ]
 
     async def verify_answers(
@@ -365,46 +555,48 @@ class RecoverySystem:
         answers: List[str]
     ) -> Tuple[bool, Optional[bytes]]:
         """Verifiziert die Antworten und gibt den Master-Key zurück"""
-        questions = await self.db.execute(
-            select(RecoveryQuestions)
+        user = await self.db.get(User, user_id)
+        if user is None or not user.recovery_key_encrypted or not user.recovery_salt:
+            return False, None
+
+        answer_hashes = (await self.db.execute(
+            select(RecoveryQuestions.answer_hash)
             .where(RecoveryQuestions.user_id == user_id)
             .order_by(RecoveryQuestions.question_id)
-        )
-        questions = questions.scalars().all()
+        )).scalars().all()
 
-        if not questions:
+        if not answer_hashes or len(answers) != len(answer_hashes):
             return False, None
 
-        correct_answers = 0
-        for q, answer in zip(questions, answers):
-            if self.crypto.verify_answer(answer, q.answer_hash):
-                correct_answers += 1
+        # Einzelprüfungen und Recovery-Key parallel: ein Await, Latenz
+        # einer Ableitung, solange der KDF-Pool genug Worker hat
+        matches, recovery_key = await asyncio.gather(
+            self.crypto.verify_answers_async(answers, answer_hashes),
+            self.crypto.derive_key_from_answers_async(answers, bytes.fromhex(user.recovery_salt))
+        )
 
-        if correct_answers < self.required_correct_answers:
+        if sum(matches) < self.required_correct_answers:
             return False, None
 
-        recovery_key = self.crypto.derive_key_from_answers(answers)
-        
-        user = await self.db.execute(
-            select(User).where(User.user_id == user_id)
-        )
-        user = user.scalar_one_or_none()
-
         try:
-            master_key = self.crypto.decrypt_master_key(
+            master_key = self.crypto.unwrap_master_key(
                 user.recovery_key_encrypted,
                 recovery_key
             )
             return True, master_key
-        except:
+        except Exception:
             return False, None
 
 @router.post("/auth")
 async def authenticate(
+    request: Request,
     user_id: str,
     password: str,
     db: AsyncSession = Depends(get_db)
 ):
+    rate_limiter = get_rate_limiter()
+    # Vor jeder KDF- und Datenbankarbeit
+    await rate_limiter.check("login", user_id, client_ip(request))
     try:
         user = await db.execute(
             select(User).where(User.user_id == user_id)
@@ -415,19 +607,22 @@ async def authenticate(
         needs_recovery_setup = False
 
         if not user:
-            is_valid, message = password_validator.validate(password)
+            is_valid, message = await password_validator.validate_async(password)
             if not is_valid:
                 raise HTTPException(
                     status_code=400,
                     detail=message
                 )
             
-            keys = crypto.generate_user_keys(password)
+            keys = await crypto.generate_user_keys_async(password)
             user = User(
                 user_id=user_id,
-                password_hash=crypto.hash_password(password),
+                password_hash=await crypto.hash_password_async(password),
                 master_key_encrypted=keys['master_key_encrypted'],
+                master_salt=keys['master_salt'],
+                master_key_wrapped=keys['master_key_wrapped'],
                 public_key=keys['public_key'],
+                key_id=keys['key_id'],
                 has_recovery=False,
                 created_at=datetime.utcnow()
             )
@@ -435,13 +630,9 @@ async def authenticate(
             is_new_user = True
             needs_recovery_setup = True
         else:
-            if not crypto.verify_password(password, user.password_hash):
-                log = AuditLog(
-                    user_id=user_id,
-                    action="failed_login",
-                    success=False
-                )
-                db.add(log)
+            if not await crypto.verify_password_async(password, user.password_hash):
+                await rate_limiter.failed("login", user_id)
+                record_audit(db, "failed_login", user_id=user_id, success=False)
                 await db.commit()
                 raise HTTPException(
                     status_code=401,
@@ -449,17 +640,16 @@ async def authenticate(
                 )
 
             needs_recovery_setup = not user.has_recovery
+            await rate_limiter.succeeded("login", user_id)
 
         user.last_login = datetime.utcnow()
         access_token = crypto.create_access_token(user.user_id)
         
-        log = AuditLog(
+        record_audit(
+            db, "login",
             user_id=user_id,
-            action="login",
-            success=True,
             details="new_user" if is_new_user else "existing_user"
         )
-        db.add(log)
         
         await db.commit()
         
@@ -474,40 +664,55 @@ async def authenticate(
         await db.rollback()
         raise
 
+@router.post("/auth/password-strength")
+async def check_password_strength(request: PasswordStrengthRequest):
+    """Live-Bewertung eines Passwort-Kandidaten (z.B. bei jeder Eingabe);
+    das Passwort wird weder gespeichert noch geloggt"""
+    is_valid, message = await password_validator.validate_async(request.password)
+    feedback = await password_validator.generate_feedback_async(request.password)
+    return {
+        **feedback,
+        "is_valid": is_valid,
+        "message": message
+    }
+
 @router.get("/auth/recovery-questions")
 async def get_recovery_questions(
-    lang: Language = Language.EN
+    lang: Language = Language.EN,
+    if_none_match: Optional[str] = Header(None)
 ):
-    """Gibt alle verfügbaren Recovery-Fragen zurück"""
-    recovery_system = RecoverySystem(crypto, None)
-    return {
-        "questions": recovery_system.get_available_questions(lang)
+    """Gibt alle verfügbaren Recovery-Fragen zurück (vorberechnet, per
+    ETag und Cache-Control cachebar)"""
+    catalogue = QUESTION_CATALOGUE[lang]
+    headers = {
+        "ETag": catalogue.etag,
+        "Cache-Control": f"public, max-age={settings.recovery_questions_max_age_seconds}"
     }
+    if etag_matches(if_none_match, catalogue.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=catalogue.body, media_type="application/json", headers=headers)
 
 @router.post("/auth/setup-recovery")
 async def setup_recovery(
     question_answers: List[Dict[str, str]],  # [{"question_id": int, "answer": str}]
     current_password: str,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Richtet Recovery-Fragen für einen Benutzer ein"""
     try:
-        if not crypto.verify_password(current_password, current_user.password_hash):
+        if not await crypto.verify_password_async(current_password, current_user.password_hash):
             raise HTTPException(
                 status_code=401,
                 detail="Invalid password"
             )
             
+        user = await db.get(User, current_user.user_id)
+        master_key = await unlock_master_key(user, current_password)
         recovery_system = RecoverySystem(crypto, db)
-        await recovery_system.setup_questions(current_user, question_answers)
+        await recovery_system.setup_questions(user, master_key, question_answers)
         
-        log = AuditLog(
-            user_id=current_user.user_id,
-            action="setup_recovery",
-            success=True
-        )
-        db.add(log)
+        record_audit(db, "setup_recovery", user_id=current_user.user_id)
         await db.commit()
         
         return {
@@ -552,14 +757,17 @@ async def get_user_recovery_questions(
 
 @router.post("/auth/recovery/{user_id}/verify")
 async def verify_recovery_answers(
+    request: Request,
     user_id: str,
     answers: List[str],
     new_password: str,
     db: AsyncSession = Depends(get_db)
 ):
     """Verifiziert Recovery-Antworten und setzt neues Passwort"""
+    rate_limiter = get_rate_limiter()
+    await rate_limiter.check("recovery", user_id, client_ip(request))
     try:
-        is_valid, message = password_validator.validate(new_password)
+        is_valid, message = await password_validator.validate_async(new_password)
         if not is_valid:
             raise HTTPException(
                 status_code=400,
@@ -570,6 +778,7 @@ async def verify_recovery_answers(
         success, master_key = await recovery_system.verify_answers(user_id, answers)
         
         if not success:
+            await rate_limiter.failed("recovery", user_id)
             raise HTTPException(
                 status_code=400,
                 detail="Invalid recovery answers"
@@ -586,25 +795,21 @@ async def verify_recovery_answers(
                 detail="User not found"
             )
             
-        # Verschlüssele bestehenden Master-Key mit neuem Passwort
-        new_master_key_encrypted = crypto.encrypt_master_key(
+        # Nur den Master Key neu verpacken; Private Key und Documents
+        # bleiben unverändert
+        user.master_salt, user.master_key_wrapped = await crypto.wrap_master_key_for_password(
             master_key,
-            new_password
+            new_password,
+            user.key_id or 1
         )
-        
-        # Update user
-        user.password_hash = crypto.hash_password(new_password)
-        user.master_key_encrypted = new_master_key_encrypted
+        user.password_hash = await crypto.hash_password_async(new_password)
         user.password_changed_at = datetime.utcnow()
         
-        log = AuditLog(
-            user_id=user_id,
-            action="recovery_password_reset",
-            success=True
-        )
-        db.add(log)
+        record_audit(db, "recovery_password_reset", user_id=user_id)
         
         await db.commit()
+        invalidate_principal(user_id)
+        await rate_limiter.succeeded("recovery", user_id)
         
         return {
             "message": "Password successfully reset. All documents remain accessible."
@@ -614,53 +819,59 @@ async def verify_recovery_answers(
         await db.rollback()
         raise
 
+@router.post("/auth/logout")
+async def logout(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Verwirft den gecachten Principal des Tokens und einen für die
+    Session entsperrten Private Key, falls vorhanden"""
+    if current_user.session_id:
+        crypto.lock_session(current_user.session_id)
+    _principal_cache.pop(_token_cache_key(token))
+    record_audit(db, "logout", user_id=current_user.user_id)
+    return {"message": "Session locked"}
+
 @router.post("/auth/change-password")
 async def change_password(
     old_password: str,
     new_password: str,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Ändert das Passwort eines Benutzers"""
     try:
-        is_valid, message = password_validator.validate(new_password)
+        is_valid, message = await password_validator.validate_async(new_password)
         if not is_valid:
             raise HTTPException(
                 status_code=400,
                 detail=message
             )
             
-        if not crypto.verify_password(old_password, current_user.password_hash):
+        if not await crypto.verify_password_async(old_password, current_user.password_hash):
             raise HTTPException(
                 status_code=401,
                 detail="Invalid current password"
             )
             
-        # Entschlüssele Master-Key mit altem Passwort
-        master_key = crypto.decrypt_master_key(
-            current_user.master_key_encrypted,
-            old_password
-        )
+        user = await db.get(User, current_user.user_id)
         
-        # Verschlüssele mit neuem Passwort
-        new_master_key_encrypted = crypto.encrypt_master_key(
+        # Master Key mit altem Passwort entsperren und für das neue
+        # verpacken, unabhängig von der Zahl der Dokumente
+        master_key = await unlock_master_key(user, old_password)
+        user.master_salt, user.master_key_wrapped = await crypto.wrap_master_key_for_password(
             master_key,
-            new_password
+            new_password,
+            user.key_id or 1
         )
+        user.password_hash = await crypto.hash_password_async(new_password)
+        user.password_changed_at = datetime.utcnow()
         
-        # Update user
-        current_user.password_hash = crypto.hash_password(new_password)
-        current_user.master_key_encrypted = new_master_key_encrypted
-        current_user.password_changed_at = datetime.utcnow()
-        
-        log = AuditLog(
-            user_id=current_user.user_id,
-            action="change_password",
-            success=True
-        )
-        db.add(log)
+        record_audit(db, "change_password", user_id=user.user_id)
         
         await db.commit()
+        invalidate_principal(user.user_id)
         
         return {
             "message": "Password successfully changed"
@@ -668,4 +879,54 @@ async def change_password(
         
     except Exception as e:
         await db.rollback()
-        raise
\ No newline at end of file
+        raise
+
+def rotation_status(rotation) -> dict:
+    return {
+        "rotation_id": rotation.rotation_id,
+        "status": rotation.status,
+        "from_key_id": rotation.from_key_id,
+        "to_key_id": rotation.to_key_id,
+        "total": rotation.total,
+        "processed": rotation.processed,
+        "started_at": rotation.started_at,
+        "updated_at": rotation.updated_at,
+        "completed_at": rotation.completed_at,
+        "error": rotation.error
+    }
+
+@router.post("/auth/key-rotation", status_code=202)
+async def rotate_keys(
+    password: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Rotiert das Schlüsselpaar oder setzt eine unterbrochene Rotation fort"""
+    if not await crypto.verify_password_async(password, current_user.password_hash):
+        raise HTTPException(status_code=401, detail="Invalid password")
+
+    user = await db.get(User, current_user.user_id)
+    master_key = await unlock_master_key(user, password)
+    try:
+        rotation = await start_rotation(db, user, master_key, crypto)
+    except RotationInProgress:
+        raise HTTPException(status_code=409, detail="Key rotation already in progress")
+
+    record_audit(
+        db, "key_rotation",
+        user_id=current_user.user_id,
+        details=f"key_id {rotation.from_key_id} -> {rotation.to_key_id}"
+    )
+    await db.commit()
+    return rotation_status(rotation)
+
+@router.get("/auth/key-rotation")
+async def get_key_rotation(
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Fortschritt der letzten Schlüsselrotation"""
+    rotation = await latest_rotation(db, current_user.user_id)
+    if rotation is None:
+        raise HTTPException(status_code=404, detail="No key rotation found")
+    return rotation_status(rotation)
@@ -1,18 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form, Header
-from fastapi.responses import StreamingResponse
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form, Header, Query
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from typing import List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_
+from sqlalchemy import select, delete, and_, or_, func, union_all
 from datetime import datetime
+import base64
+import hashlib
+import json
 import uuid
 import os
 import io
 
 from secure_vault.core.database import get_db
+from secure_vault.core.blobstore import BlobNotFound, get_blob_store
 from secure_vault.core.crypto import CryptoSystem
-from secure_vault.models.models import Document, User, AuditLog
-from secure_vault.api.auth import get_current_user, get_optional_user
+from secure_vault.core.executors import get_crypto_executor
+from secure_vault.core.previews import (
+    PREVIEW_BATCH_MEDIA_TYPE, create_preview, encode_preview_records, schedule_preview, spool_upload
+)
+from secure_vault.core.streaming import STREAM_FORMAT
+from secure_vault.models.models import Document, DocumentTag, User
+from secure_vault.models.schemas import PreviewBatchRequest
+from secure_vault.core.audit import record_audit
+from secure_vault.api.auth import Principal, get_current_user, get_optional_user
 from secure_vault.core.config import get_settings
+from secure_vault.utils.cache import LRUCache
+from secure_vault.utils.pagination import decode_cursor, encode_cursor
+from secure_vault.utils.http import (
+    RangeNotSatisfiable, etag_matches, iter_file_range, parse_range_header
+)
 
 router = APIRouter()
 settings = get_settings()
@@ -24,18 +40,12 @@ async def upload_document(
     name: str = Form(...),                    # Klartext Name
     recipient_id: str = Form(...),            # User ID des Empfängers
     mime_type: Optional[str] = Form(None),    # Optional, wird automatisch erkannt
+    tags: Optional[str] = Form(None),         # Kommagetrennt, unverschlüsselt
     db: AsyncSession = Depends(get_db),
-    current_user: Optional[str] = Depends(get_optional_user)  # Optional authentifiziert
+    current_user: Optional[Principal] = Depends(get_optional_user)  # Optional authentifiziert
 ):
+    preview_upload = None
     try:
-        # Prüfe Dateigröße
-        content = await file.read()
-        if len(content) > settings.max_file_size_mb * 1024 * 1024:
-            raise HTTPException(
-                status_code=413,
-                detail=f"File too large. Maximum size is {settings.max_file_size_mb}MB"
-            )
-
         # Hole Empfänger-Public-Key
         recipient = await db.execute(
             select(User).where(User.user_id == recipient_id)
@@ -44,52 +54,79 @@ async def upload_document(
         if not recipient:
             raise HTTPException(status_code=404, detail="Recipient not found")
 
-        # Generiere Document Key und verschlüssele Dokument
+        document_id = str(uuid.uuid4())
+
+        # Generiere Document Key und verschlüssele Dokument chunkweise
         document_key = os.urandom(32)
-        encrypted_content = crypto.encrypt_with_key(content, document_key)
+        encrypted_path, file_size = await encrypt_upload_to_storage(
+            file, document_key
+        )
         encrypted_name = crypto.encrypt_with_key(name.encode(), document_key)
         
         # Verschlüssele Document Key mit Public Key des Empfängers
         encrypted_key = crypto.encrypt_key_for_recipient(
             document_key,
-            recipient.public_key
+            recipient.public_key,
+            recipient_id
         )
         
-        # Erstelle Preview falls möglich
+        # Erstelle Preview falls möglich (im Prozess-Pool)
         encrypted_preview = None
-        if file.content_type.startswith('image/'):
-            preview = await create_preview(content)
-            encrypted_preview = crypto.encrypt_with_key(preview, document_key)
+        if (settings.preview_mode != "off"
+                and file.content_type and file.content_type.startswith('image/')):
+            preview_upload = await spool_upload(file)
+            if settings.preview_mode == "inline":
+                try:
+                    preview = await create_preview(preview_upload)
+                finally:
+                    preview_upload.remove()
+                    preview_upload = None
+                if preview is not None:
+                    encrypted_preview = crypto.encrypt_preview(preview, document_key, recipient.key_id or 1)
+
+        tag_list = parse_tags(tags)
 
         # Speichere Dokument
         document = Document(
-            document_id=str(uuid.uuid4()),
+            document_id=document_id,
             owner_id=current_user.user_id if current_user else None,
             recipient_id=recipient_id,
-            encrypted_name=encrypted_name,
+            encrypted_name=base64.b64encode(encrypted_name).decode(),
             mime_type=mime_type or file.content_type,
-            encrypted_content=encrypted_content,
+            encrypted_path=encrypted_path,
             encrypted_key=encrypted_key,
+            key_id=recipient.key_id,
             encrypted_preview=encrypted_preview,
-            file_size=len(content),
+            encryption_metadata=json.dumps({
+                "format": STREAM_FORMAT,
+                "chunk_size": settings.stream_chunk_size
+            }),
+            file_size=file_size,
+            # Nur Anzeigekopie; gefiltert wird über document_tags
+            tags=json.dumps(tag_list) if tag_list else None,
             created_at=datetime.utcnow()
         )
         
         db.add(document)
+        db.add_all(
+            DocumentTag(document_id=document_id, tag=tag) for tag in tag_list
+        )
         
         # Audit Log
-        log = AuditLog(
-            action="upload_document",
+        record_audit(
+            db, "upload_document",
+            user_id=current_user.user_id if current_user else None,
             document_id=document.document_id,
-            success=True,
             details=f"Uploaded for recipient: {recipient_id}"
         )
-        if current_user:
-            log.user_id = current_user.user_id
-            
-        db.add(log)
         
         await db.commit()
+        invalidate_document_counts(document.owner_id, recipient_id)
+
+        if preview_upload:
+            # Preview wird nach der Antwort nachgetragen
+            schedule_preview(document_id, preview_upload, document_key, recipient.key_id or 1, crypto)
+            preview_upload = None
         
         return {
             "document_id": document.document_id,
@@ -98,69 +135,283 @@ async def upload_document(
             "status": "delivered"
         }
 
+    except HTTPException:
+        await db.rollback()
+        raise
+
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
+    finally:
+        if preview_upload:
+            preview_upload.remove()
+
+async def encrypt_upload_to_storage(
+    file: UploadFile,
+    document_key: bytes
+) -> Tuple[str, int]:
+    """Liest den Upload chunkweise, verschlüsselt ihn und schreibt den
+    Ciphertext direkt in den Blob Store. Gibt (Blob-Schlüssel,
+    Klartextgröße) zurück.
+
+    AES-GCM läuft im Crypto-Pool, Schreiben und fsync im Thread des Blob
+    Writers; der Event-Loop wartet nur.
+    """
+    max_size = settings.max_file_size_mb * 1024 * 1024
+    encryptor = crypto.stream_encryptor(document_key)
+    executor = get_crypto_executor()
+    file_size = 0
+
+    async with get_blob_store().writer() as writer:
+        await writer.write_async(encryptor.header)
+        while True:
+            chunk = await file.read(settings.stream_chunk_size)
+            if not chunk:
+                break
+            file_size += len(chunk)
+            # Limit während des Lesens prüfen, nicht erst am Ende
+            if file_size > max_size:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File too large. Maximum size is {settings.max_file_size_mb}MB"
+                )
+            await writer.write_async(await executor.run(encryptor.update, chunk))
+        await writer.write_async(await executor.run(encryptor.finalize))
+        blob_key = await writer.commit_async()
+
+    return blob_key, file_size
+
+# Nur Metadaten: Ciphertext, Preview und Schlüssel werden nie geladen
+DOCUMENT_LIST_COLUMNS = (
+    Document.document_id,
+    Document.owner_id,
+    Document.recipient_id,
+    Document.encrypted_name,
+    Document.mime_type,
+    Document.file_size,
+    Document.tags,
+    Document.created_at,
+    Document.modified_at,
+    Document.last_access,
+)
+
+_document_count_cache = LRUCache(
+    maxsize=4096,
+    ttl=settings.document_count_cache_seconds
+)
+
+def parse_tags(tags: Optional[str]) -> List[str]:
+    """Zerlegt eine kommagetrennte Tag-Liste (ohne Leereinträge und Duplikate)"""
+    if not tags:
+        return []
+    return list(dict.fromkeys(
+        tag.strip()[:64] for tag in tags.split(',') if tag.strip()
+    ))
+
+def tag_filter(tag_list: List[str], tag_mode: str = "all"):
+    """Bedingung auf Document.document_id über den Index (tag, document_id).
+
+    ``any``: mindestens eines der Tags, ``all``: alle Tags.
+    """
+    matching = select(DocumentTag.document_id).where(DocumentTag.tag.in_(tag_list))
+    if tag_mode == "all" and len(tag_list) > 1:
+        matching = matching.group_by(DocumentTag.document_id).having(
+            func.count(DocumentTag.tag) == len(tag_list)
+        )
+    return Document.document_id.in_(matching)
+
+def document_filters(
+    user_id: str,
+    received_only: bool = False,
+    mime_type: Optional[str] = None,
+    tags: Optional[str] = None,
+    tag_mode: str = "all"
+) -> List[list]:
+    """WHERE-Bedingungen für die Dokumentliste eines Users, eine Liste pro
+    Zweig (empfangene und eigene Dokumente).
+
+    Die Zweige sind disjunkt und laufen jeweils über ihren Index
+    (recipient_id/owner_id, created_at, document_id); ein OR über beide
+    Spalten bräuchte eine Sortierung des ganzen Ergebnisses.
+    """
+    branches = [[Document.recipient_id == user_id]]
+    if not received_only:
+        branches.append([
+            Document.owner_id == user_id,
+            # An sich selbst geschickte Dokumente liefert schon der erste Zweig
+            or_(Document.recipient_id.is_(None), Document.recipient_id != user_id)
+        ])
+
+    # Weitere Filter
+    filters = []
+    if mime_type:
+        filters.append(Document.mime_type == mime_type)
+    tag_list = parse_tags(tags)
+    if tag_list:
+        filters.append(tag_filter(tag_list, tag_mode))
+    return [branch + filters for branch in branches]
+
+def document_page_query(branches: List[list], cursor: Optional[Tuple[datetime, str]], limit: int):
+    """Eine Seite der Dokumentliste, neueste zuerst (Keyset-Pagination auf
+    (created_at, document_id) statt OFFSET).
+
+    Mehrere Zweige werden per UNION ALL verbunden; SQLite mischt die
+    bereits sortierten Indexscans (MERGE) und bricht nach ``limit`` ab.
+    """
+    order_by = (Document.created_at.desc(), Document.document_id.desc())
+    queries = []
+    for conditions in branches:
+        query = select(*DOCUMENT_LIST_COLUMNS).where(*conditions)
+        if cursor:
+            cursor_created_at, cursor_document_id = cursor
+            query = query.where(
+                or_(
+                    Document.created_at < cursor_created_at,
+                    and_(
+                        Document.created_at == cursor_created_at,
+                        Document.document_id < cursor_document_id
+                    )
+                )
+            )
+        queries.append(query)
+
+    if len(queries) == 1:
+        return queries[0].order_by(*order_by).limit(limit)
+    return union_all(*queries).order_by(*order_by).limit(limit)
+
+def document_count_query(branches: List[list]):
+    """Gesamtzahl der Dokumente, je Zweig über den Index gezählt"""
+    total = None
+    for conditions in branches:
+        count = select(func.count()).select_from(Document).where(*conditions).scalar_subquery()
+        total = count if total is None else total + count
+    return select(total)
+
+def tag_counts_query(user_id: str, received_only: bool = False):
+    """Tags der eigenen/empfangenen Dokumente mit Anzahl, häufigste zuerst"""
+    count = func.count(DocumentTag.document_id)
+    return (
+        select(DocumentTag.tag, count.label("count"))
+        .join(Document, Document.document_id == DocumentTag.document_id)
+        # Ohne Sortierung nach created_at genügt ein OR über die Zweige
+        .where(or_(*(
+            and_(*conditions) for conditions in document_filters(user_id, received_only)
+        )))
+        .group_by(DocumentTag.tag)
+        .order_by(count.desc(), DocumentTag.tag)
+    )
+
+def invalidate_document_counts(*user_ids: Optional[str]):
+    """Verwirft gecachte Gesamtzahlen nach Upload oder Löschung"""
+    affected = {u for u in user_ids if u}
+    _document_count_cache.invalidate(lambda key, value: key[0] in affected)
+
 @router.get("/documents")
 async def list_documents(
     path_prefix: Optional[str] = None,
     tags: Optional[str] = None,
+    tag_mode: str = Query("all", pattern="^(all|any)$"),
     mime_type: Optional[str] = None,
     received_only: Optional[bool] = False,
-    page: int = 1,
-    per_page: int = 50,
+    cursor: Optional[str] = None,
+    per_page: int = Query(50, ge=1, le=200),
+    include_total: bool = False,
     db: AsyncSession = Depends(get_db),
-    current_user: str = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
-    """Liste Dokumente mit optionaler Filterung"""
-    query = select(Document)
+    """Liste Dokumente mit optionaler Filterung (Keyset-Pagination)"""
+    branches = document_filters(current_user.user_id, received_only, mime_type, tags, tag_mode)
+    query = document_page_query(
+        branches,
+        decode_cursor(cursor) if cursor else None,
+        per_page + 1
+    )
+    
+    result = await db.execute(query)
+    rows = result.all()
 
-    # Filter für empfangene oder eigene Dokumente
-    if received_only:
-        query = query.where(Document.recipient_id == current_user.user_id)
-    else:
-        query = query.where(
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.document_id)
+
+    total = None
+    if include_total:
+        cache_key = (current_user.user_id, bool(received_only), mime_type, tags, tag_mode)
+        total = _document_count_cache.get(cache_key)
+        if total is None:
+            total = (await db.execute(document_count_query(branches))).scalar_one()
+            _document_count_cache.set(cache_key, total)
+    
+    # Log access
+    record_audit(db, "list_documents", user_id=current_user.user_id)
+
+    return {
+        "documents": [dict(row._mapping) for row in rows],
+        "per_page": per_page,
+        "next_cursor": next_cursor,
+        "total": total
+    }
+
+@router.get("/documents/tags")
+async def list_tags(
+    received_only: Optional[bool] = False,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Tags der eigenen/empfangenen Dokumente mit Anzahl"""
+    cache_key = (current_user.user_id, bool(received_only), "tags")
+    tag_counts = _document_count_cache.get(cache_key)
+    if tag_counts is None:
+        rows = (await db.execute(tag_counts_query(current_user.user_id, bool(received_only)))).all()
+        tag_counts = [{"tag": row.tag, "count": row.count} for row in rows]
+        _document_count_cache.set(cache_key, tag_counts)
+
+    return {"tags": tag_counts}
+
+@router.post("/documents/previews")
+async def get_document_previews(
+    request: PreviewBatchRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Verschlüsselte Vorschaubilder und Schlüssel mehrerer Dokumente in
+    einem längenpräfixierten Binärstream (ohne Dokumentinhalt)"""
+    document_ids = list(dict.fromkeys(request.document_ids))
+    rows = (await db.execute(
+        select(Document.document_id, Document.encrypted_key, Document.encrypted_preview)
+        .where(
+            Document.document_id.in_(document_ids),
             or_(
                 Document.recipient_id == current_user.user_id,
                 Document.owner_id == current_user.user_id
             )
         )
+    )).all()
 
-    # Weitere Filter
-    if mime_type:
-        query = query.where(Document.mime_type == mime_type)
-    if tags:
-        tag_list = tags.split(',')
-        query = query.where(Document.tags.contains(tag_list))
+    # Reihenfolge der Anfrage beibehalten; fehlende Dokumente entfallen
+    by_id = {row.document_id: row for row in rows}
+    records = [tuple(by_id[d]) for d in document_ids if d in by_id]
 
-    # Pagination
-    query = query.offset((page - 1) * per_page).limit(per_page)
-    
-    result = await db.execute(query)
-    documents = result.scalars().all()
-    
-    # Log access
-    log = AuditLog(
+    record_audit(
+        db, "access_previews",
         user_id=current_user.user_id,
-        action="list_documents",
-        success=True
+        details=f"{len(records)} previews"
     )
-    db.add(log)
-    await db.commit()
 
-    return {
-        "documents": documents,
-        "page": page,
-        "per_page": per_page,
-        "total": len(documents)
-    }
+    return StreamingResponse(
+        encode_preview_records(records),
+        media_type=PREVIEW_BATCH_MEDIA_TYPE,
+        headers={"Cache-Control": "private, no-store"}
+    )
 
 @router.get("/documents/{document_id}")
 async def get_document(
     document_id: str,
     db: AsyncSession = Depends(get_db),
-    current_user: str = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Hole ein spezifisches Dokument"""
     document = await db.execute(
@@ -183,24 +434,111 @@ async def get_document(
     document.last_access = datetime.utcnow()
     
     # Log access
-    log = AuditLog(
-        user_id=current_user.user_id,
-        action="access_document",
-        document_id=document_id,
-        success=True
-    )
-    db.add(log)
+    record_audit(db, "access_document", user_id=current_user.user_id, document_id=document_id)
     
     await db.commit()
 
     return document
 
+@router.get("/documents/{document_id}/content")
+async def get_document_content(
+    document_id: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_none_match: Optional[str] = Header(None),
+    if_range: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Streamt den Ciphertext eines Dokuments (mit Range/ETag Support)"""
+    document = await db.execute(
+        select(Document.encrypted_path, Document.encryption_metadata).where(
+            and_(
+                Document.document_id == document_id,
+                or_(
+                    Document.recipient_id == current_user.user_id,
+                    Document.owner_id == current_user.user_id
+                )
+            )
+        )
+    )
+    document = document.first()
+    
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    store = get_blob_store()
+    legacy_content = None
+    if document.encrypted_path:
+        # Blob-Schlüssel endet auf den SHA-256 des Ciphertexts
+        etag = f'"{document.encrypted_path.rsplit("/", 1)[-1]}"'
+        try:
+            size = store.size(document.encrypted_path)
+        except BlobNotFound:
+            raise HTTPException(status_code=404, detail="Document content not found")
+    else:
+        # Alte Zeilen, die noch nicht migriert wurden
+        legacy_content = (await db.execute(
+            select(Document.encrypted_content)
+            .where(Document.document_id == document_id)
+        )).scalar_one_or_none() or b""
+        etag = f'"{hashlib.sha256(legacy_content).hexdigest()}"'
+        size = len(legacy_content)
+
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache"
+    }
+    if document.encryption_metadata:
+        headers["X-Encryption-Metadata"] = document.encryption_metadata
+
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    # If-Range: bei geändertem Inhalt die ganze Ressource liefern
+    byte_range = None
+    if not if_range or if_range == etag:
+        try:
+            byte_range = parse_range_header(range_header, size)
+        except RangeNotSatisfiable:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+
+    # Log access
+    record_audit(
+        db, "download_document",
+        user_id=current_user.user_id,
+        document_id=document_id,
+        details=f"range: {byte_range[0]}-{byte_range[1]}" if byte_range else None
+    )
+
+    media_type = "application/octet-stream"
+    if byte_range is None:
+        local_path = store.local_path(document.encrypted_path) if document.encrypted_path else None
+        if local_path:
+            # FileResponse nutzt sendfile/pathsend, sofern der Server es kann
+            return FileResponse(local_path, media_type=media_type, headers=headers)
+        start, length, status_code = 0, size, 200
+    else:
+        start, end = byte_range
+        length, status_code = end - start + 1, 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    headers["Content-Length"] = str(length)
+    source = io.BytesIO(legacy_content) if legacy_content is not None else store.open(document.encrypted_path)
+    return StreamingResponse(
+        iter_file_range(source, start, length, settings.stream_chunk_size),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers
+    )
+
 @router.delete("/documents/{document_id}")
 async def delete_document(
     document_id: str,
     password: str,
     db: AsyncSession = Depends(get_db),
-    current_user: str = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Lösche ein Dokument (nur als Besitzer möglich)"""
     # Prüfe ob Dokument existiert und User der Besitzer ist
@@ -218,30 +556,33 @@ async def delete_document(
         raise HTTPException(status_code=404, detail="Document not found")
     
     # Verifiziere Passwort
-    if not crypto.verify_password(password, current_user.password_hash):
+    if not await crypto.verify_password_async(password, current_user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid password")
     
     # Lösche Dokument
+    blob_key = document.encrypted_path
+    await db.execute(delete(DocumentTag).where(DocumentTag.document_id == document_id))
     await db.delete(document)
     
     # Log deletion
-    log = AuditLog(
-        user_id=current_user.user_id,
-        action="delete_document",
-        document_id=document_id,
-        success=True
-    )
-    db.add(log)
+    record_audit(db, "delete_document", user_id=current_user.user_id, document_id=document_id)
     
     await db.commit()
+    invalidate_document_counts(document.owner_id, document.recipient_id)
+
+    # Blob erst nach erfolgreichem Commit entfernen
+    if blob_key:
+        await release_blob(db, blob_key)
     
     return {"status": "success"}
 
-async def create_preview(content: bytes, max_size: tuple = (100, 100)) -> bytes:
-    """Erstelle eine Vorschau für Bilder"""
-    image = Image.open(io.BytesIO(content))
-    image.thumbnail(max_size)
-    preview_bytes = io.BytesIO()
-    image.save(preview_bytes, format='PNG')
-    return preview_bytes.getvalue()
+async def release_blob(db: AsyncSession, blob_key: str):
+    """Löscht einen Blob, sofern kein anderes Dokument darauf verweist"""
+    still_used = await db.execute(
+        select(Document.document_id)
+        .where(Document.encrypted_path == blob_key)
+        .limit(1)
+    )
+    if still_used.first() is None:
+        get_blob_store().delete(blob_key)
 
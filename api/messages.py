@@ -1,23 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.security import OAuth2PasswordBearer
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from secure_vault.api.auth import Principal, get_current_user
 from secure_vault.core.crypto import CryptoSystem
 from secure_vault.models.schemas import MessageCreate, MessageResponse
 from secure_vault.core.database import get_db
-from secure_vault.models.models import Message, User, AuditLog
+from secure_vault.models.models import Message, MessageRecipient, User
+from secure_vault.core.audit import record_audit
+from secure_vault.utils.pagination import decode_cursor, encode_cursor
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, and_, or_
 from datetime import datetime
-import json
+from typing import Optional
 import uuid
 
 router = APIRouter()
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 crypto = CryptoSystem()
 
 @router.post("/messages", response_model=MessageResponse)
 async def send_message(
     message_data: MessageCreate,
-    current_user: str = Depends(oauth2_scheme),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     # Verschlüssele Nachricht
@@ -27,75 +28,125 @@ async def send_message(
         message_key
     )
     
-    # Verschlüssele Nachrichtenschlüssel für jeden Empfänger
-    encrypted_keys = {}
-    for recipient_id in message_data.recipients:
-        recipient = await db.execute(
-            select(User).where(User.user_id == recipient_id)
-        )
-        recipient = recipient.scalar_one_or_none()
-        if recipient:
-            encrypted_key = crypto.encrypt_key_for_recipient(
-                message_key,
-                recipient.public_key
-            )
-            encrypted_keys[recipient_id] = encrypted_key.hex()
+    # Alle Public Keys (Empfänger und Sender) mit einer Abfrage holen
+    user_ids = set(message_data.recipients) | {current_user.user_id}
+    users = (await db.execute(
+        select(User.user_id, User.public_key, User.key_id).where(User.user_id.in_(user_ids))
+    )).all()
+    public_keys = {user.user_id: user.public_key for user in users}
+    key_ids = {user.user_id: user.key_id for user in users}
+    if current_user.user_id not in public_keys:
+        raise HTTPException(status_code=404, detail="Sender not found")
     
-    # Füge Sender hinzu
-    sender = await db.execute(
-        select(User).where(User.user_id == current_user)
-    )
-    sender = sender.scalar_one_or_none()
-    sender_key = crypto.encrypt_key_for_recipient(
+    # Verschlüssele Nachrichtenschlüssel für jeden Empfänger (parallel)
+    encrypted_keys = await crypto.encrypt_key_for_recipients(
         message_key,
-        sender.public_key
+        public_keys
     )
-    encrypted_keys[current_user] = sender_key.hex()
     
     # Speichere Nachricht
+    created_at = datetime.utcnow()
     message = Message(
         message_id=str(uuid.uuid4()),
-        from_user=current_user,
+        from_user=current_user.user_id,
         group_id=message_data.group_id,
-        encrypted_content=encrypted_content,
-        encrypted_keys=json.dumps(encrypted_keys)
+        created_at=created_at,
+        encrypted_content=encrypted_content
     )
     
     db.add(message)
+
+    # Ein indizierter Posteingangs-Eintrag pro Empfänger
+    db.add_all([
+        MessageRecipient(
+            message_id=message.message_id,
+            user_id=user_id,
+            encrypted_key=key,
+            key_id=key_ids[user_id],
+            created_at=created_at
+        )
+        for user_id, key in encrypted_keys.items()
+    ])
     
     # Audit Log
-    log = AuditLog(
-        user_id=current_user,
-        action="send_message",
+    record_audit(
+        db, "send_message",
+        user_id=current_user.user_id,
         message_id=message.message_id,
-        success=True,
         details=f"recipients: {len(message_data.recipients)}"
     )
-    db.add(log)
     
     await db.commit()
-    return message
+    return MessageResponse(
+        message_id=message.message_id,
+        from_user=message.from_user,
+        created_at=created_at,
+        group_id=message.group_id,
+        encrypted_content=encrypted_content.hex(),
+        encrypted_key=encrypted_keys[current_user.user_id].hex()
+    )
+
+# Nur die Spalten der Antwort: Message.encrypted_keys (Legacy-JSON mit den
+# Schlüsseln aller Empfänger) wird im Posteingang nie gelesen
+INBOX_COLUMNS = (
+    Message.message_id,
+    Message.from_user,
+    Message.group_id,
+    Message.created_at,
+    Message.encrypted_content,
+    MessageRecipient.created_at.label("received_at"),
+    MessageRecipient.encrypted_key,
+)
 
 @router.get("/messages", response_model=list[MessageResponse])
 async def get_messages(
-    current_user: str = Depends(oauth2_scheme),
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    # Hole alle Nachrichten wo der User Empfänger ist
-    messages = await db.execute(
-        select(Message).where(
-            Message.encrypted_keys.like(f'%"{current_user}"%')
-        ).order_by(Message.created_at.desc())
+    """Posteingang, neueste zuerst. Der Cursor für die nächste Seite steht
+    im Header X-Next-Cursor."""
+    # Hole alle Nachrichten wo der User Empfänger ist (Index-Range-Scan)
+    query = (
+        select(*INBOX_COLUMNS)
+        .join(MessageRecipient, MessageRecipient.message_id == Message.message_id)
+        .where(MessageRecipient.user_id == current_user.user_id)
     )
-    messages = messages.scalars().all()
+    if cursor:
+        cursor_created_at, cursor_message_id = decode_cursor(cursor)
+        query = query.where(
+            or_(
+                MessageRecipient.created_at < cursor_created_at,
+                and_(
+                    MessageRecipient.created_at == cursor_created_at,
+                    MessageRecipient.message_id < cursor_message_id
+                )
+            )
+        )
+    query = query.order_by(
+        MessageRecipient.created_at.desc(),
+        MessageRecipient.message_id.desc()
+    ).limit(limit + 1)
+
+    rows = (await db.execute(query)).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        # Sortiert und paginiert wird über message_recipients
+        response.headers["X-Next-Cursor"] = encode_cursor(last.received_at, last.message_id)
     
     # Audit Log für Zugriff
-    log = AuditLog(
-        user_id=current_user,
-        action="access_messages",
-        success=True
-    )
-    db.add(log)
-    
-    await db.commit()
-    return messages
+    record_audit(db, "access_messages", user_id=current_user.user_id)
+    return [
+        MessageResponse(
+            message_id=row.message_id,
+            from_user=row.from_user,
+            created_at=row.created_at,
+            group_id=row.group_id,
+            encrypted_content=row.encrypted_content.hex() if row.encrypted_content else "",
+            encrypted_key=row.encrypted_key.hex() if row.encrypted_key else None
+        )
+        for row in rows
+    ]
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from secure_vault.core.config import get_settings
+from secure_vault.utils.metrics import metrics
+from typing import Optional
+import hmac
+
+router = APIRouter()
+
+async def require_metrics_token(authorization: Optional[str] = Header(None)):
+    """Interne Metriken nur mit ``metrics_token`` als Bearer-Token; ohne
+    konfiguriertes Token ist der Endpunkt abgeschaltet"""
+    token = get_settings().metrics_token
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, credentials = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(credentials.encode(), token.encode()):
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+@router.get("/metrics", dependencies=[Depends(require_metrics_token)])
+async def get_metrics():
+    """Interne Laufzeit-Metriken dieses Worker-Prozesses"""
+    return metrics.snapshot()
@@ -0,0 +1,306 @@
+import asyncio
+import fcntl
+import glob
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, List, Optional, Set
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from secure_vault.core.config import get_settings
+from secure_vault.core.database import AsyncSessionLocal
+from secure_vault.models.models import AuditLog
+from secure_vault.utils.metrics import metrics
+
+logger = logging.getLogger('secure_vault.audit')
+
+
+class AuditWriter:
+    """Schreibt Audit-Log-Einträge gebündelt außerhalb der Request-Transaktion.
+
+    Einträge landen in einer In-Process-Queue und werden alle
+    ``flush_interval_ms`` oder sobald ``batch_size`` Einträge anstehen per
+    Bulk-INSERT geschrieben. Jeder Eintrag wird vorher an eine Spill-Datei
+    angehängt; nach einem Absturz werden nicht geschriebene Einträge beim
+    nächsten Start nachgetragen; die Spill-Datei wird einmal pro Batch per
+    fsync gesichert. Aktionen aus ``sync_actions`` werden wie bisher in der
+    Request-Transaktion geschrieben.
+
+    Ohne Request-Session (``db=None``) gilt: ist die Queue voll, wird der
+    Eintrag verworfen (Metrik ``audit.dropped``); läuft der Writer nicht,
+    wird er sofort in einem eigenen Task geschrieben.
+    """
+
+    def __init__(self,
+                 spill_dir: str,
+                 flush_interval_ms: int,
+                 batch_size: int,
+                 max_queue: int,
+                 sync_actions: Iterable[str],
+                 session_factory=AsyncSessionLocal):
+        self.spill_dir = spill_dir
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.sync_actions = set(sync_actions)
+        self._session_factory = session_factory
+        self._pending: List[dict] = []
+        self._detached: Set[asyncio.Task] = set()
+        self._batch_ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._segment = 0
+        self._spill_file = None
+        self._lock_file = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def record(self,
+               db: Optional[AsyncSession],
+               action: str,
+               user_id: Optional[str] = None,
+               success: bool = True,
+               document_id: Optional[str] = None,
+               message_id: Optional[str] = None,
+               details: Optional[str] = None):
+        """Erfasst einen Audit-Eintrag (synchron oder über die Queue)"""
+        entry = {
+            "log_id": str(uuid.uuid4()),
+            "timestamp": datetime.utcnow(),
+            "user_id": user_id,
+            "action": action,
+            "document_id": document_id,
+            "message_id": message_id,
+            "success": success,
+            "details": details
+        }
+
+        queue_full = len(self._pending) >= self.max_queue
+        if db is not None and (action in self.sync_actions or not self.running or queue_full):
+            if queue_full:
+                metrics.increment("audit.queue_overflow")
+            db.add(AuditLog(**entry))
+            return
+
+        if not self.running:
+            # Ohne laufenden Writer bliebe der Eintrag sonst nur im Speicher
+            if len(self._detached) >= self.max_queue:
+                self._drop(action)
+            else:
+                self._insert_detached(entry)
+            return
+        if queue_full:
+            self._drop(action)
+            return
+
+        self._spill(entry)
+        self._pending.append(entry)
+        metrics.set_gauge("audit.queue_depth", len(self._pending))
+        if len(self._pending) >= self.batch_size:
+            self._batch_ready.set()
+
+    def _drop(self, action: str):
+        metrics.increment("audit.dropped")
+        logger.warning("Audit queue full, dropped %s entry", action)
+
+    def _insert_detached(self, entry: dict):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            metrics.increment("audit.dropped")
+            logger.warning("Audit writer not running, dropped %s entry", entry["action"])
+            return
+        task = loop.create_task(self._insert([entry]))
+        self._detached.add(task)
+        task.add_done_callback(self._detached_done)
+
+    def _detached_done(self, task: asyncio.Task):
+        self._detached.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Audit insert failed", exc_info=task.exception())
+            metrics.increment("audit.flush_errors")
+
+    async def start(self):
+        if self._task is not None:
+            return
+        os.makedirs(self.spill_dir, exist_ok=True)
+        await self._replay_spill()
+        self._open_segment()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        # Kein cancel(): ein laufender Flush soll sauber zu Ende laufen
+        self._stopping = True
+        self._batch_ready.set()
+        await self._task
+        self._task = None
+        await self.flush()
+        if self._spill_file is not None:
+            _close_segment(self._spill_file)
+            self._spill_file = None
+        if self._lock_file is not None:
+            if not self._pending:
+                # Alles geschrieben: Spill-Dateien und Lock aufräumen,
+                # sonst trägt der nächste Start sie nach
+                self._remove_segments(upto=self._segment)
+                os.unlink(self._lock_path(os.getpid()))
+            self._lock_file.close()
+            self._lock_file = None
+
+    async def flush(self):
+        """Schreibt alle anstehenden Einträge in die Datenbank"""
+        if not self._pending:
+            return
+        # Queue leeren und Spill-Segment wechseln, ohne dazwischen zu
+        # awaiten: das alte Segment enthält danach nur Einträge aus batch
+        batch, self._pending = self._pending, []
+        flushed_segment = self._segment
+        previous = self._open_segment()
+        metrics.set_gauge("audit.queue_depth", 0)
+
+        try:
+            if previous is not None:
+                # Einmal pro Batch: Einträge überstehen auch einen Absturz
+                # des Systems, falls das INSERT nicht mehr durchkommt
+                await asyncio.to_thread(_close_segment, previous)
+            await self._insert(batch)
+        except Exception:
+            logger.exception("Audit flush failed, %d entries requeued", len(batch))
+            metrics.increment("audit.flush_errors")
+            self._pending[:0] = batch
+            metrics.set_gauge("audit.queue_depth", len(self._pending))
+            return
+
+        metrics.increment("audit.flushed", len(batch))
+        self._remove_segments(upto=flushed_segment)
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            await self.flush()
+
+    async def _insert(self, entries: List[dict]):
+        async with self._session_factory() as session:
+            for i in range(0, len(entries), self.batch_size):
+                await session.execute(insert(AuditLog), entries[i:i + self.batch_size])
+            await session.commit()
+
+    def _spill(self, entry: dict):
+        if self._spill_file is None:
+            return
+        record = dict(entry, timestamp=entry["timestamp"].isoformat())
+        self._spill_file.write(json.dumps(record) + "\n")
+        self._spill_file.flush()
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.spill_dir, f"spill-{os.getpid()}-{segment:08d}.jsonl")
+
+    def _open_segment(self):
+        """Beginnt ein neues Spill-Segment und gibt das bisherige (noch
+        offen) zurück"""
+        previous = self._spill_file
+        self._segment += 1
+        self._spill_file = open(self._segment_path(self._segment), "a", encoding="utf-8")
+        return previous
+
+    def _remove_segments(self, upto: int):
+        for segment in range(1, upto + 1):
+            path = self._segment_path(segment)
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def _lock_path(self, pid: int) -> str:
+        return os.path.join(self.spill_dir, f"spill-{pid}.lock")
+
+    def _acquire_own_lock(self):
+        """Hält für die Lebensdauer des Prozesses einen Lock auf die eigenen
+        Spill-Dateien, damit andere Worker sie nicht nachtragen"""
+        self._lock_file = open(self._lock_path(os.getpid()), "a")
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    async def _replay_spill(self):
+        """Trägt Einträge aus Spill-Dateien beendeter Prozesse nach"""
+        self._acquire_own_lock()
+        # Reste eines früheren Prozesses mit derselben PID
+        own_paths = sorted(glob.glob(os.path.join(self.spill_dir, f"spill-{os.getpid()}-*.jsonl")))
+        if own_paths:
+            await self._replay_files(own_paths)
+
+        for lock_path in glob.glob(os.path.join(self.spill_dir, "spill-*.lock")):
+            pid = int(os.path.basename(lock_path)[len("spill-"):-len(".lock")])
+            if pid == os.getpid():
+                continue
+            with open(lock_path, "a") as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue  # Prozess läuft noch
+                paths = sorted(glob.glob(os.path.join(self.spill_dir, f"spill-{pid}-*.jsonl")))
+                await self._replay_files(paths)
+                os.unlink(lock_path)
+
+    async def _replay_files(self, paths: List[str]):
+        entries = []
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # abgeschnittene letzte Zeile
+                    record["timestamp"] = datetime.fromisoformat(record["timestamp"])
+                    entries.append(record)
+
+        if entries:
+            # Bereits geschriebene Einträge überspringen (Absturz nach INSERT)
+            async with self._session_factory() as session:
+                existing = set()
+                ids = [e["log_id"] for e in entries]
+                for i in range(0, len(ids), 500):
+                    existing.update((await session.execute(
+                        select(AuditLog.log_id).where(AuditLog.log_id.in_(ids[i:i + 500]))
+                    )).scalars())
+            entries = [e for e in entries if e["log_id"] not in existing]
+            if entries:
+                await self._insert(entries)
+                logger.info("Replayed %d audit entries from spill files", len(entries))
+
+        for path in paths:
+            os.unlink(path)
+
+
+def _close_segment(spill_file):
+    spill_file.flush()
+    os.fsync(spill_file.fileno())
+    spill_file.close()
+
+
+@lru_cache()
+def get_audit_writer() -> AuditWriter:
+    settings = get_settings()
+    return AuditWriter(
+        spill_dir=settings.audit_spill_dir or os.path.join(settings.data_dir, 'audit'),
+        flush_interval_ms=settings.audit_flush_interval_ms,
+        batch_size=settings.audit_batch_size,
+        max_queue=settings.audit_max_queue,
+        sync_actions=settings.audit_sync_actions
+    )
+
+
+def record_audit(db: Optional[AsyncSession], action: str, **fields):
+    """Kurzform für get_audit_writer().record(...)"""
+    get_audit_writer().record(db, action, **fields)
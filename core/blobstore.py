@@ -0,0 +1,225 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import BinaryIO, Callable, Dict, Optional
+
+from secure_vault.core.config import get_settings, Settings
+
+
+class BlobNotFound(Exception):
+    """Blob existiert nicht im Store"""
+
+
+class BlobWriter(ABC):
+    """Schreibt einen Blob inkrementell; der Schlüssel entsteht erst bei commit().
+
+    Aus Request-Handlern die ``*_async`` Varianten und ``async with``
+    verwenden: write/commit machen blockierende I/O (inklusive fsync) und
+    laufen dort in einem Thread.
+    """
+
+    @abstractmethod
+    def write(self, data: bytes):
+        ...
+
+    @abstractmethod
+    def commit(self) -> str:
+        """Schließt den Blob ab und gibt seinen Schlüssel zurück"""
+
+    @abstractmethod
+    def abort(self):
+        ...
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+
+    async def write_async(self, data: bytes):
+        await asyncio.to_thread(self.write, data)
+
+    async def commit_async(self) -> str:
+        return await asyncio.to_thread(self.commit)
+
+    async def abort_async(self):
+        await asyncio.to_thread(self.abort)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            await self.abort_async()
+
+
+class BlobStore(ABC):
+    """Ablage für Dokument-Ciphertext außerhalb der Datenbank.
+
+    Schlüssel sind inhaltsadressiert (SHA-256 des Ciphertexts) und werden
+    in ``Document.encrypted_path`` gespeichert.
+    """
+
+    @abstractmethod
+    def writer(self) -> BlobWriter:
+        ...
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        ...
+
+    @abstractmethod
+    def size(self, key: str) -> int:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Dateipfad, falls der Blob lokal liegt (für sendfile), sonst None"""
+        return None
+
+    def put(self, data: bytes) -> str:
+        with self.writer() as writer:
+            writer.write(data)
+            return writer.commit()
+
+    async def put_async(self, data: bytes) -> str:
+        return await asyncio.to_thread(self.put, data)
+
+
+class _LocalBlobWriter(BlobWriter):
+    def __init__(self, store: "LocalBlobStore"):
+        self._store = store
+        self._hash = hashlib.sha256()
+        fd, self._tmp_path = tempfile.mkstemp(dir=store.tmp_dir, prefix='blob-')
+        self._file = os.fdopen(fd, 'wb')
+        self._done = False
+
+    def write(self, data: bytes):
+        self._hash.update(data)
+        self._file.write(data)
+
+    def commit(self) -> str:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+        key = self._store.key_for_digest(self._hash.hexdigest())
+        final_path = self._store.path_for(key)
+        directory = os.path.dirname(final_path)
+        os.makedirs(directory, exist_ok=True)
+
+        if os.path.exists(final_path):
+            # Gleicher Inhalt liegt schon vor
+            os.unlink(self._tmp_path)
+        else:
+            # Atomarer Rename: Leser sehen nie einen halb geschriebenen Blob
+            os.replace(self._tmp_path, final_path)
+            _fsync_dir(directory)
+
+        self._done = True
+        return key
+
+    def abort(self):
+        if self._done:
+            return
+        self._done = True
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.unlink(self._tmp_path)
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs in einem geshardeten Verzeichnisbaum: root/ab/cd/abcd...."""
+
+    def __init__(self, root: str, shard_levels: int = 2):
+        self.root = root
+        self.shard_levels = shard_levels
+        self.tmp_dir = os.path.join(root, '.tmp')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def key_for_digest(self, digest: str) -> str:
+        shards = [digest[i * 2:i * 2 + 2] for i in range(self.shard_levels)]
+        return '/'.join(shards + [digest])
+
+    def path_for(self, key: str) -> str:
+        parts = key.split('/')
+        if any(part in ('', '.', '..') for part in parts):
+            raise ValueError(f"Invalid blob key: {key}")
+        return os.path.join(self.root, *parts)
+
+    def writer(self) -> BlobWriter:
+        return _LocalBlobWriter(self)
+
+    def open(self, key: str) -> BinaryIO:
+        try:
+            return open(self.path_for(key), 'rb')
+        except FileNotFoundError:
+            raise BlobNotFound(key)
+
+    def size(self, key: str) -> int:
+        try:
+            return os.path.getsize(self.path_for(key))
+        except FileNotFoundError:
+            raise BlobNotFound(key)
+
+    def delete(self, key: str):
+        try:
+            os.unlink(self.path_for(key))
+        except FileNotFoundError:
+            pass
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path_for(key))
+
+    def local_path(self, key: str) -> Optional[str]:
+        return self.path_for(key)
+
+
+def _fsync_dir(directory: str):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _local_backend(settings: Settings) -> BlobStore:
+    root = settings.blob_store_dir or os.path.join(settings.data_dir, 'blobs')
+    return LocalBlobStore(root, shard_levels=settings.blob_store_shard_levels)
+
+
+BLOB_STORE_BACKENDS: Dict[str, Callable[[Settings], BlobStore]] = {
+    "local": _local_backend,
+}
+
+
+def register_blob_store(name: str, factory: Callable[[Settings], BlobStore]):
+    """Registriert ein weiteres Backend (z.B. Objektspeicher)"""
+    BLOB_STORE_BACKENDS[name] = factory
+
+
+@lru_cache()
+def get_blob_store() -> BlobStore:
+    settings = get_settings()
+    try:
+        factory = BLOB_STORE_BACKENDS[settings.blob_store_backend]
+    except KeyError:
+        raise ValueError(f"Unknown blob store backend: {settings.blob_store_backend}")
+    return factory(settings)
@@ -1,7 +1,7 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 import os
-from typing import Optional
+from typing import List, Optional
 
 class Settings(BaseSettings):
     # Database
@@ -11,18 +11,122 @@ class Settings(BaseSettings):
     database_name: str = "secure_vault.db"
     database_user: Optional[str] = None
     database_password: Optional[str] = None
+    # Connection-Pool (pro Worker-Prozess)
+    database_pool_size: int = 5
+    database_max_overflow: int = 10
+    database_pool_timeout_seconds: float = 30.0
+    database_pool_recycle_seconds: int = 1800
+    database_pool_pre_ping: bool = True
+    database_statement_cache_size: int = 100  # nur asyncpg
+    # SQLite PRAGMAs, beim Verbindungsaufbau gesetzt
+    sqlite_journal_mode: str = "wal"
+    sqlite_synchronous: str = "normal"
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_busy_timeout_ms: int = 5000
+    # Alle Schreibzugriffe über einen Writer-Task pro Prozess (Group Commit),
+    # Lesezugriffe über einen eigenen Read-only-Pool
+    sqlite_single_writer: bool = False
+    sqlite_write_batch_size: int = 64
+    sqlite_write_batch_window_ms: float = 2.0
     
     # Storage
     max_file_size_mb: int = 50
     temp_dir: str = "/tmp/secure_vault"
     data_dir: str = "/var/secure_vault/data"
+    stream_chunk_size: int = 64 * 1024  # Klartext-Bytes pro AES-GCM Chunk
+    blob_store_backend: str = "local"
+    blob_store_dir: Optional[str] = None  # Standard: <data_dir>/blobs
+    blob_store_shard_levels: int = 2
+    document_count_cache_seconds: int = 30
+
+    # Vorschaubilder (Prozess-Pool)
+    preview_mode: str = "inline"  # inline/background/off
+    preview_max_size: int = 100  # Kantenlänge in Pixeln
+    preview_max_pixels: int = 50_000_000
+    preview_timeout_seconds: float = 10.0
+    preview_workers: int = 2
+    preview_queue_size: int = 16
+    preview_queue_timeout_seconds: float = 1.0
     
     # Security
     jwt_secret: str = "your-secret-key-change-in-production"
     token_validity_hours: int = 24
     min_password_length: int = 12
+    max_password_length: int = 64
+    min_password_strength: int = 3  # zxcvbn score 0-4
     crypto_iterations: int = 480000
-    
+    # Cache für authentifizierte Principals (pro Worker-Prozess)
+    principal_cache_ttl_seconds: float = 30.0
+    principal_cache_size: int = 10000
+    # Rate Limiting vor jeder KDF-Arbeit (Token Bucket pro user_id und IP)
+    rate_limit_enabled: bool = True
+    rate_limit_backend: str = "memory"  # memory/redis
+    rate_limit_redis_url: str = "redis://localhost:6379/0"
+    rate_limit_memory_size: int = 100_000
+    login_rate_limit_per_user: int = 5  # pro Minute
+    login_rate_limit_per_ip: int = 30  # pro Minute
+    recovery_rate_limit_per_user: int = 3  # pro Stunde
+    recovery_rate_limit_per_ip: int = 10  # pro Stunde
+    # Reverse Proxies (Adressen oder Netze), deren X-Forwarded-For als
+    # Client-IP gilt; leer = immer die Adresse der Verbindung
+    trusted_proxies: List[str] = []
+    # Exponentielles Back-off nach Fehlversuchen
+    login_backoff_free_failures: int = 3
+    login_backoff_base_seconds: float = 1.0
+    login_backoff_max_seconds: float = 300.0
+    login_failure_window_seconds: float = 900.0
+    # Katalog der Recovery-Fragen (öffentlich, per ETag revalidiert)
+    recovery_questions_max_age_seconds: int = 86400
+
+    # KDF Worker-Pool (PBKDF2 außerhalb des Event-Loops)
+    kdf_executor_type: str = "process"  # process/thread
+    kdf_workers: int = 2
+    kdf_queue_size: int = 32
+    kdf_queue_timeout_seconds: float = 5.0
+
+    # Thread-Pool für RSA/AES-Operationen
+    crypto_workers: int = 4
+    crypto_queue_size: int = 64
+    crypto_queue_timeout_seconds: float = 5.0
+    public_key_cache_size: int = 1024
+    # Entsperrte Private Keys pro Session (feste TTL ab Entsperren)
+    private_key_cache_size: int = 256
+    private_key_cache_ttl_seconds: float = 300.0
+
+    # Rotation des Schlüsselpaars (Hintergrund-Job, fortsetzbar)
+    key_rotation_batch_size: int = 200
+    # Ohne Fortschritt seit so vielen Sekunden gilt ein Lauf als abgebrochen
+    key_rotation_stale_seconds: int = 300
+
+    # zxcvbn-Analysen im Thread-Pool, Ergebnisse per HMAC des Passworts gecacht
+    password_strength_workers: int = 2
+    password_strength_queue_size: int = 32
+    password_strength_queue_timeout_seconds: float = 2.0
+    password_strength_cache_size: int = 1024
+    password_strength_cache_ttl_seconds: float = 600.0
+
+    # Vorrat an RSA Schlüsselpaaren für neue Benutzer
+    keypool_size: int = 8
+    keypool_workers: int = 1
+
+    # Audit-Log (gebündeltes Schreiben außerhalb der Request-Transaktion)
+    audit_flush_interval_ms: int = 200
+    audit_batch_size: int = 200
+    audit_max_queue: int = 10000
+    audit_spill_dir: Optional[str] = None  # Standard: <data_dir>/audit
+    # Diese Aktionen werden weiterhin in der Request-Transaktion geschrieben
+    audit_sync_actions: List[str] = [
+        "failed_login",
+        "delete_document",
+        "change_password",
+        "recovery_password_reset",
+        "setup_recovery",
+        "key_rotation"
+    ]
+
+    # Bearer-Token für GET /api/metrics; ohne Token ist der Endpunkt aus
+    metrics_token: Optional[str] = None
+
     # Server
     server_host: str = "0.0.0.0"
     server_port: int = 8000
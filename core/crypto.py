@@ -1,14 +1,268 @@
 from cryptography.hazmat.primitives import hashes, padding, serialization
-from cryptography.hazmat.primitives.asymmetric import rsa, padding as asymmetric_padding
+from cryptography.hazmat.primitives.asymmetric import padding as asymmetric_padding
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.fernet import Fernet
+from secure_vault.core import envelope
+from secure_vault.core.blobstore import BlobStore, get_blob_store
 from secure_vault.core.config import get_settings
+from secure_vault.core.executors import get_crypto_executor, get_kdf_executor
+from secure_vault.core.keypool import generate_rsa_keypair, get_keypair_pool
+from secure_vault.core.streaming import STREAM_FORMAT, StreamEncryptor, StreamDecryptor
+from secure_vault.utils.cache import LRUCache
+from secure_vault.utils.metrics import metrics
+import asyncio
 import base64
+import hashlib
+import hmac
 import os
 import json
+import uuid
 import jwt
 from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+def pbkdf2_sha256(password: bytes, salt: bytes, iterations: int) -> bytes:
+    """PBKDF2-SHA256 auf Modulebene, damit der Prozess-Pool sie picklen kann"""
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        iterations=iterations,
+    )
+    return kdf.derive(password)
+
+class PublicKeyCache:
+    """Cache geparster RSA Public Keys, Schlüssel (user_id, SHA-256 der PEM).
+
+    Ändert sich der Schlüssel eines Users, werden seine alten Einträge beim
+    nächsten Laden verworfen; invalidate_user() entfernt sie sofort.
+    """
+
+    def __init__(self, maxsize: int):
+        self._cache = LRUCache(maxsize)
+
+    def load(self, public_key_pem: bytes, user_id: Optional[str] = None):
+        cache_key = (user_id, hashlib.sha256(public_key_pem).digest())
+        public_key = self._cache.get(cache_key)
+        if public_key is not None:
+            metrics.increment("public_key_cache.hits")
+            return public_key
+
+        metrics.increment("public_key_cache.misses")
+        public_key = serialization.load_pem_public_key(public_key_pem)
+        if user_id is not None:
+            self.invalidate_user(user_id)
+        self._cache.set(cache_key, public_key)
+        metrics.set_gauge("public_key_cache.size", len(self._cache))
+        return public_key
+
+    def invalidate_user(self, user_id: str):
+        self._cache.invalidate(lambda key, value: key[0] == user_id)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+public_key_cache = PublicKeyCache(get_settings().public_key_cache_size)
+
+class UnlockedPrivateKey:
+    """Entsperrter Private Key einer Session"""
+
+    __slots__ = ("user_id", "fingerprint", "private_key")
+
+    def __init__(self, user_id: Optional[str], fingerprint: bytes, private_key):
+        self.user_id = user_id
+        self.fingerprint = fingerprint
+        self.private_key = private_key
+
+    def wipe(self):
+        # Letzte Referenz auf das OpenSSL-Objekt freigeben; OpenSSL
+        # überschreibt die privaten Parameter beim Freigeben (BN_clear_free).
+        # Python selbst bietet keinen sichereren Weg.
+        self.private_key = None
+        self.fingerprint = b""
+
+class PrivateKeyCache:
+    """Entsperrte Private Keys pro authentifizierter Session (Token-jti).
+
+    Die TTL gilt ab dem Entsperren und wird durch Zugriffe nicht verlängert.
+    Verdrängte, abgelaufene und gesperrte Einträge werden sofort gelöscht.
+    Ein Treffer setzt denselben verschlüsselten Key *und* denselben Master
+    Key voraus; dafür wird nur ein HMAC mit einem Schlüssel pro Prozess
+    gespeichert, nie der Master Key selbst.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = LRUCache(maxsize, ttl=ttl, on_evict=self._wipe)
+        self._fingerprint_key = os.urandom(32)
+
+    def _fingerprint(self, private_key_encrypted: bytes, master_key: bytes) -> bytes:
+        # master_key hat feste Länge, die Verkettung ist eindeutig
+        return hmac.new(
+            self._fingerprint_key,
+            master_key + hashlib.sha256(private_key_encrypted).digest(),
+            hashlib.sha256
+        ).digest()
+
+    @staticmethod
+    def _wipe(session_id: str, unlocked: UnlockedPrivateKey):
+        unlocked.wipe()
+        metrics.increment("private_key_cache.wiped")
+
+    def get(self, session_id: str, private_key_encrypted: bytes, master_key: bytes):
+        # Abgelaufene Keys auch ohne Zugriff auf ihre Session löschen
+        # (maxsize ist klein, der Scan kostet kaum etwas)
+        self._cache.purge_expired()
+        unlocked = self._cache.get(session_id)
+        # Nach einer Schlüsseländerung oder mit falschem Master Key passt
+        # der gecachte Key nicht
+        if unlocked is not None and hmac.compare_digest(
+            unlocked.fingerprint, self._fingerprint(private_key_encrypted, master_key)
+        ):
+            metrics.increment("private_key_cache.hits")
+            return unlocked.private_key
+        metrics.increment("private_key_cache.misses")
+        return None
+
+    def put(self,
+            session_id: str,
+            user_id: Optional[str],
+            private_key_encrypted: bytes,
+            master_key: bytes,
+            private_key):
+        self._cache.set(session_id, UnlockedPrivateKey(
+            user_id, self._fingerprint(private_key_encrypted, master_key), private_key
+        ))
+        metrics.set_gauge("private_key_cache.size", len(self._cache))
+
+    def lock(self, session_id: str):
+        self._cache.pop(session_id)
+        metrics.set_gauge("private_key_cache.size", len(self._cache))
+
+    def lock_user(self, user_id: str) -> int:
+        removed = self._cache.invalidate(lambda key, unlocked: unlocked.user_id == user_id)
+        metrics.set_gauge("private_key_cache.size", len(self._cache))
+        return removed
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+private_key_cache = PrivateKeyCache(
+    get_settings().private_key_cache_size,
+    get_settings().private_key_cache_ttl_seconds
+)
+
+OAEP_SHA256 = asymmetric_padding.OAEP(
+    mgf=asymmetric_padding.MGF1(algorithm=hashes.SHA256()),
+    algorithm=hashes.SHA256(),
+    label=None
+)
+
+def _wrap_key(key: bytes, public_key) -> bytes:
+    return public_key.encrypt(key, OAEP_SHA256)
+
+def _wrap_key_for_slice(key: bytes, recipients: List[Tuple[str, bytes]]) -> List[Tuple[str, bytes]]:
+    return [
+        (user_id, _wrap_key(key, public_key_cache.load(public_key_pem, user_id)))
+        for user_id, public_key_pem in recipients
+    ]
+
+class EncryptedDocument(NamedTuple):
+    """Eingabe für die Bulk-Operationen (Spalten von Document)"""
+    encrypted_content: Optional[bytes]
+    encrypted_key: bytes
+    metadata: Optional[str] = None
+    # Blob-Schlüssel für Dokumente im Stream-Format (Document.encrypted_path)
+    encrypted_path: Optional[str] = None
+
+def _decrypt_content(document_key: bytes, encrypted_content: bytes, metadata: Optional[str]) -> bytes:
+    meta = json.loads(metadata) if metadata else {}
+    if 'nonce' not in meta:
+        return envelope.open_envelope(envelope.parse(encrypted_content), document_key)
+
+    # Altes Format: Nonce und Tag base64 in den Metadaten
+    nonce = base64.b64decode(meta['nonce'])
+    tag = base64.b64decode(meta['tag'])
+    decryptor = Cipher(algorithms.AES(document_key), modes.GCM(nonce, tag)).decryptor()
+    return decryptor.update(encrypted_content) + decryptor.finalize()
+
+def _stream_metadata(metadata: Optional[str]) -> Optional[dict]:
+    """Metadaten eines Dokuments im Stream-Format, sonst None"""
+    meta = json.loads(metadata) if metadata else {}
+    return meta if meta.get('format') == STREAM_FORMAT else None
+
+def _decrypt_stream(document_key: bytes, store: BlobStore, blob_key: str, chunk_size: int) -> Iterator[bytes]:
+    """Liest einen Blob im Stream-Format und liefert den Klartext chunkweise"""
+    decryptor = StreamDecryptor(document_key)
+    with store.open(blob_key) as source:
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield decryptor.update(chunk)
+    yield decryptor.finalize()
+
+def _decrypt_slice(private_key, store: BlobStore, chunk_size: int, documents: List[EncryptedDocument]) -> List[bytes]:
+    results = []
+    for encrypted_content, encrypted_key, metadata, encrypted_path in documents:
+        document_key = private_key.decrypt(encrypted_key, OAEP_SHA256)
+        if _stream_metadata(metadata) is not None:
+            results.append(b"".join(_decrypt_stream(document_key, store, encrypted_path, chunk_size)))
+        else:
+            results.append(_decrypt_content(document_key, encrypted_content, metadata))
+    return results
+
+def _reencrypt_slice(private_key,
+                     public_key,
+                     key_id: int,
+                     store: BlobStore,
+                     chunk_size: int,
+                     documents: List[EncryptedDocument]) -> List[dict]:
+    results = []
+    for encrypted_content, encrypted_key, metadata, encrypted_path in documents:
+        old_key = private_key.decrypt(encrypted_key, OAEP_SHA256)
+        document_key = os.urandom(32)
+        stream_meta = _stream_metadata(metadata)
+        if stream_meta is not None:
+            # Chunk für Chunk vom alten in einen neuen Blob, der Klartext
+            # liegt nie vollständig im Speicher
+            encryptor = StreamEncryptor(document_key, stream_meta.get('chunk_size', chunk_size))
+            with store.writer() as writer:
+                writer.write(encryptor.header)
+                for plaintext in _decrypt_stream(old_key, store, encrypted_path, chunk_size):
+                    writer.write(encryptor.update(plaintext))
+                writer.write(encryptor.finalize())
+                blob_key = writer.commit()
+            results.append({
+                'encrypted_content': None,
+                'encrypted_path': blob_key,
+                'encrypted_key': _wrap_key(document_key, public_key),
+                'metadata': json.dumps({'format': STREAM_FORMAT, 'chunk_size': encryptor.chunk_size})
+            })
+            continue
+
+        # Dokument für Dokument, damit nie der Klartext des ganzen Slices im Speicher liegt
+        content = _decrypt_content(old_key, encrypted_content, metadata)
+        results.append({
+            'encrypted_content': envelope.seal(content, document_key, key_id=key_id),
+            'encrypted_path': None,
+            'encrypted_key': _wrap_key(document_key, public_key),
+            'metadata': json.dumps({'format': envelope.ENVELOPE_FORMAT})
+        })
+    return results
+
+def _rewrap_slice(private_key, public_key, wrapped_keys: List[bytes]) -> List[bytes]:
+    return [
+        _wrap_key(private_key.decrypt(wrapped_key, OAEP_SHA256), public_key)
+        for wrapped_key in wrapped_keys
+    ]
+
+def normalize_answer(answer: str) -> str:
+    """Groß-/Kleinschreibung und Leerzeichen spielen keine Rolle"""
+    return " ".join(answer.casefold().split())
+
+def _combine_answers(answers: List[str]) -> str:
+    return "\x1f".join(normalize_answer(answer) for answer in answers)
 
 class CryptoSystem:
     def __init__(self):
@@ -16,128 +270,270 @@ class CryptoSystem:
         self.jwt_secret = self.settings.jwt_secret.encode()
     
     def generate_user_keys(self, password: str) -> dict:
-        """Generiert alle Schlüssel für einen neuen Benutzer"""
-        # Generiere Master Salt
+        """Generiert alle Schlüssel für einen neuen Benutzer.
+
+        Hierarchie: Passwort --PBKDF2(master_salt)--> Wrapping Key, der den
+        zufälligen Master Key (KEK) verpackt; der Master Key verschlüsselt
+        den RSA Private Key, der die Document Keys verpackt. Passwort-
+        änderungen betreffen so nur ``master_key_wrapped``.
+        """
         master_salt = os.urandom(16)
-        
-        # Generiere Master Key aus Passwort
-        master_key = self._derive_key_from_password(password, master_salt)
-        
-        # Generiere RSA Schlüsselpaar
-        private_key = rsa.generate_private_key(
-            public_exponent=65537,
-            key_size=4096
-        )
-        public_key = private_key.public_key()
-        
-        # Verschlüssele Private Key mit Master Key
-        f = Fernet(base64.urlsafe_b64encode(master_key))
-        private_pem = private_key.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.PKCS8,
-            encryption_algorithm=serialization.NoEncryption()
-        )
-        encrypted_private_key = f.encrypt(private_pem)
+        wrapping_key = self._derive_key_from_password(password, master_salt)
+        return self._build_user_keys(master_salt, wrapping_key)
+
+    async def generate_user_keys_async(self, password: str) -> dict:
+        """Wie generate_user_keys, leitet den Wrapping Key aber im KDF-Pool
+        ab und nimmt das RSA Schlüsselpaar aus dem vorberechneten Vorrat"""
+        master_salt = os.urandom(16)
+        wrapping_key = await self._derive_key_from_password_async(password, master_salt)
+        keypair = await get_keypair_pool().acquire()
+        return self._build_user_keys(master_salt, wrapping_key, keypair)
+
+    def _build_user_keys(self,
+                         master_salt: bytes,
+                         wrapping_key: bytes,
+                         keypair: Optional[Tuple[bytes, bytes]] = None,
+                         key_id: int = 1) -> dict:
+        """Erzeugt den Master Key und verschlüsselt damit den Private Key"""
+        if keypair is None:
+            keypair = generate_rsa_keypair()
+        private_pem, public_pem = keypair
+        master_key = os.urandom(32)
         
         return {
             'master_salt': master_salt,
-            'master_key_encrypted': encrypted_private_key,
-            'public_key': public_key.public_bytes(
-                encoding=serialization.Encoding.PEM,
-                format=serialization.PublicFormat.SubjectPublicKeyInfo
-            )
+            'master_key': master_key,  # nur zur weiteren Verwendung, nie speichern
+            'master_key_wrapped': self.wrap_master_key(master_key, wrapping_key, key_id),
+            'master_key_encrypted': self.encrypt_private_key(private_pem, master_key),
+            'public_key': public_pem,
+            'key_id': key_id
         }
 
-    def encrypt_document(self, content: bytes, public_key_pem: bytes) -> dict:
-        """Verschlüsselt ein Dokument"""
+    def wrap_master_key(self, master_key: bytes, wrapping_key: bytes, key_id: int = 0) -> bytes:
+        """Verpackt den Master Key (Envelope, konstante Größe)"""
+        return bytes(envelope.seal(master_key, wrapping_key, key_id=key_id))
+
+    def unwrap_master_key(self, master_key_wrapped: bytes, wrapping_key: bytes) -> bytes:
+        """Gegenstück zu wrap_master_key; InvalidTag bei falschem Schlüssel"""
+        return bytes(envelope.open_envelope(envelope.parse(master_key_wrapped), wrapping_key))
+
+    async def unlock_master_key(self,
+                                password: str,
+                                master_salt: bytes,
+                                master_key_wrapped: bytes) -> bytes:
+        """Entsperrt den Master Key mit dem Passwort (KDF im Pool)"""
+        wrapping_key = await self._derive_key_from_password_async(password, master_salt)
+        return self.unwrap_master_key(master_key_wrapped, wrapping_key)
+
+    async def wrap_master_key_for_password(self,
+                                           master_key: bytes,
+                                           password: str,
+                                           key_id: int = 0) -> Tuple[bytes, bytes]:
+        """Verpackt den Master Key für ein (neues) Passwort mit frischem
+        Salt. Gibt (master_salt, master_key_wrapped) zurück."""
+        master_salt = os.urandom(16)
+        wrapping_key = await self._derive_key_from_password_async(password, master_salt)
+        return master_salt, self.wrap_master_key(master_key, wrapping_key, key_id)
+
+    def encrypt_private_key(self, private_pem: bytes, master_key: bytes) -> bytes:
+        """Verschlüsselt einen Private Key (PEM) mit dem Master Key"""
+        return Fernet(base64.urlsafe_b64encode(master_key)).encrypt(private_pem)
+
+    async def rewrap_keys(self,
+                          wrapped_keys: List[bytes],
+                          private_key,
+                          public_key_pem: bytes,
+                          user_id: Optional[str] = None) -> List[bytes]:
+        """Packt Document Keys vom alten auf ein neues Schlüsselpaar um
+        (Master-Key-Rotation); die Inhalte bleiben unberührt"""
+        public_key = public_key_cache.load(public_key_pem, user_id)
+        return await self._run_sliced(_rewrap_slice, wrapped_keys, private_key, public_key)
+
+    def encrypt_document(self,
+                         content: bytes,
+                         public_key_pem: bytes,
+                         user_id: Optional[str] = None,
+                         key_id: int = 0) -> dict:
+        """Verschlüsselt ein Dokument in ein binäres Envelope"""
         # Generiere Document Key
         document_key = os.urandom(32)
         
-        # Verschlüssele Content mit AES-GCM
-        nonce = os.urandom(12)
-        cipher = Cipher(
-            algorithms.AES(document_key),
-            modes.GCM(nonce)
-        )
-        encryptor = cipher.encryptor()
-        
-        encrypted_content = encryptor.update(content) + encryptor.finalize()
+        # Verschlüssele Content mit AES-GCM (Nonce und Tag im Envelope)
+        encrypted_content = envelope.seal(content, document_key, key_id=key_id)
         
         # Verschlüssele Document Key mit Public Key
-        public_key = serialization.load_pem_public_key(public_key_pem)
-        encrypted_key = public_key.encrypt(
-            document_key,
-            asymmetric_padding.OAEP(
-                mgf=asymmetric_padding.MGF1(algorithm=hashes.SHA256()),
-                algorithm=hashes.SHA256(),
-                label=None
-            )
-        )
+        encrypted_key = self.encrypt_key_for_recipient(document_key, public_key_pem, user_id)
         
         return {
             'encrypted_content': encrypted_content,
             'encrypted_key': encrypted_key,
             'document_key': document_key,
-            'metadata': json.dumps({
-                'nonce': base64.b64encode(nonce).decode(),
-                'tag': base64.b64encode(encryptor.tag).decode()
-            })
+            'metadata': json.dumps({'format': envelope.ENVELOPE_FORMAT})
         }
 
     def decrypt_document(self, 
                         encrypted_content: bytes,
                         encrypted_key: bytes,
-                        metadata: str,
+                        metadata: Optional[str],
                         private_key_encrypted: bytes,
-                        master_key: bytes) -> bytes:
-        """Entschlüsselt ein Dokument"""
-        # Entschlüssele Private Key
-        f = Fernet(base64.urlsafe_b64encode(master_key))
-        private_pem = f.decrypt(private_key_encrypted)
-        private_key = serialization.load_pem_private_key(private_pem, password=None)
+                        master_key: bytes,
+                        session_id: Optional[str] = None,
+                        user_id: Optional[str] = None) -> bytes:
+        """Entschlüsselt ein Dokument (Envelope oder alte JSON-Metadaten).
+
+        Mit ``session_id`` wird der entsperrte Private Key für weitere
+        Aufrufe derselben Session gecacht.
+        """
+        private_key = self.unlock_private_key(private_key_encrypted, master_key, session_id, user_id)
         
         # Entschlüssele Document Key
-        document_key = private_key.decrypt(
-            encrypted_key,
-            asymmetric_padding.OAEP(
-                mgf=asymmetric_padding.MGF1(algorithm=hashes.SHA256()),
-                algorithm=hashes.SHA256(),
-                label=None
-            )
+        document_key = private_key.decrypt(encrypted_key, OAEP_SHA256)
+        return _decrypt_content(document_key, encrypted_content, metadata)
+
+    async def decrypt_documents(self,
+                                documents: List[EncryptedDocument],
+                                private_key) -> List[bytes]:
+        """Entschlüsselt viele Dokumente mit einem entsperrten Private Key
+        (siehe unlock_private_key) parallel im Crypto-Pool.
+
+        Ergebnisse in Eingabereihenfolge; ein fehlerhaftes Dokument lässt
+        den ganzen Aufruf scheitern. Dokumente im Stream-Format werden aus
+        dem Blob Store gelesen (``encrypted_path``).
+        """
+        return await self._run_sliced(
+            _decrypt_slice, documents, private_key, get_blob_store(), self.settings.stream_chunk_size
         )
-        
-        # Entschlüssele Content
-        meta = json.loads(metadata)
-        nonce = base64.b64decode(meta['nonce'])
-        tag = base64.b64decode(meta['tag'])
-        
-        cipher = Cipher(
-            algorithms.AES(document_key),
-            modes.GCM(nonce, tag)
+
+    async def reencrypt_documents(self,
+                                  documents: List[EncryptedDocument],
+                                  private_key,
+                                  public_key_pem: bytes,
+                                  user_id: Optional[str] = None,
+                                  key_id: int = 0) -> List[dict]:
+        """Entschlüsselt viele Dokumente und verschlüsselt sie mit neuen
+        Document Keys für ``public_key_pem`` (Re-Keying, Migrationen).
+
+        Liefert je Dokument ein Ergebnis wie encrypt_document (ohne
+        document_key). Dokumente im Stream-Format bleiben im Stream-Format:
+        der neue Ciphertext liegt als eigener Blob unter ``encrypted_path``,
+        den alten Blob gibt der Aufrufer nach dem Commit frei.
+        """
+        public_key = public_key_cache.load(public_key_pem, user_id)
+        return await self._run_sliced(
+            _reencrypt_slice, documents, private_key, public_key, key_id,
+            get_blob_store(), self.settings.stream_chunk_size
         )
-        decryptor = cipher.decryptor()
-        
-        return decryptor.update(encrypted_content) + decryptor.finalize()
+
+    async def _run_sliced(self, func, items: list, *args) -> list:
+        """Verteilt ``items`` in einem Auftrag pro Worker auf den Crypto-Pool;
+        ``func(*args, slice)`` gibt eine Liste zurück"""
+        if not items:
+            return []
+        executor = get_crypto_executor()
+        slice_size = -(-len(items) // executor.max_workers)
+        slices = [items[i:i + slice_size] for i in range(0, len(items), slice_size)]
+        results = await asyncio.gather(*(
+            executor.run(func, *args, chunk) for chunk in slices
+        ))
+        return [item for result in results for item in result]
+
+    def unlock_private_key(self,
+                           private_key_encrypted: bytes,
+                           master_key: bytes,
+                           session_id: Optional[str] = None,
+                           user_id: Optional[str] = None):
+        """Gibt den entsperrten Private Key zurück, bei gesetzter
+        ``session_id`` aus dem Session-Cache"""
+        if session_id is None:
+            return self._load_private_key(private_key_encrypted, master_key)
+        private_key = private_key_cache.get(session_id, private_key_encrypted, master_key)
+        if private_key is None:
+            private_key = self._load_private_key(private_key_encrypted, master_key)
+            private_key_cache.put(session_id, user_id, private_key_encrypted, master_key, private_key)
+        return private_key
+
+    def lock_session(self, session_id: str):
+        """Verwirft den entsperrten Private Key einer Session (Logout)"""
+        private_key_cache.lock(session_id)
+
+    def lock_user(self, user_id: str):
+        """Verwirft alle entsperrten Private Keys eines Users"""
+        private_key_cache.lock_user(user_id)
+
+    def _load_private_key(self, private_key_encrypted: bytes, master_key: bytes):
+        """Entschlüsselt den mit dem Master-Key geschützten Private Key"""
+        f = Fernet(base64.urlsafe_b64encode(master_key))
+        private_pem = f.decrypt(private_key_encrypted)
+        return serialization.load_pem_private_key(private_pem, password=None)
+
+    def encrypt_with_key(self, data: bytes, key: bytes) -> bytes:
+        """Verschlüsselt kleine Daten mit AES-GCM (nonce || ciphertext || tag)"""
+        nonce = os.urandom(12)
+        encryptor = Cipher(algorithms.AES(key), modes.GCM(nonce)).encryptor()
+        ciphertext = encryptor.update(data) + encryptor.finalize()
+        return nonce + ciphertext + encryptor.tag
+
+    def decrypt_with_key(self, data: bytes, key: bytes) -> bytes:
+        """Gegenstück zu encrypt_with_key"""
+        nonce, ciphertext, tag = data[:12], data[12:-16], data[-16:]
+        decryptor = Cipher(algorithms.AES(key), modes.GCM(nonce, tag)).decryptor()
+        return decryptor.update(ciphertext) + decryptor.finalize()
+
+    def generate_message_key(self) -> bytes:
+        """Neuer AES-256 Schlüssel für eine Nachricht"""
+        return os.urandom(32)
+
+    def encrypt_message(self, content: bytes, message_key: bytes) -> bytes:
+        """Verschlüsselt den Nachrichteninhalt (Format wie encrypt_with_key)"""
+        return self.encrypt_with_key(content, message_key)
+
+    def decrypt_message(self, encrypted_content: bytes, message_key: bytes) -> bytes:
+        return self.decrypt_with_key(encrypted_content, message_key)
+
+    def encrypt_key_for_recipient(self,
+                                  key: bytes,
+                                  public_key_pem: bytes,
+                                  user_id: Optional[str] = None) -> bytes:
+        """Verschlüsselt einen symmetrischen Schlüssel mit RSA-OAEP"""
+        return _wrap_key(key, public_key_cache.load(public_key_pem, user_id))
+
+    async def encrypt_key_for_recipients(self,
+                                         key: bytes,
+                                         public_keys: Dict[str, bytes]) -> Dict[str, bytes]:
+        """Verschlüsselt einen Schlüssel für viele Empfänger parallel im
+        Crypto-Pool. ``public_keys`` bildet user_id auf PEM ab."""
+        # Ein Pool-Auftrag pro Worker statt pro Empfänger
+        return dict(await self._run_sliced(_wrap_key_for_slice, list(public_keys.items()), key))
+
+    def stream_encryptor(self, key: bytes) -> StreamEncryptor:
+        """Erzeugt einen Encryptor für das chunked Stream-Format"""
+        return StreamEncryptor(key, self.settings.stream_chunk_size)
+
+    def stream_decryptor(self, key: bytes) -> StreamDecryptor:
+        return StreamDecryptor(key)
 
     def create_access_token(self, user_id: str) -> str:
         """Erstellt einen JWT Token"""
-        expire = datetime.utcnow() + timedelta(
+        now = datetime.utcnow()
+        expire = now + timedelta(
             hours=self.settings.token_validity_hours
         )
         to_encode = {
             "sub": user_id,
+            "jti": uuid.uuid4().hex,
+            "iat": now,
             "exp": expire
         }
         return jwt.encode(to_encode, self.jwt_secret, algorithm="HS256")
 
-def verify_password(self, password: str, password_hash: str) -> bool:
+    def verify_password(self, password: str, password_hash: str) -> bool:
         """Verifiziert ein Passwort"""
         salt, stored_hash = password_hash.split(':')
         derived_key = self._derive_key_from_password(
             password, 
             base64.b64decode(salt)
         )
-        return base64.b64encode(derived_key).decode() == stored_hash
+        return hmac.compare_digest(base64.b64encode(derived_key).decode(), stored_hash)
 
     def hash_password(self, password: str) -> str:
         """Hasht ein Passwort für die Speicherung"""
@@ -145,43 +541,82 @@ def verify_password(self, password: str, password_hash: str) -> bool:
         derived_key = self._derive_key_from_password(password, salt)
         return f"{base64.b64encode(salt).decode()}:{base64.b64encode(derived_key).decode()}"
 
+    async def verify_password_async(self, password: str, password_hash: str) -> bool:
+        """Verifiziert ein Passwort im KDF-Pool"""
+        salt, stored_hash = password_hash.split(':')
+        derived_key = await self._derive_key_from_password_async(
+            password,
+            base64.b64decode(salt)
+        )
+        return hmac.compare_digest(base64.b64encode(derived_key).decode(), stored_hash)
+
+    async def hash_password_async(self, password: str) -> str:
+        """Hasht ein Passwort im KDF-Pool"""
+        salt = os.urandom(16)
+        derived_key = await self._derive_key_from_password_async(password, salt)
+        return f"{base64.b64encode(salt).decode()}:{base64.b64encode(derived_key).decode()}"
+
+    def hash_answer(self, answer: str) -> str:
+        """Hasht eine Recovery-Antwort (normalisiert, Format wie hash_password)"""
+        return self.hash_password(normalize_answer(answer))
+
+    def verify_answer(self, answer: str, answer_hash: str) -> bool:
+        return self.verify_password(normalize_answer(answer), answer_hash)
+
+    def derive_key_from_answers(self, answers: List[str], salt: bytes) -> bytes:
+        """Recovery-Key aus allen Antworten (in Reihenfolge der Fragen)"""
+        return self._derive_key_from_password(_combine_answers(answers), salt)
+
+    async def hash_answers_async(self, answers: List[str]) -> List[str]:
+        """Hasht alle Antworten gleichzeitig im KDF-Pool"""
+        return list(await asyncio.gather(*(
+            self.hash_password_async(normalize_answer(answer)) for answer in answers
+        )))
+
+    async def verify_answers_async(self, answers: List[str], answer_hashes: List[str]) -> List[bool]:
+        """Prüft alle Antworten gleichzeitig im KDF-Pool"""
+        return list(await asyncio.gather(*(
+            self.verify_password_async(normalize_answer(answer), answer_hash)
+            for answer, answer_hash in zip(answers, answer_hashes)
+        )))
+
+    async def derive_key_from_answers_async(self, answers: List[str], salt: bytes) -> bytes:
+        return await self._derive_key_from_password_async(_combine_answers(answers), salt)
+
     def _derive_key_from_password(self, password: str, salt: bytes) -> bytes:
         """Leitet einen Schlüssel aus einem Passwort ab"""
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=self.settings.crypto_iterations,
-        )
-        return kdf.derive(password.encode())
-
-    def encrypt_preview(self, preview_data: bytes, public_key_pem: bytes) -> bytes:
-        """Verschlüsselt eine Dokumentvorschau"""
-        preview_key = os.urandom(32)
-        cipher = Cipher(
-            algorithms.AES(preview_key),
-            modes.GCM(os.urandom(12))
-        )
-        encryptor = cipher.encryptor()
-        encrypted_preview = encryptor.update(preview_data) + encryptor.finalize()
-        
-        # Verschlüssele Preview Key mit Public Key
-        public_key = serialization.load_pem_public_key(public_key_pem)
-        encrypted_key = public_key.encrypt(
-            preview_key,
-            asymmetric_padding.OAEP(
-                mgf=asymmetric_padding.MGF1(algorithm=hashes.SHA256()),
-                algorithm=hashes.SHA256(),
-                label=None
-            )
+        return pbkdf2_sha256(password.encode(), salt, self.settings.crypto_iterations)
+
+    async def _derive_key_from_password_async(self, password: str, salt: bytes) -> bytes:
+        """Leitet einen Schlüssel im KDF-Pool ab, ohne den Event-Loop zu blockieren"""
+        return await get_kdf_executor().run(
+            pbkdf2_sha256,
+            password.encode(),
+            salt,
+            self.settings.crypto_iterations
         )
-        
-        # Kombiniere für Speicherung
-        return base64.b64encode(
-            json.dumps({
-                'preview': base64.b64encode(encrypted_preview).decode(),
-                'key': base64.b64encode(encrypted_key).decode(),
-                'nonce': base64.b64encode(encryptor.nonce).decode(),
-                'tag': base64.b64encode(encryptor.tag).decode()
-            }).encode()
-        )
\ No newline at end of file
+
+    def encrypt_preview(self, preview_data: bytes, document_key: bytes, key_id: int = 0) -> bytes:
+        """Verschlüsselt eine Dokumentvorschau mit dem Document Key in ein
+        Envelope.
+
+        Ohne eigenen verpackten Schlüssel: die Vorschau ist über
+        ``Document.encrypted_key`` lesbar, den die Key-Rotation umpackt.
+        """
+        return envelope.seal(preview_data, document_key, key_id=key_id)
+
+    def decrypt_preview(self,
+                        encrypted_preview: bytes,
+                        encrypted_key: bytes,
+                        private_key_encrypted: bytes,
+                        master_key: bytes,
+                        session_id: Optional[str] = None,
+                        user_id: Optional[str] = None) -> bytes:
+        """Entschlüsselt eine Vorschau mit dem Document Key
+        (Envelope oder älteres Format von encrypt_with_key)"""
+        private_key = self.unlock_private_key(private_key_encrypted, master_key, session_id, user_id)
+        document_key = private_key.decrypt(encrypted_key, OAEP_SHA256)
+        if envelope.is_envelope(encrypted_preview):
+            return envelope.open_envelope(envelope.parse(encrypted_preview), document_key)
+        # Vorschauen von vor dem Envelope-Format: nonce || ciphertext || tag
+        return self.decrypt_with_key(encrypted_preview, document_key)
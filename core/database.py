@@ -1,7 +1,11 @@
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
-from secure_vault.core.config import get_settings
-import databases
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from secure_vault.core.config import get_settings, Settings
+from secure_vault.core.writequeue import QueuedWriteSession, SQLiteWriteQueue
+from secure_vault.utils.metrics import metrics
+import time
 
 settings = get_settings()
 
@@ -13,21 +17,134 @@ elif settings.database_type == "postgresql":
 elif settings.database_type == "mysql":
     DATABASE_URL = f"mysql+aiomysql://{settings.database_user}:{settings.database_password}@{settings.database_host}:{settings.database_port}/{settings.database_name}"
 
-# SQLAlchemy specific setup
-engine = create_async_engine(DATABASE_URL)
-AsyncSessionLocal = sessionmaker(
-    engine, class_=AsyncSession, expire_on_commit=False
-)
 
-Base = declarative_base()
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Connection-Pool, der Wartezeiten beim Checkout als Metrik meldet"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            metrics.increment("db.pool.checkout_errors")
+            raise
+        finally:
+            metrics.observe("db.pool.checkout_wait_ms", (time.perf_counter() - start) * 1000)
+            metrics.set_gauge("db.pool.checked_out", self.checkedout())
+
+
+def engine_options(settings: Settings) -> dict:
+    """Pool- und Treiberoptionen für create_async_engine"""
+    options = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.database_pool_size,
+        "max_overflow": settings.database_max_overflow,
+        "pool_timeout": settings.database_pool_timeout_seconds,
+        "pool_recycle": settings.database_pool_recycle_seconds,
+        "pool_pre_ping": settings.database_pool_pre_ping,
+    }
+    if settings.database_type == "postgresql":
+        options["connect_args"] = {
+            # Cache von asyncpg selbst und der des SQLAlchemy-Adapters
+            "statement_cache_size": settings.database_statement_cache_size,
+            "prepared_statement_cache_size": settings.database_statement_cache_size,
+        }
+    elif settings.database_type == "sqlite":
+        options["connect_args"] = {"timeout": settings.sqlite_busy_timeout_ms / 1000}
+    return options
+
+
+def sqlite_pragmas(settings: Settings) -> dict:
+    return {
+        "journal_mode": settings.sqlite_journal_mode,
+        "synchronous": settings.sqlite_synchronous,
+        "mmap_size": settings.sqlite_mmap_size,
+        "busy_timeout": settings.sqlite_busy_timeout_ms,
+        "foreign_keys": "ON",
+    }
+
+
+def install_sqlite_pragmas(engine, pragmas: dict):
+    """Setzt die PRAGMAs auf jeder neuen SQLite-Verbindung"""
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def install_sqlite_write_transactions(engine):
+    """Transaktionen selbst mit BEGIN IMMEDIATE starten.
+
+    pysqlite/aiosqlite verwalten Transaktionen sonst selbst, was SAVEPOINTs
+    bricht; IMMEDIATE holt den Schreib-Lock sofort statt erst beim ersten
+    INSERT (kein Lock-Upgrade-Deadlock zwischen Prozessen).
+    """
+    @event.listens_for(engine.sync_engine, "connect")
+    def _disable_implicit_begin(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def _begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+write_queue = None
 
-# Database instance
-database = databases.Database(DATABASE_URL)
+if settings.database_type == "sqlite" and settings.sqlite_single_writer:
+    # Single-Writer-Modus: eine Schreibverbindung, die nur der Writer-Task
+    # benutzt, und ein Read-only-Pool für alle Requests
+    db_path = f"{settings.data_dir}/{settings.database_name}"
+    engine = create_async_engine(
+        DATABASE_URL,
+        **dict(engine_options(settings), pool_size=1, max_overflow=0)
+    )
+    install_sqlite_pragmas(engine, sqlite_pragmas(settings))
+    install_sqlite_write_transactions(engine)
+
+    read_engine = create_async_engine(
+        f"sqlite+aiosqlite:///file:{db_path}?mode=ro&uri=true",
+        **engine_options(settings)
+    )
+    read_pragmas = sqlite_pragmas(settings)
+    del read_pragmas["journal_mode"]  # read-only Verbindungen können ihn nicht setzen
+    install_sqlite_pragmas(read_engine, read_pragmas)
+
+    write_queue = SQLiteWriteQueue(
+        sessionmaker(engine, class_=AsyncSession, expire_on_commit=False),
+        max_batch=settings.sqlite_write_batch_size,
+        batch_window_ms=settings.sqlite_write_batch_window_ms
+    )
+    AsyncSessionLocal = sessionmaker(
+        read_engine, class_=QueuedWriteSession, expire_on_commit=False,
+        write_queue=write_queue
+    )
+else:
+    # Eine Engine (und damit ein Pool) pro Prozess
+    engine = read_engine = create_async_engine(DATABASE_URL, **engine_options(settings))
+    if settings.database_type == "sqlite":
+        install_sqlite_pragmas(engine, sqlite_pragmas(settings))
+
+    AsyncSessionLocal = sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+Base = declarative_base()
 
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
+async def dispose_db():
+    if write_queue is not None:
+        await write_queue.stop()
+    if read_engine is not engine:
+        await read_engine.dispose()
+    await engine.dispose()
+
 async def get_db() -> AsyncSession:
     async with AsyncSessionLocal() as session:
         try:
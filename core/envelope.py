@@ -0,0 +1,124 @@
+"""Binäres Envelope-Format für AES-GCM verschlüsselte Objekte.
+
+Aufbau (big-endian)::
+
+    magic    4 Bytes  b"SVEN"
+    version  1 Byte   1
+    flags    1 Byte   Bit 0: eingebetteter, mit RSA-OAEP verpackter Schlüssel
+    key_id   4 Bytes  Kennung des Schlüssels, der den Inhaltsschlüssel verpackt
+    nonce   12 Bytes
+    tag     16 Bytes
+    [u16 Länge + verpackter Schlüssel, falls Flag gesetzt]
+    ciphertext
+
+magic, version, flags und key_id gehen als AAD in die Authentifizierung
+ein. Ver- und Entschlüsselung schreiben direkt in einen vorab allokierten
+Puffer (``update_into``), ohne Zwischenkopien des Inhalts.
+"""
+import os
+import struct
+from typing import NamedTuple, Optional
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+MAGIC = b"SVEN"
+VERSION = 1
+ENVELOPE_FORMAT = "envelope-v1"
+FLAG_WRAPPED_KEY = 0x01
+
+_PREFIX = struct.Struct(">4sBBI")
+_HEADER = struct.Struct(">4sBBI12s16s")
+_KEY_LENGTH = struct.Struct(">H")
+NONCE_SIZE = 12
+TAG_SIZE = 16
+# update_into verlangt Platz für einen zusätzlichen Block
+_BLOCK_SLACK = 15
+
+
+class EnvelopeError(Exception):
+    """Daten sind kein gültiges Envelope"""
+
+
+class Envelope(NamedTuple):
+    version: int
+    key_id: int
+    nonce: bytes
+    tag: bytes
+    wrapped_key: Optional[bytes]
+    ciphertext: memoryview
+    aad: bytes
+
+
+def is_envelope(data) -> bool:
+    return len(data) >= _HEADER.size and bytes(data[:4]) == MAGIC
+
+
+def seal(plaintext, key: bytes, key_id: int = 0, wrapped_key: Optional[bytes] = None) -> bytearray:
+    """Verschlüsselt ``plaintext`` mit ``key`` in ein Envelope"""
+    flags = FLAG_WRAPPED_KEY if wrapped_key is not None else 0
+    nonce = os.urandom(NONCE_SIZE)
+    prefix = _PREFIX.pack(MAGIC, VERSION, flags, key_id)
+
+    offset = _HEADER.size
+    if wrapped_key is not None:
+        offset += _KEY_LENGTH.size + len(wrapped_key)
+    size = offset + len(plaintext)
+
+    buffer = bytearray(size + _BLOCK_SLACK)
+    view = memoryview(buffer)
+    if wrapped_key is not None:
+        _KEY_LENGTH.pack_into(buffer, _HEADER.size, len(wrapped_key))
+        view[_HEADER.size + _KEY_LENGTH.size:offset] = wrapped_key
+
+    encryptor = Cipher(algorithms.AES(key), modes.GCM(nonce)).encryptor()
+    encryptor.authenticate_additional_data(prefix)
+    # GCM ist ein Stream-Modus: update_into schreibt alles, finalize nichts
+    encryptor.update_into(plaintext, view[offset:])
+    encryptor.finalize()
+    _HEADER.pack_into(buffer, 0, MAGIC, VERSION, flags, key_id, nonce, encryptor.tag)
+
+    view.release()
+    del buffer[size:]
+    return buffer
+
+
+def parse(data) -> Envelope:
+    """Liest den Header eines Envelopes (ohne den Ciphertext zu kopieren)"""
+    view = memoryview(data)
+    if not is_envelope(view):
+        raise EnvelopeError("Not an envelope")
+    magic, version, flags, key_id, nonce, tag = _HEADER.unpack_from(view, 0)
+    if version != VERSION:
+        raise EnvelopeError(f"Unsupported envelope version: {version}")
+
+    offset = _HEADER.size
+    wrapped_key = None
+    if flags & FLAG_WRAPPED_KEY:
+        (key_length,) = _KEY_LENGTH.unpack_from(view, offset)
+        offset += _KEY_LENGTH.size
+        wrapped_key = bytes(view[offset:offset + key_length])
+        offset += key_length
+        if offset > len(view):
+            raise EnvelopeError("Truncated envelope")
+
+    return Envelope(
+        version=version,
+        key_id=key_id,
+        nonce=nonce,
+        tag=tag,
+        wrapped_key=wrapped_key,
+        ciphertext=view[offset:],
+        aad=bytes(view[:_PREFIX.size])
+    )
+
+
+def open_envelope(envelope: Envelope, key: bytes) -> bytearray:
+    """Entschlüsselt ein geparstes Envelope; wirft InvalidTag bei Manipulation"""
+    ciphertext = envelope.ciphertext
+    decryptor = Cipher(algorithms.AES(key), modes.GCM(envelope.nonce, envelope.tag)).decryptor()
+    decryptor.authenticate_additional_data(envelope.aad)
+    buffer = bytearray(len(ciphertext) + _BLOCK_SLACK)
+    written = decryptor.update_into(ciphertext, buffer)
+    decryptor.finalize()
+    del buffer[written:]
+    return buffer
@@ -0,0 +1,169 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Any, Callable, Optional
+
+from secure_vault.core.config import get_settings
+from secure_vault.utils.metrics import metrics
+
+
+class ExecutorSaturated(Exception):
+    """Wird geworfen, wenn die Warteschlange eines Worker-Pools voll ist"""
+
+    def __init__(self, name: str, retry_after: int = 1):
+        super().__init__(f"{name} executor is saturated")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    """Worker-Pool mit begrenzter Warteschlange und Back-Pressure.
+
+    Höchstens ``max_workers + max_queue`` Aufgaben sind gleichzeitig in
+    Bearbeitung oder wartend. Weitere Aufrufer warten bis zu
+    ``queue_timeout`` Sekunden auf einen freien Platz und erhalten danach
+    ``ExecutorSaturated``.
+    """
+
+    def __init__(self,
+                 name: str,
+                 kind: str,
+                 max_workers: int,
+                 max_queue: int,
+                 queue_timeout: float):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor type: {kind}")
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(max_workers + max_queue)
+        self._executor: Optional[Executor] = None
+        self._in_flight = 0
+
+    @property
+    def executor(self) -> Executor:
+        """Erzeugt den eigentlichen Pool erst bei der ersten Verwendung"""
+        if self._executor is None:
+            if self.kind == "process":
+                # spawn statt fork: der Event-Loop des Elternprozesses
+                # darf nicht in die Worker kopiert werden
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix=f"secure_vault_{self.name}"
+                )
+        return self._executor
+
+    @property
+    def in_flight(self) -> int:
+        """Anzahl laufender und wartender Aufgaben"""
+        return self._in_flight
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Führt ``func`` im Pool aus, ohne den Event-Loop zu blockieren.
+
+        Wird der Aufrufer abgebrochen (z.B. durch ``asyncio.wait_for``),
+        bleibt der Platz belegt, bis die Aufgabe im Worker wirklich endet;
+        sonst liefen mehr Aufgaben gleichzeitig als ``max_workers``.
+        """
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            metrics.increment(f"executor.{self.name}.rejected")
+            raise ExecutorSaturated(self.name, retry_after=max(1, int(self.queue_timeout)))
+
+        self._in_flight += 1
+        metrics.set_gauge(f"executor.{self.name}.in_flight", self._in_flight)
+        loop = asyncio.get_running_loop()
+        try:
+            future = self.executor.submit(partial(func, *args, **kwargs))
+        except BaseException:
+            self._release()
+            raise
+        # Läuft im Thread des Pools, sobald die Aufgabe fertig oder
+        # (noch wartend) abgebrochen ist
+        future.add_done_callback(lambda _: self._release_threadsafe(loop))
+        return await asyncio.wrap_future(future)
+
+    def _release(self):
+        self._in_flight -= 1
+        metrics.set_gauge(f"executor.{self.name}.in_flight", self._in_flight)
+        self._slots.release()
+
+    def _release_threadsafe(self, loop: asyncio.AbstractEventLoop):
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # Event-Loop bereits geschlossen (Shutdown)
+            pass
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+@lru_cache()
+def get_kdf_executor() -> BoundedExecutor:
+    """Pool für PBKDF2-Ableitungen (Login, Passwortänderung, Recovery)"""
+    settings = get_settings()
+    return BoundedExecutor(
+        name="kdf",
+        kind=settings.kdf_executor_type,
+        max_workers=settings.kdf_workers,
+        max_queue=settings.kdf_queue_size,
+        queue_timeout=settings.kdf_queue_timeout_seconds
+    )
+
+
+@lru_cache()
+def get_crypto_executor() -> BoundedExecutor:
+    """Thread-Pool für RSA/AES-Operationen; cryptography gibt dabei den GIL frei"""
+    settings = get_settings()
+    return BoundedExecutor(
+        name="crypto",
+        kind="thread",
+        max_workers=settings.crypto_workers,
+        max_queue=settings.crypto_queue_size,
+        queue_timeout=settings.crypto_queue_timeout_seconds
+    )
+
+
+@lru_cache()
+def get_preview_executor() -> BoundedExecutor:
+    """Prozess-Pool für das Dekodieren von Bildern (Vorschaubilder)"""
+    settings = get_settings()
+    return BoundedExecutor(
+        name="preview",
+        kind="process",
+        max_workers=settings.preview_workers,
+        max_queue=settings.preview_queue_size,
+        queue_timeout=settings.preview_queue_timeout_seconds
+    )
+
+
+@lru_cache()
+def get_password_executor() -> BoundedExecutor:
+    """Thread-Pool für zxcvbn-Analysen (Wörterbücher teilt sich der Prozess)"""
+    settings = get_settings()
+    return BoundedExecutor(
+        name="password",
+        kind="thread",
+        max_workers=settings.password_strength_workers,
+        max_queue=settings.password_strength_queue_size,
+        queue_timeout=settings.password_strength_queue_timeout_seconds
+    )
+
+
+def shutdown_executors():
+    """Beendet alle bereits erzeugten Pools (Server-Shutdown)"""
+    for factory in (get_kdf_executor, get_crypto_executor, get_preview_executor, get_password_executor):
+        if factory.cache_info().currsize:
+            factory().shutdown()
@@ -0,0 +1,179 @@
+import asyncio
+import collections
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Deque, Optional, Tuple
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from secure_vault.core.config import get_settings
+from secure_vault.utils.metrics import metrics
+
+logger = logging.getLogger('secure_vault.keypool')
+
+KeyPair = Tuple[bytes, bytes]  # (private_pem, public_pem)
+
+
+def _lower_priority():
+    """Worker laufen mit niedriger Priorität, damit Requests Vorrang haben"""
+    try:
+        os.nice(10)
+    except (AttributeError, OSError):
+        pass
+
+
+def generate_rsa_keypair(key_size: int = 4096) -> KeyPair:
+    """Erzeugt ein RSA Schlüsselpaar als PEM (läuft im Worker-Prozess)"""
+    private_key = rsa.generate_private_key(
+        public_exponent=65537,
+        key_size=key_size
+    )
+    private_pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+    public_pem = private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return private_pem, public_pem
+
+
+class KeyPairPool:
+    """Vorrat an frisch erzeugten RSA-4096 Schlüsselpaaren.
+
+    Ein Hintergrund-Task hält den Vorrat auf ``target_size`` und lässt die
+    Schlüssel in Worker-Prozessen mit niedriger Priorität erzeugen.
+    ``acquire`` entnimmt ein Paar und erzeugt nur bei leerem Vorrat eines
+    auf Anfrage, in einem eigenen Prozess-Pool mit normaler Priorität:
+    im Refill-Pool stünde der wartende Request hinter dem ganzen Batch.
+    """
+
+    def __init__(self, target_size: int, workers: int, key_size: int = 4096):
+        self.target_size = target_size
+        self.workers = workers
+        self.key_size = key_size
+        self._keys: Deque[KeyPair] = collections.deque()
+        self._refill_times: Deque[float] = collections.deque()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._fallback_executor: Optional[ProcessPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_lower_priority
+            )
+        return self._executor
+
+    @property
+    def fallback_executor(self) -> ProcessPoolExecutor:
+        """Pool für acquire() bei leerem Vorrat, unabhängig vom Refill"""
+        if self._fallback_executor is None:
+            self._fallback_executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._fallback_executor
+
+    @property
+    def depth(self) -> int:
+        return len(self._keys)
+
+    async def start(self):
+        if self._task is None and self.target_size > 0:
+            self._task = asyncio.create_task(self._refill_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for executor in (self._executor, self._fallback_executor):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._fallback_executor = None
+
+    def pop(self) -> Optional[KeyPair]:
+        """Entnimmt ein Schlüsselpaar oder None, wenn der Vorrat leer ist"""
+        try:
+            keypair = self._keys.popleft()
+        except IndexError:
+            return None
+        self._update_depth()
+        self._wakeup.set()
+        return keypair
+
+    async def acquire(self) -> KeyPair:
+        """Liefert ein Schlüsselpaar, notfalls direkt erzeugt"""
+        keypair = self.pop()
+        if keypair is not None:
+            metrics.increment("keypool.hits")
+            return keypair
+
+        metrics.increment("keypool.misses")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.fallback_executor, generate_rsa_keypair, self.key_size
+        )
+
+    async def _refill_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            missing = self.target_size - len(self._keys)
+            if missing <= 0:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            batch = min(missing, self.workers)
+            try:
+                keypairs = await asyncio.gather(*(
+                    loop.run_in_executor(self.executor, generate_rsa_keypair, self.key_size)
+                    for _ in range(batch)
+                ))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Key pool refill failed")
+                await asyncio.sleep(5)
+                continue
+
+            self._keys.extend(keypairs)
+            self._record_refill(len(keypairs))
+
+    def _record_refill(self, count: int):
+        now = time.monotonic()
+        for _ in range(count):
+            self._refill_times.append(now)
+        while self._refill_times and now - self._refill_times[0] > 60:
+            self._refill_times.popleft()
+        metrics.increment("keypool.refilled", count)
+        metrics.set_gauge("keypool.refill_rate_per_minute", len(self._refill_times))
+        self._update_depth()
+
+    def _update_depth(self):
+        metrics.set_gauge("keypool.depth", len(self._keys))
+
+
+@lru_cache()
+def get_keypair_pool() -> KeyPairPool:
+    settings = get_settings()
+    return KeyPairPool(
+        target_size=settings.keypool_size,
+        workers=settings.keypool_workers
+    )
@@ -0,0 +1,227 @@
+"""Daten-Migrationen für bestehende Installationen.
+
+Aufruf: ``python -m secure_vault.core.migrations <name> [<name> ...]``
+Alle Migrationen sind idempotent und können nach einem Abbruch erneut
+gestartet werden.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict
+
+from sqlalchemy import insert, inspect, select, text, update
+from sqlalchemy.schema import CreateColumn
+
+from secure_vault.core.blobstore import get_blob_store
+from secure_vault.core.database import AsyncSessionLocal, Base, dispose_db, engine, init_db
+from secure_vault.models.models import Document, DocumentTag, Message, MessageRecipient
+
+logger = logging.getLogger('secure_vault.migrations')
+
+MIGRATIONS: Dict[str, Callable[..., Awaitable[int]]] = {}
+
+
+def migration(name: str):
+    def decorator(func):
+        MIGRATIONS[name] = func
+        return func
+    return decorator
+
+
+@migration("blobs")
+async def migrate_document_blobs(batch_size: int = 50) -> int:
+    """Verschiebt Document.encrypted_content in den Blob Store"""
+    store = get_blob_store()
+    moved = 0
+    while True:
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(
+                select(Document.document_id, Document.encrypted_content)
+                .where(Document.encrypted_content.isnot(None))
+                .limit(batch_size)
+            )).all()
+            if not rows:
+                break
+
+            for document_id, encrypted_content in rows:
+                # Blob zuerst schreiben: ein Abbruch hinterlässt höchstens
+                # einen verwaisten, inhaltsadressierten Blob
+                blob_key = await store.put_async(encrypted_content)
+                await session.execute(
+                    update(Document)
+                    .where(Document.document_id == document_id)
+                    .values(encrypted_path=blob_key, encrypted_content=None)
+                )
+            await session.commit()
+
+        moved += len(rows)
+        logger.info("Moved %d document blobs", moved)
+    return moved
+
+
+@migration("message_recipients")
+async def backfill_message_recipients(batch_size: int = 500) -> int:
+    """Füllt message_recipients aus dem JSON in Message.encrypted_keys.
+
+    Das JSON wird danach geleert: die Key-Rotation packt nur
+    message_recipients um, die Kopie bliebe beim alten Schlüsselpaar.
+    """
+    inserted = 0
+    last_message_id = ""
+    while True:
+        async with AsyncSessionLocal() as session:
+            messages = (await session.execute(
+                select(Message.message_id, Message.created_at, Message.encrypted_keys)
+                .where(Message.message_id > last_message_id)
+                .order_by(Message.message_id)
+                .limit(batch_size)
+            )).all()
+            if not messages:
+                break
+            last_message_id = messages[-1].message_id
+
+            existing = {
+                tuple(row) for row in (await session.execute(
+                    select(MessageRecipient.message_id, MessageRecipient.user_id)
+                    .where(MessageRecipient.message_id.in_([m.message_id for m in messages]))
+                )).all()
+            }
+
+            rows = []
+            for message in messages:
+                for user_id, key_hex in json.loads(message.encrypted_keys or "{}").items():
+                    if (message.message_id, user_id) in existing:
+                        continue
+                    rows.append({
+                        "message_id": message.message_id,
+                        "user_id": user_id,
+                        "encrypted_key": bytes.fromhex(key_hex),
+                        "created_at": message.created_at
+                    })
+            if rows:
+                await session.execute(insert(MessageRecipient), rows)
+            await session.execute(
+                update(Message)
+                .where(Message.message_id.in_([m.message_id for m in messages if m.encrypted_keys]))
+                .values(encrypted_keys=None)
+            )
+            await session.commit()
+
+        inserted += len(rows)
+        logger.info("Backfilled %d message recipients", inserted)
+    return inserted
+
+
+def _legacy_tags(value: str) -> list:
+    """Document.tags war teils JSON-Liste, teils kommagetrennt"""
+    try:
+        tags = json.loads(value)
+    except ValueError:
+        tags = value.split(',')
+    if not isinstance(tags, list):
+        tags = [tags]
+    return list(dict.fromkeys(str(t).strip()[:64] for t in tags if str(t).strip()))
+
+
+@migration("document_tags")
+async def backfill_document_tags(batch_size: int = 500) -> int:
+    """Füllt document_tags aus der Freitextspalte Document.tags"""
+    inserted = 0
+    last_document_id = ""
+    while True:
+        async with AsyncSessionLocal() as session:
+            documents = (await session.execute(
+                select(Document.document_id, Document.tags)
+                .where(Document.document_id > last_document_id)
+                .where(Document.tags.isnot(None))
+                .order_by(Document.document_id)
+                .limit(batch_size)
+            )).all()
+            if not documents:
+                break
+            last_document_id = documents[-1].document_id
+
+            existing = {
+                tuple(row) for row in (await session.execute(
+                    select(DocumentTag.document_id, DocumentTag.tag)
+                    .where(DocumentTag.document_id.in_([d.document_id for d in documents]))
+                )).all()
+            }
+
+            rows = [
+                {"tag_id": str(uuid.uuid4()), "document_id": document.document_id, "tag": tag}
+                for document in documents
+                for tag in _legacy_tags(document.tags)
+                if (document.document_id, tag) not in existing
+            ]
+            if rows:
+                await session.execute(insert(DocumentTag), rows)
+            await session.commit()
+
+        inserted += len(rows)
+        logger.info("Backfilled %d document tags", inserted)
+    return inserted
+
+
+@migration("columns")
+async def add_columns() -> int:
+    """Ergänzt neue (nullable) Spalten auf bestehenden Tabellen; vor
+    "indexes" ausführen"""
+    def add_missing(connection) -> int:
+        inspector = inspect(connection)
+        added = 0
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    definition = CreateColumn(column).compile(dialect=connection.dialect)
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {definition}"))
+                    logger.info("Added column %s.%s", table.name, column.name)
+                    added += 1
+        return added
+
+    async with engine.begin() as conn:
+        return await conn.run_sync(add_missing)
+
+
+@migration("indexes")
+async def create_indexes() -> int:
+    """Legt fehlende Indizes auf bestehenden Tabellen an"""
+    def create_missing(connection) -> int:
+        inspector = inspect(connection)
+        created = 0
+        for table in Base.metadata.sorted_tables:
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(connection)
+                    logger.info("Created index %s", index.name)
+                    created += 1
+        return created
+
+    async with engine.begin() as conn:
+        return await conn.run_sync(create_missing)
+
+
+async def run(names):
+    await init_db()
+    for name in names:
+        count = await MIGRATIONS[name]()
+        print(f"{name}: {count} rows migrated")
+    await dispose_db()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SecureVaultStore data migrations")
+    parser.add_argument("names", nargs="+", choices=sorted(MIGRATIONS))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(args.names))
+
+
+if __name__ == "__main__":
+    main()
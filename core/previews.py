@@ -0,0 +1,245 @@
+"""Vorschaubilder für Bild-Uploads.
+
+Das Dekodieren läuft in einem Prozess-Pool: große Bilder blockieren so
+weder den Event-Loop noch (über den GIL) andere Requests, und eine
+Decompression Bomb trifft nur einen Worker-Prozess. Der Upload wird dafür
+mit einem Einmal-Schlüssel verschlüsselt in eine temporäre Datei unter
+``temp_dir`` geschrieben; Klartext gibt es nur im Speicher des Workers.
+``preview_timeout_seconds`` misst der Worker selbst, Wartezeit in der
+Queue zählt nicht mit.
+"""
+import asyncio
+import io
+import logging
+import os
+import signal
+import struct
+import tempfile
+import threading
+import warnings
+from contextlib import contextmanager
+from typing import Iterable, Iterator, NamedTuple, Optional, Set, Tuple
+
+from fastapi import UploadFile
+from PIL import Image
+from sqlalchemy import update
+
+from secure_vault.core.config import get_settings
+from secure_vault.core.database import AsyncSessionLocal
+from secure_vault.core.executors import ExecutorSaturated, get_crypto_executor, get_preview_executor
+from secure_vault.core.streaming import StreamDecryptor, StreamEncryptor
+from secure_vault.models.models import Document
+from secure_vault.utils.metrics import metrics
+
+logger = logging.getLogger('secure_vault.previews')
+
+_background_tasks: Set[asyncio.Task] = set()
+
+# Batch-Format: je Dokument
+#   u16 Länge document_id | document_id (UTF-8)
+#   u32 Länge encrypted_key | encrypted_key
+#   u32 Länge encrypted_preview | encrypted_preview   (0 = keine Vorschau)
+# alle Längen big-endian
+PREVIEW_BATCH_MEDIA_TYPE = "application/vnd.securevault.previews"
+_ID_LENGTH = struct.Struct(">H")
+_BLOB_LENGTH = struct.Struct(">I")
+
+
+class PreviewError(Exception):
+    """Bild kann oder darf nicht verkleinert werden"""
+
+
+class PreviewTimeout(PreviewError):
+    """Dekodieren hat länger als ``preview_timeout_seconds`` gedauert"""
+
+
+class SpooledUpload(NamedTuple):
+    """Verschlüsselte Kopie eines Uploads für den Worker-Prozess"""
+    path: str
+    key: bytes
+
+    def remove(self):
+        os.unlink(self.path)
+
+
+@contextmanager
+def _time_limit(seconds: Optional[float]):
+    """Bricht die Arbeit nach ``seconds`` per SIGALRM ab. Greift nur im
+    Hauptthread eines Unix-Prozesses, also in den Pool-Workern."""
+    if (not seconds or not hasattr(signal, "setitimer")
+            or threading.current_thread() is not threading.main_thread()):
+        yield
+        return
+
+    def expired(signum, frame):
+        raise PreviewTimeout(f"Preview generation exceeded {seconds}s")
+
+    previous = signal.signal(signal.SIGALRM, expired)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _read_spooled(path: str, key: bytes) -> bytes:
+    decryptor = StreamDecryptor(key)
+    with open(path, 'rb') as f:
+        return decryptor.update(f.read()) + decryptor.finalize()
+
+
+def render_thumbnail(path: str,
+                     key: bytes,
+                     max_size: Tuple[int, int],
+                     max_pixels: int,
+                     timeout: Optional[float] = None) -> bytes:
+    """Erzeugt ein PNG-Vorschaubild aus einem gespoolten Upload (läuft im
+    Worker-Prozess)"""
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    with _time_limit(timeout), warnings.catch_warnings():
+        # DecompressionBombWarning wie einen Fehler behandeln
+        warnings.simplefilter("error", Image.DecompressionBombWarning)
+        try:
+            with Image.open(io.BytesIO(_read_spooled(path, key))) as image:
+                # Größe steht im Header, dekodiert wird erst danach
+                if image.width * image.height > max_pixels:
+                    raise PreviewError(f"Image too large: {image.width}x{image.height}")
+                # JPEG: schon beim Dekodieren per DCT-Skalierung verkleinern
+                image.draft("RGB", (max_size[0] * 2, max_size[1] * 2))
+                image.thumbnail(max_size, reducing_gap=2.0)
+                preview_bytes = io.BytesIO()
+                image.save(preview_bytes, format='PNG')
+                return preview_bytes.getvalue()
+        except (Image.DecompressionBombError, Image.DecompressionBombWarning) as e:
+            raise PreviewError(str(e))
+
+
+def encode_preview_records(
+    records: Iterable[Tuple[str, Optional[bytes], Optional[bytes]]]
+) -> Iterator[bytes]:
+    """Kodiert (document_id, encrypted_key, encrypted_preview) als
+    längenpräfixierten Stream, ein Chunk pro Dokument"""
+    for document_id, encrypted_key, encrypted_preview in records:
+        id_bytes = document_id.encode()
+        encrypted_key = encrypted_key or b""
+        encrypted_preview = encrypted_preview or b""
+        yield b"".join((
+            _ID_LENGTH.pack(len(id_bytes)), id_bytes,
+            _BLOB_LENGTH.pack(len(encrypted_key)), encrypted_key,
+            _BLOB_LENGTH.pack(len(encrypted_preview)), encrypted_preview,
+        ))
+
+
+def decode_preview_records(data: bytes) -> Iterator[Tuple[str, bytes, bytes]]:
+    """Gegenstück zu encode_preview_records (für Clients und Tests)"""
+    view = memoryview(data)
+    offset = 0
+    while offset < len(view):
+        (id_length,) = _ID_LENGTH.unpack_from(view, offset)
+        offset += _ID_LENGTH.size
+        document_id = bytes(view[offset:offset + id_length]).decode()
+        offset += id_length
+        blobs = []
+        for _ in range(2):
+            (length,) = _BLOB_LENGTH.unpack_from(view, offset)
+            offset += _BLOB_LENGTH.size
+            blobs.append(bytes(view[offset:offset + length]))
+            offset += length
+        yield document_id, blobs[0], blobs[1]
+
+
+async def spool_upload(file: UploadFile) -> SpooledUpload:
+    """Kopiert einen Upload verschlüsselt in eine temporäre Datei für den
+    Worker-Prozess; Verschlüsseln und Schreiben laufen nicht im Event-Loop"""
+    settings = get_settings()
+    await asyncio.to_thread(os.makedirs, settings.temp_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=settings.temp_dir, prefix='preview-')
+    spooled = SpooledUpload(path, os.urandom(32))
+    encryptor = StreamEncryptor(spooled.key, settings.stream_chunk_size)
+    executor = get_crypto_executor()
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            await asyncio.to_thread(f.write, encryptor.header)
+            await file.seek(0)
+            while chunk := await file.read(settings.stream_chunk_size):
+                await asyncio.to_thread(f.write, await executor.run(encryptor.update, chunk))
+            await asyncio.to_thread(f.write, await executor.run(encryptor.finalize))
+    except BaseException:
+        spooled.remove()
+        raise
+    return spooled
+
+
+async def create_preview(spooled: SpooledUpload) -> Optional[bytes]:
+    """Erzeugt ein Vorschaubild; None, wenn das nicht möglich ist.
+
+    Eine fehlende Vorschau lässt den Upload nicht scheitern.
+    """
+    settings = get_settings()
+    try:
+        preview = await get_preview_executor().run(
+            render_thumbnail,
+            spooled.path,
+            spooled.key,
+            (settings.preview_max_size, settings.preview_max_size),
+            settings.preview_max_pixels,
+            settings.preview_timeout_seconds
+        )
+    except PreviewTimeout:
+        metrics.increment("previews.timeouts")
+        logger.warning("Preview generation timed out")
+        return None
+    except ExecutorSaturated:
+        metrics.increment("previews.skipped")
+        return None
+    except Exception as e:
+        metrics.increment("previews.failed")
+        logger.info("Preview generation failed: %s", e)
+        return None
+
+    metrics.increment("previews.generated")
+    return preview
+
+
+async def _generate_in_background(document_id: str,
+                                  spooled: SpooledUpload,
+                                  document_key: bytes,
+                                  key_id: int,
+                                  crypto):
+    try:
+        preview = await create_preview(spooled)
+    finally:
+        spooled.remove()
+    if preview is None:
+        return
+
+    encrypted_preview = crypto.encrypt_preview(preview, document_key, key_id)
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(Document)
+            .where(Document.document_id == document_id)
+            .values(encrypted_preview=encrypted_preview)
+        )
+        await session.commit()
+
+
+def schedule_preview(document_id: str, spooled: SpooledUpload, document_key: bytes, key_id: int, crypto):
+    """Erzeugt die Vorschau nach dem Upload und trägt sie nachträglich in
+    Document.encrypted_preview ein. Übernimmt die temporäre Datei."""
+    task = asyncio.create_task(_generate_in_background(document_id, spooled, document_key, key_id, crypto))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_done)
+
+
+def _background_done(task: asyncio.Task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        metrics.increment("previews.failed")
+        logger.error("Background preview failed", exc_info=task.exception())
+
+
+async def wait_for_previews():
+    """Wartet beim Shutdown auf laufende Hintergrund-Vorschauen"""
+    if _background_tasks:
+        await asyncio.gather(*_background_tasks, return_exceptions=True)
@@ -0,0 +1,248 @@
+"""Rate Limiting für teure, nicht oder schwach authentifizierte Endpunkte.
+
+Login und Recovery kosten je Versuch eine volle PBKDF2-Ableitung. Geprüft
+wird deshalb vor jeder KDF-Arbeit:
+
+- Token Bucket pro user_id und pro Client-IP (``capacity`` Versuche,
+  gleichmäßig über ``per_seconds`` nachgefüllt)
+- exponentielles Back-off pro user_id nach wiederholten Fehlversuchen
+
+Der Zustand liegt standardmäßig im Speicher des Worker-Prozesses; mit
+``rate_limit_backend = "redis"`` teilen sich alle Worker und Instanzen
+einen Redis-Server (optionale Abhängigkeit ``redis``).
+"""
+import math
+import time
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Callable, Dict, NamedTuple, Optional
+
+from secure_vault.core.config import get_settings, Settings
+from secure_vault.utils.cache import LRUCache
+from secure_vault.utils.metrics import metrics
+
+
+class RateLimited(Exception):
+    """Anfrage abgelehnt; ``retry_after`` in Sekunden"""
+
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded ({scope})")
+        self.scope = scope
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class Limit(NamedTuple):
+    capacity: int
+    per_seconds: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.per_seconds
+
+
+class RateLimitBackend(ABC):
+    """Speicher für Buckets und Fehlversuch-Zähler"""
+
+    @abstractmethod
+    async def take(self, key: str, limit: Limit) -> float:
+        """Entnimmt ein Token; 0 bei Erfolg, sonst Sekunden bis zum nächsten"""
+
+    @abstractmethod
+    async def add_failure(self, key: str, window: float) -> int:
+        """Zählt einen Fehlversuch (Zähler verfällt ``window`` Sekunden nach
+        dem letzten) und gibt die Anzahl zurück"""
+
+    @abstractmethod
+    async def lock(self, key: str, seconds: float):
+        ...
+
+    @abstractmethod
+    async def locked_for(self, key: str) -> float:
+        """Restdauer einer Sperre in Sekunden, 0 wenn nicht gesperrt"""
+
+    @abstractmethod
+    async def reset(self, key: str):
+        """Setzt Fehlversuche und Sperre zurück"""
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Pro Worker-Prozess; bei N Workern gelten die Limits effektiv N-fach"""
+
+    def __init__(self, maxsize: int = 100_000):
+        self._buckets = LRUCache(maxsize)
+        self._failures = LRUCache(maxsize)
+        self._locks = LRUCache(maxsize)
+
+    async def take(self, key: str, limit: Limit) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (float(limit.capacity), now))
+        tokens = min(limit.capacity, tokens + (now - updated) * limit.rate)
+        if tokens >= 1:
+            self._buckets.set(key, (tokens - 1, now), ttl=limit.per_seconds)
+            return 0.0
+        self._buckets.set(key, (tokens, now), ttl=limit.per_seconds)
+        return (1 - tokens) / limit.rate
+
+    async def add_failure(self, key: str, window: float) -> int:
+        count = self._failures.get(key, 0) + 1
+        self._failures.set(key, count, ttl=window)
+        return count
+
+    async def lock(self, key: str, seconds: float):
+        self._locks.set(key, time.monotonic() + seconds, ttl=seconds)
+
+    async def locked_for(self, key: str) -> float:
+        until = self._locks.get(key)
+        return max(0.0, until - time.monotonic()) if until else 0.0
+
+    async def reset(self, key: str):
+        self._failures.pop(key)
+        self._locks.pop(key)
+
+
+# Token Bucket atomar in Redis: KEYS[1] Bucket, ARGV capacity, rate, now
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Gemeinsamer Zustand für alle Worker über Redis"""
+
+    def __init__(self, url: str, prefix: str = "secure_vault:ratelimit:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("rate_limit_backend 'redis' requires the 'redis' package")
+        self._redis = redis.from_url(url)
+        self._prefix = prefix
+        self._take = self._redis.register_script(_TAKE_SCRIPT)
+
+    async def take(self, key: str, limit: Limit) -> float:
+        wait = await self._take(
+            keys=[self._prefix + "bucket:" + key],
+            args=[limit.capacity, limit.rate, time.time()]
+        )
+        return float(wait)
+
+    async def add_failure(self, key: str, window: float) -> int:
+        name = self._prefix + "failures:" + key
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.incr(name)
+            pipe.expire(name, math.ceil(window))
+            count, _ = await pipe.execute()
+        return int(count)
+
+    async def lock(self, key: str, seconds: float):
+        await self._redis.set(self._prefix + "lock:" + key, 1, px=max(1, int(seconds * 1000)))
+
+    async def locked_for(self, key: str) -> float:
+        remaining = await self._redis.pttl(self._prefix + "lock:" + key)
+        return remaining / 1000 if remaining > 0 else 0.0
+
+    async def reset(self, key: str):
+        await self._redis.delete(self._prefix + "failures:" + key, self._prefix + "lock:" + key)
+
+
+class RateLimiter:
+    """Limits pro Aktion (``login``, ``recovery``) für user_id und IP"""
+
+    def __init__(self, backend: RateLimitBackend, settings: Settings):
+        self.backend = backend
+        self.enabled = settings.rate_limit_enabled
+        self.limits: Dict[str, Dict[str, Limit]] = {
+            "login": {
+                "user": Limit(settings.login_rate_limit_per_user, 60),
+                "ip": Limit(settings.login_rate_limit_per_ip, 60),
+            },
+            "recovery": {
+                "user": Limit(settings.recovery_rate_limit_per_user, 3600),
+                "ip": Limit(settings.recovery_rate_limit_per_ip, 3600),
+            },
+        }
+        self.free_failures = settings.login_backoff_free_failures
+        self.backoff_base = settings.login_backoff_base_seconds
+        self.backoff_max = settings.login_backoff_max_seconds
+        self.failure_window = settings.login_failure_window_seconds
+
+    async def check(self, action: str, user_id: str, ip: Optional[str]):
+        """Wirft RateLimited, bevor teure Arbeit (KDF, DB) beginnt"""
+        if not self.enabled:
+            return
+        locked = await self.backend.locked_for(f"{action}:user:{user_id}")
+        if locked > 0:
+            self._reject(action, "backoff", locked)
+
+        limits = self.limits[action]
+        if ip:
+            wait = await self.backend.take(f"{action}:ip:{ip}", limits["ip"])
+            if wait > 0:
+                self._reject(action, "ip", wait)
+        wait = await self.backend.take(f"{action}:user:{user_id}", limits["user"])
+        if wait > 0:
+            self._reject(action, "user", wait)
+
+    async def failed(self, action: str, user_id: str):
+        """Nach ``free_failures`` Fehlversuchen: Sperre von base * 2^n
+        Sekunden (höchstens ``backoff_max``)"""
+        if not self.enabled:
+            return
+        key = f"{action}:user:{user_id}"
+        failures = await self.backend.add_failure(key, self.failure_window)
+        metrics.increment(f"ratelimit.{action}.failures")
+        excess = failures - self.free_failures
+        if excess > 0:
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (excess - 1))
+            await self.backend.lock(key, delay)
+
+    async def succeeded(self, action: str, user_id: str):
+        if self.enabled:
+            await self.backend.reset(f"{action}:user:{user_id}")
+
+    def _reject(self, action: str, scope: str, retry_after: float):
+        metrics.increment(f"ratelimit.{action}.rejected.{scope}")
+        raise RateLimited(f"{action}:{scope}", retry_after)
+
+
+def _memory_backend(settings: Settings) -> RateLimitBackend:
+    return MemoryRateLimitBackend(settings.rate_limit_memory_size)
+
+
+def _redis_backend(settings: Settings) -> RateLimitBackend:
+    return RedisRateLimitBackend(settings.rate_limit_redis_url)
+
+
+RATE_LIMIT_BACKENDS: Dict[str, Callable[[Settings], RateLimitBackend]] = {
+    "memory": _memory_backend,
+    "redis": _redis_backend,
+}
+
+
+def register_rate_limit_backend(name: str, factory: Callable[[Settings], RateLimitBackend]):
+    """Registriert ein weiteres gemeinsames Backend"""
+    RATE_LIMIT_BACKENDS[name] = factory
+
+
+@lru_cache()
+def get_rate_limiter() -> RateLimiter:
+    settings = get_settings()
+    try:
+        factory = RATE_LIMIT_BACKENDS[settings.rate_limit_backend]
+    except KeyError:
+        raise ValueError(f"Unknown rate limit backend: {settings.rate_limit_backend}")
+    return RateLimiter(factory(settings), settings)
@@ -0,0 +1,275 @@
+"""Rotation des RSA Schlüsselpaars eines Benutzers.
+
+Der Start tauscht das Schlüsselpaar sofort aus (neuer Private Key unter dem
+unveränderten Master Key, ``User.key_id`` + 1) und hält den alten Private
+Key in ``KeyRotation.previous_private_key_encrypted``. Ein Hintergrund-Task
+packt danach die Document Keys (``Document``, ``DocumentShare``,
+``MessageRecipient``) batchweise auf den neuen Public Key um; Inhalte
+werden dabei nicht angefasst. Jede Zeile trägt die Schlüsselgeneration in
+``key_id``, ein abgebrochener Lauf setzt daher einfach bei den noch alten
+Zeilen wieder an. Der alte Private Key liegt nur unter dem Master Key vor:
+Fortsetzen braucht wie der Start das Passwort. Bis zum Abschluss liest
+``private_key_for_key_id`` noch alte Zeilen mit dem alten Private Key.
+
+Pro Benutzer und Ziel-Generation gibt es höchstens eine Rotation (Unique
+Index auf ``key_rotations``): von zwei gleichzeitigen Starts tauscht nur
+einer das Schlüsselpaar, der andere scheitert beim Commit. Uploads und
+Nachrichten, die vor dem Tausch den alten Public Key gelesen haben, können
+noch Zeilen der alten Generation schreiben; der Lauf endet deshalb erst,
+wenn keine solche Zeile mehr übrig ist.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from secure_vault.core.config import get_settings
+from secure_vault.core.crypto import CryptoSystem, public_key_cache
+from secure_vault.core.database import AsyncSessionLocal
+from secure_vault.core.keypool import get_keypair_pool
+from secure_vault.models.models import Document, DocumentShare, KeyRotation, MessageRecipient, User
+from secure_vault.utils.metrics import metrics
+
+logger = logging.getLogger('secure_vault.rotation')
+
+# Tabellen mit für den Benutzer verpackten Schlüsseln:
+# (Modell, Spalte mit der user_id, Primärschlüssel)
+ROTATED_KEYS = (
+    (Document, Document.recipient_id, (Document.document_id,)),
+    (DocumentShare, DocumentShare.user_id, (DocumentShare.share_id,)),
+    (MessageRecipient, MessageRecipient.user_id, (MessageRecipient.message_id, MessageRecipient.user_id)),
+)
+
+_running: Dict[str, asyncio.Task] = {}
+
+
+class RotationInProgress(Exception):
+    """Für den Benutzer läuft bereits eine Rotation"""
+
+
+def _outdated(model, owner_column, user_id: str, to_key_id: int):
+    return (
+        owner_column == user_id,
+        model.encrypted_key.isnot(None),
+        or_(model.key_id.is_(None), model.key_id < to_key_id),
+    )
+
+
+def _age_seconds(timestamp: Optional[datetime]) -> float:
+    if timestamp is None:
+        return float("inf")
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.replace(tzinfo=None) - timestamp.utcoffset()
+    return (datetime.utcnow() - timestamp).total_seconds()
+
+
+async def count_outdated_keys(db: AsyncSession, user_id: str, to_key_id: int) -> int:
+    total = 0
+    for model, owner_column, _ in ROTATED_KEYS:
+        total += (await db.execute(
+            select(func.count()).select_from(model)
+            .where(*_outdated(model, owner_column, user_id, to_key_id))
+        )).scalar_one()
+    return total
+
+
+async def latest_rotation(db: AsyncSession, user_id: str) -> Optional[KeyRotation]:
+    return (await db.execute(
+        select(KeyRotation)
+        .where(KeyRotation.user_id == user_id)
+        .order_by(KeyRotation.started_at.desc())
+        .limit(1)
+    )).scalar_one_or_none()
+
+
+async def private_key_for_key_id(db: AsyncSession, user: User, key_id: Optional[int]) -> bytes:
+    """Verschlüsselter Private Key, mit dem Zeilen der Generation ``key_id``
+    (NULL = 1) gelesen werden.
+
+    Während einer Rotation, auch nach einem abgebrochenen Lauf, sind noch
+    nicht umgepackte Zeilen nur mit dem alten Private Key lesbar.
+    """
+    if (key_id or 1) < (user.key_id or 1):
+        rotation = await latest_rotation(db, user.user_id)
+        if rotation is not None and rotation.previous_private_key_encrypted is not None:
+            return rotation.previous_private_key_encrypted
+    return user.master_key_encrypted
+
+
+async def start_rotation(db: AsyncSession, user: User, master_key: bytes, crypto: CryptoSystem) -> KeyRotation:
+    """Startet eine neue Rotation oder setzt eine unvollständige fort.
+
+    Wirft RotationInProgress, wenn ein Lauf aktiv ist (in diesem Prozess
+    oder mit Fortschritt innerhalb von ``key_rotation_stale_seconds``).
+    """
+    settings = get_settings()
+    rotation = await latest_rotation(db, user.user_id)
+
+    if rotation is not None and rotation.status != "completed":
+        task = _running.get(user.user_id)
+        if task is not None and not task.done():
+            raise RotationInProgress()
+        if (rotation.status == "running"
+                and _age_seconds(rotation.updated_at or rotation.started_at) < settings.key_rotation_stale_seconds):
+            # Vermutlich in einem anderen Worker-Prozess aktiv
+            raise RotationInProgress()
+        # Alten Private Key vorab prüfen, statt erst im Hintergrund zu scheitern
+        crypto.unlock_private_key(rotation.previous_private_key_encrypted, master_key)
+        rotation.status = "running"
+        rotation.error = None
+        rotation.updated_at = datetime.utcnow()
+        await db.commit()
+    else:
+        private_pem, public_pem = await get_keypair_pool().acquire()
+        from_key_id = user.key_id or 1
+        rotation = KeyRotation(
+            user_id=user.user_id,
+            from_key_id=from_key_id,
+            to_key_id=from_key_id + 1,
+            previous_private_key_encrypted=user.master_key_encrypted,
+            status="running",
+            total=await count_outdated_keys(db, user.user_id, from_key_id + 1),
+            processed=0,
+            started_at=datetime.utcnow(),
+            updated_at=datetime.utcnow()
+        )
+        # Ab hier werden neue Schlüssel bereits für das neue Paar verpackt
+        user.master_key_encrypted = crypto.encrypt_private_key(private_pem, master_key)
+        user.public_key = public_pem
+        user.key_id = rotation.to_key_id
+        db.add(rotation)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Gleichzeitiger Start hat dieselbe Generation bereits angelegt
+            await db.rollback()
+            raise RotationInProgress()
+        public_key_cache.invalidate_user(user.user_id)
+        crypto.lock_user(user.user_id)
+
+    schedule_rotation(rotation.rotation_id, user.user_id, master_key, crypto)
+    return rotation
+
+
+async def _rewrap_batch(session: AsyncSession, model, owner_column, primary_key,
+                        user_id: str, to_key_id: int, private_key, public_key_pem: bytes,
+                        crypto: CryptoSystem, batch_size: int) -> int:
+    rows = (await session.execute(
+        select(*primary_key, model.encrypted_key)
+        .where(*_outdated(model, owner_column, user_id, to_key_id))
+        .limit(batch_size)
+    )).all()
+    if not rows:
+        return 0
+
+    wrapped_keys = await crypto.rewrap_keys(
+        [row.encrypted_key for row in rows],
+        private_key,
+        public_key_pem,
+        user_id
+    )
+    # ORM Bulk-Update über den Primärschlüssel
+    await session.execute(update(model), [
+        {
+            **{column.key: getattr(row, column.key) for column in primary_key},
+            "encrypted_key": encrypted_key,
+            "key_id": to_key_id
+        }
+        for row, encrypted_key in zip(rows, wrapped_keys)
+    ])
+    return len(rows)
+
+
+async def run_rotation(rotation_id: str, master_key: bytes, crypto: CryptoSystem) -> int:
+    """Packt alle verbliebenen Schlüssel um; ein Commit pro Batch"""
+    settings = get_settings()
+    started = time.monotonic()
+    async with AsyncSessionLocal() as session:
+        rotation = await session.get(KeyRotation, rotation_id)
+        public_key_pem = (await session.execute(
+            select(User.public_key).where(User.user_id == rotation.user_id)
+        )).scalar_one()
+        private_key = crypto.unlock_private_key(rotation.previous_private_key_encrypted, master_key)
+        user_id, to_key_id = rotation.user_id, rotation.to_key_id
+        processed = rotation.processed or 0
+
+        try:
+            while True:
+                for model, owner_column, primary_key in ROTATED_KEYS:
+                    while True:
+                        count = await _rewrap_batch(
+                            session, model, owner_column, primary_key, user_id, to_key_id,
+                            private_key, public_key_pem, crypto, settings.key_rotation_batch_size
+                        )
+                        if not count:
+                            break
+                        processed += count
+                        await session.execute(
+                            update(KeyRotation)
+                            .where(KeyRotation.rotation_id == rotation_id)
+                            .values(processed=processed, updated_at=datetime.utcnow())
+                        )
+                        await session.commit()
+                        metrics.increment("key_rotation.rewrapped", count)
+                # Zeilen, die während des Laufs noch mit dem alten Public Key
+                # geschrieben wurden; erst danach darf der alte Key weg
+                if await count_outdated_keys(session, user_id, to_key_id) == 0:
+                    break
+                metrics.increment("key_rotation.late_writes")
+        except Exception as e:
+            await session.rollback()
+            await session.execute(
+                update(KeyRotation)
+                .where(KeyRotation.rotation_id == rotation_id)
+                .values(status="failed", error=str(e)[:500], updated_at=datetime.utcnow())
+            )
+            await session.commit()
+            metrics.increment("key_rotation.failed")
+            raise
+
+        # Nach Abschluss wird der alte Private Key nicht mehr gebraucht
+        now = datetime.utcnow()
+        await session.execute(
+            update(KeyRotation)
+            .where(KeyRotation.rotation_id == rotation_id)
+            .values(
+                status="completed",
+                previous_private_key_encrypted=None,
+                processed=processed,
+                updated_at=now,
+                completed_at=now
+            )
+        )
+        await session.commit()
+
+    metrics.observe("key_rotation.duration_ms", (time.monotonic() - started) * 1000)
+    logger.info("Key rotation %s for %s completed (%d keys)", rotation_id, user_id, processed)
+    return processed
+
+
+def schedule_rotation(rotation_id: str, user_id: str, master_key: bytes, crypto: CryptoSystem):
+    task = asyncio.create_task(run_rotation(rotation_id, master_key, crypto))
+    _running[user_id] = task
+    task.add_done_callback(lambda t: _rotation_done(user_id, t))
+
+
+def _rotation_done(user_id: str, task: asyncio.Task):
+    if _running.get(user_id) is task:
+        del _running[user_id]
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Key rotation for %s failed", user_id, exc_info=task.exception())
+
+
+async def stop_rotations():
+    """Bricht laufende Rotationen beim Shutdown ab; sie lassen sich per
+    erneutem Start fortsetzen"""
+    tasks = list(_running.values())
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
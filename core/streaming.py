@@ -0,0 +1,139 @@
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+import os
+import struct
+
+# Chunked AES-GCM Format ("stream-v1")
+#
+# Header (16 Bytes, dient jedem Chunk als AAD):
+#   magic "SVSC" | version (1) | chunk_size (4, big endian) | nonce_prefix (7)
+# Danach folgen die Chunks, jeweils ciphertext || tag (16).
+# Nonce pro Chunk: nonce_prefix (7) | counter (4, big endian) | final (1)
+# Der letzte Chunk trägt final=1, dadurch fällt ein Abschneiden des
+# Streams bei der Entschlüsselung auf.
+
+STREAM_MAGIC = b"SVSC"
+STREAM_VERSION = 1
+STREAM_FORMAT = "stream-v1"
+HEADER_SIZE = 16
+TAG_SIZE = 16
+_HEADER = struct.Struct(">4sBI7s")
+MAX_CHUNKS = 2 ** 32
+
+
+class StreamError(Exception):
+    """Ungültiger oder manipulierter verschlüsselter Stream"""
+
+
+def _chunk_nonce(prefix: bytes, counter: int, final: bool) -> bytes:
+    if counter >= MAX_CHUNKS:
+        raise StreamError("Too many chunks in stream")
+    return prefix + struct.pack(">IB", counter, 1 if final else 0)
+
+
+class StreamEncryptor:
+    """Verschlüsselt Daten inkrementell im chunked AES-GCM Format"""
+
+    def __init__(self, key: bytes, chunk_size: int = 64 * 1024):
+        self._key = key
+        self.chunk_size = chunk_size
+        self._prefix = os.urandom(7)
+        self.header = _HEADER.pack(STREAM_MAGIC, STREAM_VERSION, chunk_size, self._prefix)
+        self._buffer = bytearray()
+        self._counter = 0
+        self._finalized = False
+
+    def update(self, data: bytes) -> bytes:
+        """Nimmt Klartext entgegen und gibt alle vollständigen Chunks zurück"""
+        if self._finalized:
+            raise StreamError("Stream already finalized")
+        self._buffer += data
+        out = []
+        # Ein voller Chunk bleibt gepuffert, er könnte der letzte sein
+        while len(self._buffer) > self.chunk_size:
+            out.append(self._seal(bytes(self._buffer[:self.chunk_size]), final=False))
+            del self._buffer[:self.chunk_size]
+        return b"".join(out)
+
+    def finalize(self) -> bytes:
+        """Verschlüsselt den Rest als authentifizierten letzten Chunk"""
+        if self._finalized:
+            raise StreamError("Stream already finalized")
+        self._finalized = True
+        chunk = self._seal(bytes(self._buffer), final=True)
+        self._buffer.clear()
+        return chunk
+
+    def _seal(self, plaintext: bytes, final: bool) -> bytes:
+        encryptor = Cipher(
+            algorithms.AES(self._key),
+            modes.GCM(_chunk_nonce(self._prefix, self._counter, final))
+        ).encryptor()
+        encryptor.authenticate_additional_data(self.header)
+        ciphertext = encryptor.update(plaintext) + encryptor.finalize()
+        self._counter += 1
+        return ciphertext + encryptor.tag
+
+
+class StreamDecryptor:
+    """Gegenstück zu StreamEncryptor, ebenfalls inkrementell"""
+
+    def __init__(self, key: bytes):
+        self._key = key
+        self._buffer = bytearray()
+        self._header = None
+        self._prefix = None
+        self._sealed_size = None
+        self._counter = 0
+        self._finalized = False
+
+    def update(self, data: bytes) -> bytes:
+        if self._finalized:
+            raise StreamError("Stream already finalized")
+        self._buffer += data
+        if self._header is None:
+            if len(self._buffer) < HEADER_SIZE:
+                return b""
+            self._read_header()
+
+        out = []
+        while len(self._buffer) > self._sealed_size:
+            out.append(self._open(bytes(self._buffer[:self._sealed_size]), final=False))
+            del self._buffer[:self._sealed_size]
+        return b"".join(out)
+
+    def finalize(self) -> bytes:
+        if self._finalized:
+            raise StreamError("Stream already finalized")
+        self._finalized = True
+        if self._header is None:
+            raise StreamError("Truncated stream header")
+        if len(self._buffer) < TAG_SIZE:
+            raise StreamError("Truncated stream")
+        plaintext = self._open(bytes(self._buffer), final=True)
+        self._buffer.clear()
+        return plaintext
+
+    def _read_header(self):
+        magic, version, chunk_size, prefix = _HEADER.unpack(bytes(self._buffer[:HEADER_SIZE]))
+        if magic != STREAM_MAGIC or version != STREAM_VERSION:
+            raise StreamError("Unknown stream format")
+        self._header = bytes(self._buffer[:HEADER_SIZE])
+        self._prefix = prefix
+        self._sealed_size = chunk_size + TAG_SIZE
+        del self._buffer[:HEADER_SIZE]
+
+    def _open(self, sealed: bytes, final: bool) -> bytes:
+        ciphertext, tag = sealed[:-TAG_SIZE], sealed[-TAG_SIZE:]
+        decryptor = Cipher(
+            algorithms.AES(self._key),
+            modes.GCM(_chunk_nonce(self._prefix, self._counter, final), tag)
+        ).decryptor()
+        decryptor.authenticate_additional_data(self._header)
+        plaintext = decryptor.update(ciphertext) + decryptor.finalize()
+        self._counter += 1
+        return plaintext
+
+
+def is_stream(data: bytes) -> bool:
+    """Prüft, ob Daten im chunked Stream-Format vorliegen"""
+    return data[:4] == STREAM_MAGIC
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from secure_vault.utils.metrics import metrics
+
+logger = logging.getLogger('secure_vault.database')
+
+WriteJob = Callable[[AsyncSession], Awaitable[None]]
+
+
+class SQLiteWriteQueue:
+    """Serialisiert alle Schreibzugriffe eines Prozesses auf SQLite.
+
+    Ein einzelner Writer-Task sammelt anstehende Jobs (bis ``max_batch``,
+    höchstens ``batch_window_ms`` Wartezeit) und führt sie in einer
+    gemeinsamen Transaktion aus (Group Commit: ein fsync für viele
+    Requests). Jeder Job läuft in einem eigenen SAVEPOINT, ein fehlerhafter
+    Job reißt die anderen also nicht mit.
+    """
+
+    def __init__(self,
+                 session_factory: Callable[[], AsyncSession],
+                 max_batch: int = 64,
+                 batch_window_ms: float = 2.0):
+        self._session_factory = session_factory
+        self.max_batch = max_batch
+        self.batch_window = batch_window_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, job: WriteJob):
+        """Reiht einen Job ein und wartet, bis er committet ist"""
+        if self._task is None:
+            self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((job, future))
+        metrics.set_gauge("db.write_queue.depth", self._queue.qsize())
+        return await future
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        # Bereits eingereihte Jobs noch abarbeiten
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            if self.batch_window > 0:
+                await asyncio.sleep(self.batch_window)
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            try:
+                await self._commit_batch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _commit_batch(self, batch: List[Tuple[WriteJob, asyncio.Future]]):
+        metrics.observe("db.write_queue.batch_size", len(batch))
+        committed = []
+        try:
+            async with self._session_factory() as session:
+                for job, future in batch:
+                    if future.cancelled():
+                        continue
+                    try:
+                        async with session.begin_nested():
+                            await job(session)
+                    except Exception as exc:
+                        future.set_exception(exc)
+                    else:
+                        committed.append(future)
+                await session.commit()
+        except Exception as exc:
+            logger.exception("SQLite group commit failed (%d jobs)", len(committed))
+            metrics.increment("db.write_queue.commit_errors")
+            for future in committed:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for future in committed:
+            if not future.done():
+                future.set_result(None)
+
+
+class QueuedWriteSession(AsyncSession):
+    """Session für den SQLite-Single-Writer-Modus.
+
+    Liest über den Read-only-Pool; ``commit()`` übergibt neue, geänderte und
+    gelöschte Objekte sowie gesammelte DML-Statements an die Write-Queue
+    und kehrt erst nach dem Group Commit zurück. Vor dem Commit sind eigene
+    Änderungen für Abfragen dieser Session nicht sichtbar (kein Autoflush).
+    """
+
+    def __init__(self, *args, write_queue: SQLiteWriteQueue, **kwargs):
+        # Autoflush würde über die Read-only-Verbindung schreiben
+        kwargs["autoflush"] = False
+        super().__init__(*args, **kwargs)
+        self._write_queue = write_queue
+        self._deferred_dml = []
+
+    async def execute(self, statement, params=None, **kwargs):
+        if getattr(statement, "is_dml", False):
+            self._deferred_dml.append((statement, params, kwargs))
+            return None
+        return await super().execute(statement, params, **kwargs)
+
+    async def flush(self, objects=None):
+        # Geschrieben wird nur über die Queue
+        pass
+
+    async def commit(self):
+        new = list(self.new)
+        dirty = [obj for obj in self.dirty if self.is_modified(obj)]
+        deleted = list(self.deleted)
+        dml, self._deferred_dml = self._deferred_dml, []
+
+        for obj in new + dirty + deleted:
+            self.expunge(obj)
+        # Beendet nur die lesende Transaktion
+        await super().commit()
+
+        if not (new or dirty or deleted or dml):
+            return
+
+        async def job(session: AsyncSession):
+            session.add_all(new)
+            for obj in dirty:
+                await session.merge(obj)
+            # DML vor ORM-Löschungen: abhängige Zeilen (z.B. Tags) werden
+            # per DELETE-Statement vor ihrem Dokument entfernt
+            for statement, params, kwargs in dml:
+                await session.execute(statement, params, **kwargs)
+            for obj in deleted:
+                await session.delete(await session.merge(obj))
+            await session.flush()
+
+        await self._write_queue.submit(job)
+
+    async def rollback(self):
+        self._deferred_dml = []
+        await super().rollback()
@@ -1,7 +1,14 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Request
+from fastapi.responses import JSONResponse
 from secure_vault.core.config import get_settings
-from secure_vault.api import auth, documents, messages, users
-from secure_vault.core.database import init_db
+from secure_vault.api import auth, documents, messages, metrics, users
+from secure_vault.core.audit import get_audit_writer
+from secure_vault.core.database import dispose_db, init_db
+from secure_vault.core.executors import ExecutorSaturated, shutdown_executors
+from secure_vault.core.keypool import get_keypair_pool
+from secure_vault.core.previews import wait_for_previews
+from secure_vault.core.ratelimit import RateLimited
+from secure_vault.core.rotation import stop_rotations
 import uvicorn
 
 app = FastAPI(
@@ -15,10 +22,39 @@ app.include_router(auth.router, prefix="/api", tags=["auth"])
 app.include_router(documents.router, prefix="/api", tags=["documents"])
 app.include_router(messages.router, prefix="/api", tags=["messages"])
 app.include_router(users.router, prefix="/api", tags=["users"])
+app.include_router(metrics.router, prefix="/api", tags=["metrics"])
+
+@app.exception_handler(ExecutorSaturated)
+async def executor_saturated_handler(request: Request, exc: ExecutorSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server busy, please retry later"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(RateLimited)
+async def rate_limited_handler(request: Request, exc: RateLimited):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Too many requests, please retry later"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
 @app.on_event("startup")
 async def startup_event():
     await init_db()
+    await get_audit_writer().start()
+    await get_keypair_pool().start()
+    await auth.password_validator.warmup()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await get_keypair_pool().stop()
+    await wait_for_previews()
+    await stop_rotations()
+    await get_audit_writer().stop()
+    shutdown_executors()
+    await dispose_db()
 
 if __name__ == "__main__":
     settings = get_settings()
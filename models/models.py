@@ -1,4 +1,5 @@
-from sqlalchemy import Column, String, DateTime, LargeBinary, Boolean, ForeignKey, Integer, Text
+from sqlalchemy import Column, String, DateTime, LargeBinary, Boolean, ForeignKey, Integer, Text, Index
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from secure_vault.core.database import Base
 import uuid
@@ -8,31 +9,58 @@ class User(Base):
     
     user_id = Column(String(50), primary_key=True)
     password_hash = Column(String(256), nullable=False)
+    # Private Key, verschlüsselt mit dem Master Key (KEK)
     master_key_encrypted = Column(LargeBinary, nullable=False)
+    # Master Key, verpackt mit PBKDF2(Passwort, master_salt); NULL bei
+    # Konten von vor der Schlüsselhierarchie (Salt nie gespeichert)
+    master_salt = Column(LargeBinary)
+    master_key_wrapped = Column(LargeBinary)
+    # Master Key, verpackt mit dem Schlüssel aus den Recovery-Antworten
     recovery_key_encrypted = Column(LargeBinary)
     recovery_salt = Column(String(64))
+    has_recovery = Column(Boolean, default=False)
     public_key = Column(LargeBinary, nullable=False)
+    # Generation des Schlüsselpaars, erhöht bei jeder Rotation
+    key_id = Column(Integer, default=1)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     last_login = Column(DateTime(timezone=True))
+    password_changed_at = Column(DateTime(timezone=True))
 
 class Document(Base):
     __tablename__ = "documents"
     
     document_id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     owner_id = Column(String(50), ForeignKey("users.user_id"))
+    recipient_id = Column(String(50), ForeignKey("users.user_id"))
     encrypted_name = Column(Text, nullable=False)  # Verschlüsselter Dokumentname
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     modified_at = Column(DateTime(timezone=True), onupdate=func.now())
     last_access = Column(DateTime(timezone=True))
     mime_type = Column(String(128))
-    encrypted_content = Column(LargeBinary)
-    encrypted_preview = Column(LargeBinary)
+    # Große Blobs nur bei explizitem Zugriff laden
+    encrypted_content = deferred(Column(LargeBinary))
+    encrypted_preview = deferred(Column(LargeBinary))
     encrypted_key = Column(LargeBinary)
+    key_id = Column(Integer)  # Schlüsselgeneration des Empfängers, NULL = 1
     encrypted_path = Column(Text)
-    metadata = Column(Text)
+    # "metadata" ist in Declarative reserviert, Spaltenname bleibt gleich
+    encryption_metadata = Column("metadata", Text)
     file_size = Column(Integer)
     tags = Column(Text)
 
+    __table_args__ = (
+        # Dokumentliste: WHERE owner_id/recipient_id = ? ORDER BY created_at DESC, document_id DESC
+        Index("ix_documents_owner_created", owner_id, created_at.desc(), document_id.desc()),
+        Index("ix_documents_recipient_created", recipient_id, created_at.desc(), document_id.desc()),
+        # Dokumentliste mit mime_type-Filter
+        Index("ix_documents_owner_mime", owner_id, mime_type, created_at.desc()),
+        Index("ix_documents_recipient_mime", recipient_id, mime_type, created_at.desc()),
+        # release_blob: WHERE encrypted_path = ?
+        Index("ix_documents_encrypted_path", encrypted_path, mysql_length=255),
+        # Schlüsselrotation: WHERE recipient_id = ? AND key_id < ?
+        Index("ix_documents_recipient_key", recipient_id, key_id),
+    )
+
 class DocumentTag(Base):
     __tablename__ = "document_tags"
     
@@ -41,6 +69,12 @@ class DocumentTag(Base):
     tag = Column(String(64))  # Einzelnes Tag
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        # Tag-Filter: WHERE tag IN (...) -> document_id, ohne Tabellenzugriff
+        Index("ux_document_tags_tag_document", tag, document_id, unique=True),
+        Index("ix_document_tags_document", document_id),
+    )
+
 class Message(Base):
     __tablename__ = "messages"
     
@@ -49,7 +83,32 @@ class Message(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     group_id = Column(String(36))
     encrypted_content = Column(LargeBinary)
-    encrypted_keys = Column(Text)  # JSON: {user_id: encrypted_key}
+    # Veraltet: JSON {user_id: encrypted_key}; wird nicht mehr geschrieben
+    # und von der Migration message_recipients nach dem Übertrag geleert
+    encrypted_keys = Column(Text)
+
+    __table_args__ = (
+        Index("ix_messages_group", group_id),
+    )
+
+class MessageRecipient(Base):
+    __tablename__ = "message_recipients"
+    
+    message_id = Column(String(36), ForeignKey("messages.message_id"), primary_key=True)
+    user_id = Column(String(50), ForeignKey("users.user_id"), primary_key=True)
+    encrypted_key = Column(LargeBinary)  # Nachrichtenschlüssel für diesen Empfänger
+    key_id = Column(Integer)  # Schlüsselgeneration des Empfängers, NULL = 1
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Posteingang: WHERE user_id = ? ORDER BY created_at DESC, message_id DESC
+        Index(
+            "ix_message_recipients_inbox",
+            user_id,
+            created_at.desc(),
+            message_id.desc()
+        ),
+    )
 
 class DocumentShare(Base):
     __tablename__ = "document_shares"
@@ -58,6 +117,48 @@ class DocumentShare(Base):
     document_id = Column(String(36), ForeignKey("documents.document_id"))
     user_id = Column(String(50), ForeignKey("users.user_id"))
     encrypted_key = Column(LargeBinary)
+    key_id = Column(Integer)  # Schlüsselgeneration des Users, NULL = 1
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Ein Share pro Dokument und Benutzer; deckt auch WHERE document_id = ? ab
+        Index("ux_document_shares_document_user", document_id, user_id, unique=True),
+        Index("ix_document_shares_user", user_id),
+    )
+
+class KeyRotation(Base):
+    __tablename__ = "key_rotations"
+
+    rotation_id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String(50), ForeignKey("users.user_id"))
+    from_key_id = Column(Integer, nullable=False)
+    to_key_id = Column(Integer, nullable=False)
+    # Alter Private Key, verschlüsselt mit dem Master Key; wird nach
+    # Abschluss gelöscht
+    previous_private_key_encrypted = Column(LargeBinary)
+    status = Column(String(16), nullable=False, default="running")  # running, completed, failed
+    total = Column(Integer, default=0)
+    processed = Column(Integer, default=0)
+    error = Column(Text)
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True))
+    completed_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index("ix_key_rotations_user_started", user_id, started_at.desc()),
+        # Höchstens ein Lauf pro Zielgeneration: verhindert, dass zwei
+        # gleichzeitige Starts beide das Schlüsselpaar tauschen
+        Index("ux_key_rotations_user_to_key", user_id, to_key_id, unique=True),
+    )
+
+class RecoveryQuestions(Base):
+    __tablename__ = "recovery_questions"
+    
+    # Zusammengesetzter Primärschlüssel: WHERE user_id = ? ORDER BY question_id
+    # läuft über den Primärschlüssel, ein eigener Index ist nicht nötig
+    user_id = Column(String(50), ForeignKey("users.user_id"), primary_key=True)
+    question_id = Column(Integer, primary_key=True)
+    answer_hash = Column(String(256), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class AuditLog(Base):
@@ -71,3 +172,8 @@ class AuditLog(Base):
     message_id = Column(String(36))
     success = Column(Boolean)
     details = Column(Text)  # Non-sensitive additional info
+
+    __table_args__ = (
+        # Audit-Verlauf eines Benutzers, neueste zuerst
+        Index("ix_audit_log_user_timestamp", user_id, timestamp.desc()),
+    )
@@ -6,6 +6,9 @@ class UserAuth(BaseModel):
     user_id: str
     password: str
 
+class PasswordStrengthRequest(BaseModel):
+    password: str = Field(..., max_length=1024)
+
 class UserResponse(BaseModel):
     user_id: str
     created_at: datetime
@@ -24,6 +27,9 @@ class DocumentResponse(BaseModel):
     file_size: int
     encrypted_preview: Optional[str]
 
+class PreviewBatchRequest(BaseModel):
+    document_ids: List[str] = Field(..., min_length=1, max_length=200)
+
 class MessageCreate(BaseModel):
     content: str
     recipients: List[str]
@@ -34,7 +40,8 @@ class MessageResponse(BaseModel):
     from_user: str
     created_at: datetime
     group_id: Optional[str]
-    encrypted_content: str
+    encrypted_content: str  # Hex
+    encrypted_key: Optional[str] = None  # Hex, nur für den anfragenden Empfänger
 
 class DocumentDelete(BaseModel):
     password: str
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import pytest
+import pytest_asyncio
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from secure_vault.core import audit
+from secure_vault.core.audit import AuditWriter
+from secure_vault.core.database import Base
+from secure_vault.models.models import AuditLog
+from secure_vault.utils.metrics import metrics
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/audit.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+def make_writer(tmp_path, session_factory, **kwargs):
+    options = dict(
+        spill_dir=str(tmp_path / "spill"),
+        flush_interval_ms=60000,
+        batch_size=10,
+        max_queue=1000,
+        sync_actions=["failed_login"],
+        session_factory=session_factory
+    )
+    options.update(kwargs)
+    return AuditWriter(**options)
+
+async def count_logs(session_factory, **filters):
+    async with session_factory() as session:
+        query = select(func.count()).select_from(AuditLog).filter_by(**filters)
+        return (await session.execute(query)).scalar_one()
+
+@pytest.mark.asyncio
+async def test_audit_entries_are_flushed_in_bulk(tmp_path, session_factory):
+    writer = make_writer(tmp_path, session_factory, batch_size=100)
+    await writer.start()
+    
+    for _ in range(25):
+        writer.record(None, "list_documents", user_id="alice")
+    assert await count_logs(session_factory) == 0
+    
+    await writer.stop()
+    assert await count_logs(session_factory, action="list_documents") == 25
+
+@pytest.mark.asyncio
+async def test_sync_actions_use_request_session(tmp_path, session_factory):
+    writer = make_writer(tmp_path, session_factory)
+    await writer.start()
+    
+    async with session_factory() as db:
+        writer.record(db, "failed_login", user_id="alice", success=False)
+        await db.commit()
+    
+    assert await count_logs(session_factory, action="failed_login") == 1
+    await writer.stop()
+
+@pytest.mark.asyncio
+async def test_spilled_entries_are_replayed_after_crash(tmp_path, session_factory):
+    crashed = make_writer(tmp_path, session_factory)
+    await crashed.start()
+    for _ in range(3):
+        crashed.record(None, "access_messages", user_id="bob")
+    # Absturz simulieren: kein stop(), Queue geht verloren
+    crashed._task.cancel()
+    crashed._spill_file.close()
+    crashed._lock_file.close()
+    
+    writer = make_writer(tmp_path, session_factory)
+    await writer.start()
+    assert await count_logs(session_factory, action="access_messages") == 3
+    await writer.stop()
+
+@pytest.mark.asyncio
+async def test_entries_without_session_are_written_when_not_running(tmp_path, session_factory):
+    writer = make_writer(tmp_path, session_factory)
+
+    writer.record(None, "list_documents", user_id="alice")
+    await asyncio.gather(*writer._detached)
+
+    assert writer._pending == []
+    assert await count_logs(session_factory, action="list_documents") == 1
+
+@pytest.mark.asyncio
+async def test_full_queue_drops_entries_without_session(tmp_path, session_factory):
+    writer = make_writer(tmp_path, session_factory, max_queue=3, batch_size=100)
+    await writer.start()
+    dropped = metrics.snapshot()["counters"].get("audit.dropped", 0)
+
+    for _ in range(5):
+        writer.record(None, "list_documents", user_id="alice")
+
+    assert len(writer._pending) == 3
+    assert metrics.snapshot()["counters"]["audit.dropped"] == dropped + 2
+    await writer.stop()
+    assert await count_logs(session_factory, action="list_documents") == 3
+
+@pytest.mark.asyncio
+async def test_spill_segment_is_fsynced_per_batch(tmp_path, session_factory, monkeypatch):
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(audit.os, "fsync", lambda fd: synced.append(fd) or real_fsync(fd))
+    writer = make_writer(tmp_path, session_factory, batch_size=100)
+    await writer.start()
+
+    for _ in range(5):
+        writer.record(None, "list_documents", user_id="alice")
+    assert synced == []
+    await writer.flush()
+
+    assert len(synced) == 1
+    await writer.stop()
@@ -0,0 +1,50 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from secure_vault.api import auth
+
+def test_recovery_catalogue_supports_etag():
+    app = FastAPI()
+    app.include_router(auth.router)
+    client = TestClient(app)
+
+    response = client.get("/auth/recovery-questions", params={"lang": "de"})
+    etag = response.headers["ETag"]
+    assert response.json()["questions"][0] == {"id": 1, "question": auth.QUESTIONS_BY_ID[1].translations["de"]}
+    assert "max-age" in response.headers["Cache-Control"]
+
+    cached = client.get("/auth/recovery-questions", params={"lang": "de"}, headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.content == b""
+    assert client.get("/auth/recovery-questions", params={"lang": "en"}).headers["ETag"] != etag
+
+def test_metrics_require_the_metrics_token(monkeypatch):
+    from secure_vault.api import metrics
+    from secure_vault.core.config import get_settings
+    app = FastAPI()
+    app.include_router(metrics.router, prefix="/api")
+    client = TestClient(app)
+
+    monkeypatch.setattr(get_settings(), "metrics_token", None)
+    assert client.get("/api/metrics").status_code == 404
+
+    monkeypatch.setattr(get_settings(), "metrics_token", "s3cret")
+    assert client.get("/api/metrics").status_code == 401
+    assert client.get("/api/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/api/metrics", headers={"Authorization": "Bearer s3cret"}).status_code == 200
+
+def test_client_ip_trusts_forwarded_for_only_from_proxies(monkeypatch):
+    from starlette.requests import Request
+
+    def request(peer, forwarded=None):
+        headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+        return Request({"type": "http", "client": (peer, 1234), "headers": headers})
+
+    monkeypatch.setattr(auth.settings, "trusted_proxies", [])
+    assert auth.client_ip(request("10.0.0.5", "203.0.113.7")) == "10.0.0.5"
+
+    monkeypatch.setattr(auth.settings, "trusted_proxies", ["127.0.0.1", "10.0.0.0/8"])
+    assert auth.client_ip(request("10.0.0.5", "203.0.113.7")) == "203.0.113.7"
+    # Vom Client gesetzte Einträge links vom letzten Proxy zählen nicht
+    assert auth.client_ip(request("127.0.0.1", "1.2.3.4, 203.0.113.7, 10.1.2.3")) == "203.0.113.7"
+    assert auth.client_ip(request("127.0.0.1")) == "127.0.0.1"
+    # Direkte Verbindungen können die Adresse nicht fälschen
+    assert auth.client_ip(request("198.51.100.1", "203.0.113.7")) == "198.51.100.1"
@@ -1,6 +1,22 @@
 import pytest
-from secure_vault.core.crypto import CryptoSystem
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from secure_vault.core.crypto import CryptoSystem, EncryptedDocument, PrivateKeyCache, PublicKeyCache
+from secure_vault.core import envelope
+from secure_vault.core.keypool import generate_rsa_keypair
+from secure_vault.core.streaming import StreamEncryptor, StreamDecryptor
+import base64
+import json
 import os
+import time
+
+OAEP_SHA256 = padding.OAEP(
+    mgf=padding.MGF1(algorithm=hashes.SHA256()),
+    algorithm=hashes.SHA256(),
+    label=None
+)
 
 @pytest.fixture
 def crypto_system():
@@ -33,10 +49,7 @@ def test_document_encryption(crypto_system):
         encryption_result['encrypted_key'],
         encryption_result['metadata'],
         user_keys['master_key_encrypted'],
-        crypto_system._derive_key_from_password(
-            password,
-            user_keys['master_salt']
-        )
+        master_key_for(crypto_system, password, user_keys)
     )
     
     assert decrypted_content == test_content
@@ -51,8 +64,295 @@ def test_preview_encryption(crypto_system):
     # Verschlüssele Preview
     encrypted_preview = crypto_system.encrypt_preview(
         test_preview,
-        user_keys['public_key']
+        os.urandom(32)
     )
     
     assert encrypted_preview is not None
     assert len(encrypted_preview) > len(test_preview)
+
+def master_key_for(crypto_system, password, user_keys):
+    wrapping_key = crypto_system._derive_key_from_password(password, user_keys['master_salt'])
+    return crypto_system.unwrap_master_key(user_keys['master_key_wrapped'], wrapping_key)
+
+@pytest.mark.asyncio
+async def test_password_change_rewraps_only_master_key(crypto_system):
+    user_keys = crypto_system.generate_user_keys("old_password123")
+    master_key = await crypto_system.unlock_master_key(
+        "old_password123", user_keys['master_salt'], user_keys['master_key_wrapped']
+    )
+    assert master_key == user_keys['master_key']
+
+    master_salt, master_key_wrapped = await crypto_system.wrap_master_key_for_password(
+        master_key, "new_password123", key_id=1
+    )
+
+    assert await crypto_system.unlock_master_key("new_password123", master_salt, master_key_wrapped) == master_key
+    assert envelope.parse(master_key_wrapped).key_id == 1
+    with pytest.raises(InvalidTag):
+        await crypto_system.unlock_master_key("old_password123", master_salt, master_key_wrapped)
+    # Private Key bleibt unverändert entsperrbar
+    crypto_system.unlock_private_key(user_keys['master_key_encrypted'], master_key)
+
+@pytest.mark.asyncio
+async def test_rewrap_keys_for_new_keypair(crypto_system):
+    user_keys = crypto_system.generate_user_keys("test_password123")
+    private_key = crypto_system.unlock_private_key(
+        user_keys['master_key_encrypted'],
+        user_keys['master_key']
+    )
+    results = [crypto_system.encrypt_document(b"doc %d" % i, user_keys['public_key']) for i in range(5)]
+
+    new_private_pem, new_public_pem = generate_rsa_keypair(2048)
+    new_private_key = serialization.load_pem_private_key(new_private_pem, password=None)
+    wrapped_keys = await crypto_system.rewrap_keys(
+        [r['encrypted_key'] for r in results], private_key, new_public_pem
+    )
+
+    assert await crypto_system.decrypt_documents(
+        [EncryptedDocument(r['encrypted_content'], key, r['metadata']) for r, key in zip(results, wrapped_keys)],
+        new_private_key
+    ) == [b"doc %d" % i for i in range(5)]
+
+@pytest.mark.parametrize("size", [0, 1, 15, 16, 1000, 100_000])
+def test_envelope_roundtrip(size):
+    key = os.urandom(32)
+    content = os.urandom(size)
+
+    sealed = envelope.seal(content, key, key_id=7)
+    parsed = envelope.parse(sealed)
+
+    assert len(sealed) == envelope._HEADER.size + size
+    assert parsed.key_id == 7
+    assert envelope.open_envelope(parsed, key) == content
+
+def test_envelope_authenticates_header():
+    key = os.urandom(32)
+    sealed = envelope.seal(b"content", key, key_id=1)
+    sealed[9] ^= 0x01  # key_id verändert
+
+    with pytest.raises(InvalidTag):
+        envelope.open_envelope(envelope.parse(sealed), key)
+
+def test_decrypt_document_reads_legacy_metadata(crypto_system):
+    password = "test_password123"
+    user_keys = crypto_system.generate_user_keys(password)
+    public_key = serialization.load_pem_public_key(user_keys['public_key'])
+    document_key = os.urandom(32)
+    nonce = os.urandom(12)
+    encryptor = Cipher(algorithms.AES(document_key), modes.GCM(nonce)).encryptor()
+    ciphertext = encryptor.update(b"legacy document") + encryptor.finalize()
+    metadata = json.dumps({
+        'nonce': base64.b64encode(nonce).decode(),
+        'tag': base64.b64encode(encryptor.tag).decode()
+    })
+
+    decrypted = crypto_system.decrypt_document(
+        ciphertext,
+        public_key.encrypt(document_key, OAEP_SHA256),
+        metadata,
+        user_keys['master_key_encrypted'],
+        master_key_for(crypto_system, password, user_keys)
+    )
+
+    assert decrypted == b"legacy document"
+
+def test_preview_envelope_roundtrip(crypto_system):
+    password = "test_password123"
+    user_keys = crypto_system.generate_user_keys(password)
+    preview = os.urandom(4096)
+    document_key = os.urandom(32)
+    encrypted_key = crypto_system.encrypt_key_for_recipient(document_key, user_keys['public_key'])
+
+    encrypted_preview = crypto_system.encrypt_preview(preview, document_key, key_id=1)
+
+    # Header ohne eigenen verpackten Schlüssel, kein base64-Aufschlag
+    assert len(encrypted_preview) == envelope._HEADER.size + len(preview)
+    assert crypto_system.decrypt_preview(
+        encrypted_preview,
+        encrypted_key,
+        user_keys['master_key_encrypted'],
+        master_key_for(crypto_system, password, user_keys)
+    ) == preview
+
+def test_decrypt_preview_reads_legacy_format(crypto_system):
+    password = "test_password123"
+    user_keys = crypto_system.generate_user_keys(password)
+    document_key = os.urandom(32)
+    encrypted_key = crypto_system.encrypt_key_for_recipient(document_key, user_keys['public_key'])
+
+    # So wurden Vorschauen vor dem Envelope-Format gespeichert
+    legacy_preview = crypto_system.encrypt_with_key(b"old thumbnail", document_key)
+
+    assert crypto_system.decrypt_preview(
+        legacy_preview,
+        encrypted_key,
+        user_keys['master_key_encrypted'],
+        master_key_for(crypto_system, password, user_keys)
+    ) == b"old thumbnail"
+
+@pytest.mark.asyncio
+async def test_password_hashing_async(crypto_system):
+    password = "test_password123"
+    password_hash = await crypto_system.hash_password_async(password)
+    
+    # Async und sync Varianten müssen kompatible Hashes erzeugen
+    assert crypto_system.verify_password(password, password_hash)
+    assert await crypto_system.verify_password_async(password, password_hash)
+    assert not await crypto_system.verify_password_async("wrong_password", password_hash)
+
+@pytest.mark.parametrize("size", [0, 1, 1024, 4096, 4097, 10 * 4096 + 17])
+def test_stream_encryption_roundtrip(size):
+    key = os.urandom(32)
+    content = os.urandom(size)
+    
+    encryptor = StreamEncryptor(key, chunk_size=4096)
+    encrypted = encryptor.header
+    # In ungeraden Stücken einspeisen, wie bei einem Upload
+    for i in range(0, size, 1000):
+        encrypted += encryptor.update(content[i:i + 1000])
+    encrypted += encryptor.finalize()
+    
+    decryptor = StreamDecryptor(key)
+    decrypted = b""
+    for i in range(0, len(encrypted), 777):
+        decrypted += decryptor.update(encrypted[i:i + 777])
+    decrypted += decryptor.finalize()
+    
+    assert decrypted == content
+
+def test_stream_encryption_detects_truncation():
+    key = os.urandom(32)
+    encryptor = StreamEncryptor(key, chunk_size=4096)
+    encrypted = encryptor.header + encryptor.update(os.urandom(3 * 4096)) + encryptor.finalize()
+    
+    # Letzten Chunk abschneiden: der vorletzte ist nicht als final markiert
+    truncated = encrypted[:16 + 2 * (4096 + 16)]
+    decryptor = StreamDecryptor(key)
+    with pytest.raises(InvalidTag):
+        decryptor.update(truncated)
+        decryptor.finalize()
+
+@pytest.mark.asyncio
+async def test_encrypt_key_for_recipients(crypto_system):
+    keypairs = {user_id: generate_rsa_keypair() for user_id in ("alice", "bob", "carol")}
+    message_key = os.urandom(32)
+    
+    wrapped = await crypto_system.encrypt_key_for_recipients(
+        message_key,
+        {user_id: public_pem for user_id, (_, public_pem) in keypairs.items()}
+    )
+    
+    assert set(wrapped) == set(keypairs)
+    for user_id, (private_pem, _) in keypairs.items():
+        private_key = serialization.load_pem_private_key(private_pem, password=None)
+        assert private_key.decrypt(wrapped[user_id], OAEP_SHA256) == message_key
+
+def test_public_key_cache_reuses_and_invalidates():
+    cache = PublicKeyCache(maxsize=8)
+    _, first_pem = generate_rsa_keypair()
+    _, second_pem = generate_rsa_keypair()
+    
+    first = cache.load(first_pem, "coach")
+    assert cache.load(first_pem, "coach") is first
+    assert cache.stats()["hits"] == 1
+    
+    # Neuer Schlüssel desselben Users verdrängt den alten Eintrag
+    cache.load(second_pem, "coach")
+    assert cache.stats()["size"] == 1
+    
+    cache.invalidate_user("coach")
+    assert cache.stats()["size"] == 0
+
+def test_private_key_cache_ttl_and_wipe(monkeypatch):
+    cache = PrivateKeyCache(maxsize=2, ttl=60)
+    key_a, key_b, key_c = object(), object(), object()
+    master = b"m" * 32
+    cache.put("session-a", "alice", b"encrypted-a", master, key_a)
+    cache.put("session-b", "bob", b"encrypted-b", master, key_b)
+    unlocked_b = cache._cache.get("session-b")
+
+    assert cache.get("session-a", b"encrypted-a", master) is key_a
+    # Anderer verschlüsselter Key (z.B. nach Rotation): kein Treffer
+    assert cache.get("session-a", b"other", master) is None
+    # Falscher Master Key: kein Treffer, auch nicht innerhalb der Session
+    assert cache.get("session-a", b"encrypted-a", b"x" * 32) is None
+
+    cache.put("session-c", "carol", b"encrypted-c", master, key_c)  # verdrängt session-b
+    assert unlocked_b.private_key is None
+    assert cache.get("session-b", b"encrypted-b", master) is None
+
+    cache.lock_user("alice")
+    assert cache.get("session-a", b"encrypted-a", master) is None
+
+    unlocked_c = cache._cache.get("session-c")
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+    assert cache.get("session-c", b"encrypted-c", master) is None
+    assert unlocked_c.private_key is None
+
+def test_decrypt_document_reuses_unlocked_key(crypto_system, monkeypatch):
+    password = "test_password123"
+    user_keys = crypto_system.generate_user_keys(password)
+    master_key = master_key_for(crypto_system, password, user_keys)
+    documents = [crypto_system.encrypt_document(b"doc %d" % i, user_keys['public_key']) for i in range(3)]
+
+    loads = []
+    load_private_key = crypto_system._load_private_key
+    monkeypatch.setattr(crypto_system, "_load_private_key", lambda *args: loads.append(1) or load_private_key(*args))
+
+    for i, document in enumerate(documents):
+        assert crypto_system.decrypt_document(
+            document['encrypted_content'],
+            document['encrypted_key'],
+            document['metadata'],
+            user_keys['master_key_encrypted'],
+            master_key,
+            session_id="session-1",
+            user_id="alice"
+        ) == b"doc %d" % i
+    assert len(loads) == 1
+
+    crypto_system.lock_session("session-1")
+    crypto_system.unlock_private_key(user_keys['master_key_encrypted'], master_key, "session-1", "alice")
+    assert len(loads) == 2
+    crypto_system.lock_session("session-1")
+
+@pytest.mark.asyncio
+async def test_bulk_decrypt_and_reencrypt(crypto_system):
+    password = "test_password123"
+    user_keys = crypto_system.generate_user_keys(password)
+    private_key = crypto_system.unlock_private_key(
+        user_keys['master_key_encrypted'],
+        master_key_for(crypto_system, password, user_keys)
+    )
+    contents = [os.urandom(n) for n in (0, 10, 1000, 70_000, 5, 6, 7, 8, 9)]
+    documents = [
+        EncryptedDocument(r['encrypted_content'], r['encrypted_key'], r['metadata'])
+        for r in (crypto_system.encrypt_document(c, user_keys['public_key']) for c in contents)
+    ]
+
+    assert await crypto_system.decrypt_documents(documents, private_key) == contents
+
+    new_private_pem, new_public_pem = generate_rsa_keypair(2048)
+    new_private_key = serialization.load_pem_private_key(new_private_pem, password=None)
+    reencrypted = await crypto_system.reencrypt_documents(documents, private_key, new_public_pem, key_id=2)
+
+    assert [envelope.parse(r['encrypted_content']).key_id for r in reencrypted] == [2] * len(contents)
+    assert await crypto_system.decrypt_documents(
+        [EncryptedDocument(r['encrypted_content'], r['encrypted_key'], r['metadata']) for r in reencrypted],
+        new_private_key
+    ) == contents
+
+@pytest.mark.asyncio
+async def test_recovery_answers_are_normalized_and_verified_together(crypto_system):
+    answers = ["Bello", "  Berlin ", "Goethe Schule", "Max", "Müller"]
+    salt = os.urandom(16)
+    answer_hashes = await crypto_system.hash_answers_async(answers)
+
+    given = ["bello", "berlin", "goethe  schule", "wrong", "MÜLLER"]
+    assert await crypto_system.verify_answers_async(given, answer_hashes) == [True, True, True, False, True]
+    assert crypto_system.verify_answer("BELLO", answer_hashes[0])
+
+    recovery_key = await crypto_system.derive_key_from_answers_async(answers, salt)
+    assert recovery_key == crypto_system.derive_key_from_answers([a.upper() for a in answers], salt)
+    assert recovery_key != crypto_system.derive_key_from_answers(given, salt)
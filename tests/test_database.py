@@ -0,0 +1,95 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from sqlalchemy import select, func, update
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from secure_vault.core.database import (
+    Base, install_sqlite_pragmas, install_sqlite_write_transactions
+)
+from secure_vault.core.writequeue import SQLiteWriteQueue, QueuedWriteSession
+from secure_vault.models.models import AuditLog
+
+@pytest_asyncio.fixture
+async def single_writer(tmp_path):
+    db_path = tmp_path / "vault.db"
+    write_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{db_path}", poolclass=AsyncAdaptedQueuePool, pool_size=1, max_overflow=0
+    )
+    install_sqlite_pragmas(write_engine, {"journal_mode": "wal", "busy_timeout": 5000})
+    install_sqlite_write_transactions(write_engine)
+    async with write_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    read_engine = create_async_engine(f"sqlite+aiosqlite:///file:{db_path}?mode=ro&uri=true")
+    queue = SQLiteWriteQueue(
+        sessionmaker(write_engine, class_=AsyncSession, expire_on_commit=False),
+        max_batch=50,
+        batch_window_ms=5
+    )
+    factory = sessionmaker(
+        read_engine, class_=QueuedWriteSession, expire_on_commit=False, write_queue=queue
+    )
+    yield factory, queue
+    await queue.stop()
+    await read_engine.dispose()
+    await write_engine.dispose()
+
+async def count_logs(factory, **filters):
+    async with factory() as session:
+        query = select(func.count()).select_from(AuditLog).filter_by(**filters)
+        return (await session.execute(query)).scalar_one()
+
+@pytest.mark.asyncio
+async def test_concurrent_commits_are_grouped(single_writer):
+    factory, queue = single_writer
+
+    async def write(i):
+        async with factory() as session:
+            session.add(AuditLog(log_id=f"log-{i}", action="test", success=True))
+            await session.commit()
+
+    await asyncio.gather(*(write(i) for i in range(40)))
+
+    assert await count_logs(factory, action="test") == 40
+
+@pytest.mark.asyncio
+async def test_failing_job_does_not_abort_batch(single_writer):
+    factory, queue = single_writer
+
+    async def write(log_id):
+        async with factory() as session:
+            session.add(AuditLog(log_id=log_id, action="test", success=True))
+            await session.commit()
+
+    results = await asyncio.gather(
+        write("a"), write("dup"), write("dup"), write("b"),
+        return_exceptions=True
+    )
+
+    assert sum(isinstance(r, Exception) for r in results) == 1
+    assert await count_logs(factory, action="test") == 3
+
+@pytest.mark.asyncio
+async def test_updates_deletes_and_dml_go_through_queue(single_writer):
+    factory, queue = single_writer
+    async with factory() as session:
+        session.add_all([
+            AuditLog(log_id="x", action="test", success=True),
+            AuditLog(log_id="y", action="test", success=True)
+        ])
+        await session.commit()
+
+    async with factory() as session:
+        entry = await session.get(AuditLog, "x")
+        entry.success = False
+        await session.delete(await session.get(AuditLog, "y"))
+        await session.execute(
+            update(AuditLog).where(AuditLog.log_id == "x").values(details="changed")
+        )
+        await session.commit()
+
+    async with factory() as session:
+        entries = (await session.execute(select(AuditLog))).scalars().all()
+    assert [(e.log_id, e.success, e.details) for e in entries] == [("x", False, "changed")]
@@ -0,0 +1,79 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from cryptography.hazmat.primitives import serialization
+from secure_vault.core.keypool import KeyPairPool, generate_rsa_keypair
+
+KEY_SIZE = 1024
+
+def assert_keypair(keypair):
+    private_pem, public_pem = keypair
+    private_key = serialization.load_pem_private_key(private_pem, password=None)
+    assert private_key.key_size == KEY_SIZE
+    assert private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    ) == public_pem
+
+async def wait_for_depth(pool, depth, timeout=60):
+    async def poll():
+        while pool.depth < depth:
+            await asyncio.sleep(0.05)
+    await asyncio.wait_for(poll(), timeout)
+
+@pytest.mark.asyncio
+async def test_refill_reaches_target_depth():
+    pool = KeyPairPool(target_size=3, workers=2, key_size=KEY_SIZE)
+    await pool.start()
+    try:
+        await wait_for_depth(pool, 3)
+        # Ohne Entnahme wird nicht über den Zielwert hinaus erzeugt
+        await asyncio.sleep(0.2)
+        assert pool.depth == 3
+    finally:
+        await pool.stop()
+
+@pytest.mark.asyncio
+async def test_acquire_from_warm_pool_refills():
+    pool = KeyPairPool(target_size=2, workers=1, key_size=KEY_SIZE)
+    await pool.start()
+    try:
+        await wait_for_depth(pool, 2)
+        assert_keypair(await pool.acquire())
+        assert pool.depth == 1
+        assert pool._fallback_executor is None
+        await wait_for_depth(pool, 2)
+    finally:
+        await pool.stop()
+
+@pytest.mark.asyncio
+async def test_acquire_on_empty_pool_does_not_wait_for_refill():
+    pool = KeyPairPool(target_size=1, workers=1, key_size=KEY_SIZE)
+    # Refill-Pool mit einem blockierten Worker: jeder Refill hängt
+    release = threading.Event()
+    pool._executor = ThreadPoolExecutor(max_workers=1)
+    pool._executor.submit(release.wait)
+    await pool.start()
+    try:
+        assert pool.depth == 0
+        assert_keypair(await asyncio.wait_for(pool.acquire(), 60))
+    finally:
+        release.set()
+        await pool.stop()
+
+@pytest.mark.asyncio
+async def test_stop_cancels_refill_and_shuts_down_executors():
+    pool = KeyPairPool(target_size=1, workers=1, key_size=KEY_SIZE)
+    await pool.start()
+    await pool.acquire()
+    refill_executor, fallback_executor = pool._executor, pool._fallback_executor
+    await pool.stop()
+
+    assert pool._task is None
+    assert pool._executor is None and pool._fallback_executor is None
+    for executor in (refill_executor, fallback_executor):
+        with pytest.raises(RuntimeError):
+            executor.submit(generate_rsa_keypair, KEY_SIZE)
+    # Erneutes stop() ist harmlos
+    await pool.stop()
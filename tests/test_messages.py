@@ -0,0 +1,107 @@
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from secure_vault.api import messages
+from secure_vault.api.auth import Principal, get_current_user
+from secure_vault.core.crypto import OAEP_SHA256, CryptoSystem
+from secure_vault.core.database import Base, get_db
+from secure_vault.models.models import Message, MessageRecipient, User
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/messages.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+@pytest.fixture
+def crypto_system():
+    return CryptoSystem()
+
+@pytest_asyncio.fixture
+async def users(session_factory, crypto_system):
+    keys = {}
+    async with session_factory() as session:
+        for user_id in ("alice", "bob"):
+            keys[user_id] = crypto_system.generate_user_keys("test_password123")
+            session.add(User(
+                user_id=user_id,
+                password_hash="x",
+                master_key_encrypted=keys[user_id]['master_key_encrypted'],
+                public_key=keys[user_id]['public_key'],
+                key_id=keys[user_id]['key_id']
+            ))
+        await session.commit()
+    return keys
+
+def client_for(session_factory, user_id):
+    app = FastAPI()
+    app.include_router(messages.router)
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+            await session.commit()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = lambda: Principal(user_id=user_id, password_hash="x")
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+def open_message(crypto_system, user_keys, item):
+    private_key = crypto_system.unlock_private_key(user_keys['master_key_encrypted'], user_keys['master_key'])
+    message_key = private_key.decrypt(bytes.fromhex(item["encrypted_key"]), OAEP_SHA256)
+    return crypto_system.decrypt_message(bytes.fromhex(item["encrypted_content"]), message_key)
+
+@pytest.mark.asyncio
+async def test_inbox_returns_encoded_content(session_factory, crypto_system, users):
+    message_key = b"k" * 32
+    async with session_factory() as session:
+        session.add(Message(
+            message_id="msg-0",
+            from_user="alice",
+            encrypted_content=crypto_system.encrypt_with_key(b"hello bob", message_key)
+        ))
+        session.add(MessageRecipient(
+            message_id="msg-0",
+            user_id="bob",
+            encrypted_key=crypto_system.encrypt_key_for_recipient(message_key, users["bob"]['public_key'])
+        ))
+        await session.commit()
+
+    statements = []
+    listen = lambda conn, cursor, statement, *args: statements.append(statement)
+    engine = session_factory.kw["bind"].sync_engine
+    event.listen(engine, "before_cursor_execute", listen)
+    try:
+        async with client_for(session_factory, "bob") as client:
+            response = await client.get("/messages")
+    finally:
+        event.remove(engine, "before_cursor_execute", listen)
+
+    assert response.status_code == 200
+    # Das Legacy-JSON mit den Schlüsseln aller Empfänger wird nicht gelesen
+    assert statements and not any("encrypted_keys" in s for s in statements if s.startswith("SELECT"))
+    [item] = response.json()
+    assert item["message_id"] == "msg-0" and item["from_user"] == "alice"
+    assert open_message(crypto_system, users["bob"], item) == b"hello bob"
+
+@pytest.mark.asyncio
+async def test_send_message_and_read_it_back(session_factory, crypto_system, users):
+    async with client_for(session_factory, "alice") as client:
+        sent = await client.post("/messages", json={"content": "hallo bob", "recipients": ["bob"], "group_id": None})
+    assert sent.status_code == 200
+    assert open_message(crypto_system, users["alice"], sent.json()) == b"hallo bob"
+
+    async with client_for(session_factory, "bob") as client:
+        inbox = (await client.get("/messages")).json()
+    assert [item["message_id"] for item in inbox] == [sent.json()["message_id"]]
+    assert open_message(crypto_system, users["bob"], inbox[0]) == b"hallo bob"
+    # Schlüssel liegen nur in message_recipients, das die Key-Rotation umpackt
+    async with session_factory() as session:
+        message = await session.get(Message, sent.json()["message_id"])
+    assert message.encrypted_keys is None
@@ -0,0 +1,49 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from secure_vault.core.config import get_settings
+from secure_vault.utils import password as password_module
+from secure_vault.utils.password import PasswordValidator
+
+@pytest.fixture
+def validator():
+    return PasswordValidator(get_settings())
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("candidate", [
+    "short1A!",
+    "onlylowercase123",
+    "Password123!",
+    "Correct-Horse-Battery-Staple-7",
+    "Kj#9$mP2&5@qR(x",
+])
+async def test_async_validation_matches_sync(validator, candidate):
+    assert await validator.validate_async(candidate) == validator.validate(candidate)
+    assert await validator.generate_feedback_async(candidate) == validator.generate_feedback(candidate)
+
+@pytest.mark.asyncio
+async def test_repeated_analysis_is_cached_without_plaintext(validator, monkeypatch):
+    calls = []
+    original = password_module.zxcvbn
+    monkeypatch.setattr(password_module, "zxcvbn", lambda pw: calls.append(1) or original(pw))
+    candidate = "Correct-Horse-Battery-Staple-7"
+
+    first = await validator.analyze_async(candidate)
+    second = await validator.analyze_async(candidate)
+
+    assert first == second and len(calls) == 1
+    keys = list(validator._cache._data)
+    assert all(isinstance(key, bytes) and candidate.encode() not in key for key in keys)
+    assert candidate not in repr(validator._cache._data)
+
+def test_password_strength_endpoint():
+    from secure_vault.api import auth
+    app = FastAPI()
+    app.include_router(auth.router)
+    client = TestClient(app)
+
+    weak = client.post("/auth/password-strength", json={"password": "password"}).json()
+    strong = client.post("/auth/password-strength", json={"password": "Correct-Horse-Battery-Staple-7"}).json()
+
+    assert weak["is_valid"] is False and weak["score"] < strong["score"]
+    assert strong["is_valid"] is True and strong["is_complex_enough"] is True
@@ -0,0 +1,135 @@
+import asyncio
+import io
+import os
+import time
+import pytest
+from fastapi import UploadFile
+from PIL import Image
+from secure_vault.core.executors import BoundedExecutor, ExecutorSaturated
+from secure_vault.core.previews import (
+    PreviewError, PreviewTimeout, SpooledUpload, create_preview, decode_preview_records,
+    encode_preview_records, render_thumbnail, spool_upload
+)
+
+def image_bytes(size, format="JPEG"):
+    data = io.BytesIO()
+    Image.new("RGB", size, color=(200, 30, 30)).save(data, format=format)
+    return data.getvalue()
+
+async def spool_image(tmp_path, monkeypatch, size, format="JPEG"):
+    from secure_vault.core.config import get_settings
+    monkeypatch.setattr(get_settings(), "temp_dir", str(tmp_path / "spool"))
+    return await spool_upload(UploadFile(io.BytesIO(image_bytes(size, format))))
+
+@pytest.mark.asyncio
+async def test_spooled_upload_is_encrypted(tmp_path, monkeypatch):
+    original = image_bytes((64, 64), "PNG")
+    spooled = await spool_image(tmp_path, monkeypatch, (64, 64), "PNG")
+
+    with open(spooled.path, 'rb') as f:
+        on_disk = f.read()
+    assert original[:8] not in on_disk and b"IHDR" not in on_disk
+    assert Image.open(io.BytesIO(render_thumbnail(spooled.path, spooled.key, (32, 32), 50_000_000))).size == (32, 32)
+    spooled.remove()
+    assert os.listdir(tmp_path / "spool") == []
+
+@pytest.mark.asyncio
+async def test_thumbnail_is_downscaled(tmp_path, monkeypatch):
+    spooled = await spool_image(tmp_path, monkeypatch, (4000, 3000))
+
+    preview = render_thumbnail(spooled.path, spooled.key, (100, 100), 50_000_000)
+
+    image = Image.open(io.BytesIO(preview))
+    assert image.format == "PNG"
+    assert max(image.size) <= 100
+
+@pytest.mark.asyncio
+async def test_pixel_limit_is_enforced_before_decoding(tmp_path, monkeypatch):
+    spooled = await spool_image(tmp_path, monkeypatch, (2000, 2000), format="PNG")
+
+    with pytest.raises(PreviewError):
+        render_thumbnail(spooled.path, spooled.key, (100, 100), 1_000_000)
+
+@pytest.mark.asyncio
+async def test_slow_decoding_times_out_in_the_worker(tmp_path, monkeypatch):
+    spooled = await spool_image(tmp_path, monkeypatch, (4000, 4000), format="PNG")
+
+    with pytest.raises(PreviewTimeout):
+        render_thumbnail(spooled.path, spooled.key, (100, 100), 50_000_000, timeout=0.001)
+
+@pytest.mark.asyncio
+async def test_invalid_image_yields_no_preview(tmp_path):
+    path = tmp_path / "broken.jpg"
+    path.write_bytes(b"not an image")
+
+    assert await create_preview(SpooledUpload(str(path), os.urandom(32))) is None
+
+@pytest.mark.asyncio
+async def test_cancelled_job_keeps_its_slot_until_it_finishes():
+    executor = BoundedExecutor("test", "thread", max_workers=1, max_queue=0, queue_timeout=0.01)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(executor.run(time.sleep, 0.3), 0.05)
+    # Der Worker schläft noch: kein zweiter Job daneben
+    assert executor.in_flight == 1
+    with pytest.raises(ExecutorSaturated):
+        await executor.run(time.sleep, 0)
+
+    await asyncio.sleep(0.4)
+    assert executor.in_flight == 0
+    await executor.run(time.sleep, 0)
+    executor.shutdown()
+
+def test_preview_records_roundtrip():
+    records = [
+        ("doc-1", b"wrapped-key", b"\x89PNG preview"),
+        ("doc-ä", b"k" * 512, None),
+    ]
+
+    data = b"".join(encode_preview_records(records))
+
+    assert list(decode_preview_records(data)) == [
+        ("doc-1", b"wrapped-key", b"\x89PNG preview"),
+        ("doc-ä", b"k" * 512, b""),
+    ]
+
+@pytest.mark.asyncio
+async def test_background_preview_is_stored_as_envelope(tmp_path, monkeypatch):
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+    from sqlalchemy.orm import sessionmaker
+    from secure_vault.core import envelope, previews
+    from secure_vault.core.crypto import CryptoSystem
+    from secure_vault.core.database import Base
+    from secure_vault.models.models import Document
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/previews.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    monkeypatch.setattr(previews, "AsyncSessionLocal", session_factory)
+    crypto_system = CryptoSystem()
+    user_keys = crypto_system.generate_user_keys("test_password123")
+    document_key = os.urandom(32)
+    encrypted_key = crypto_system.encrypt_key_for_recipient(document_key, user_keys['public_key'])
+    async with session_factory() as session:
+        session.add(Document(document_id="doc-1", recipient_id="bob", encrypted_name="n",
+                             encrypted_key=encrypted_key, key_id=1))
+        await session.commit()
+
+    spooled = await spool_image(tmp_path, monkeypatch, (400, 300))
+    previews.schedule_preview("doc-1", spooled, document_key, 1, crypto_system)
+    await previews.wait_for_previews()
+
+    try:
+        async with session_factory() as session:
+            encrypted_preview = (await session.execute(
+                select(Document.encrypted_preview).where(Document.document_id == "doc-1")
+            )).scalar_one()
+    finally:
+        await engine.dispose()
+    assert envelope.parse(encrypted_preview).key_id == 1
+    preview = crypto_system.decrypt_preview(
+        encrypted_preview, encrypted_key, user_keys['master_key_encrypted'], user_keys['master_key']
+    )
+    assert Image.open(io.BytesIO(preview)).format == "PNG"
@@ -0,0 +1,133 @@
+import re
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine, select, or_, text
+from secure_vault.api.documents import (
+    document_count_query, document_filters, document_page_query, tag_counts_query, tag_filter
+)
+from secure_vault.api.messages import INBOX_COLUMNS
+from secure_vault.core.database import Base
+from secure_vault.models.models import (
+    Document, DocumentShare, Message, MessageRecipient, RecoveryQuestions, AuditLog
+)
+
+# Tabellenzugriff ohne Index: "SCAN documents" (ältere SQLite-Versionen: "SCAN TABLE documents")
+FULL_SCAN = re.compile(r"^SCAN (TABLE )?(\w+)$")
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+def query_plan(engine, query):
+    compiled = query.compile(engine, compile_kwargs={"literal_binds": True})
+    with engine.connect() as conn:
+        return [row[3] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))]
+
+def assert_no_full_scan(engine, query):
+    plan = query_plan(engine, query)
+    scans = [step for step in plan if FULL_SCAN.match(step)]
+    assert not scans, f"Full table scan in query plan: {plan}"
+    return plan
+
+def document_list(cursor=None, **filters):
+    # Wie api.documents.list_documents
+    return document_page_query(document_filters("alice", **filters), cursor, 51)
+
+@pytest.mark.parametrize("filters", [
+    {},
+    {"received_only": True},
+    {"mime_type": "image/png"},
+    {"received_only": True, "mime_type": "image/png"},
+], ids=["all", "received", "all_mime", "received_mime"])
+def test_document_list_uses_indexes(engine, filters):
+    assert_no_full_scan(engine, document_list(**filters))
+    assert_no_full_scan(engine, document_list(cursor=(datetime(2024, 1, 1), "x"), **filters))
+
+@pytest.mark.parametrize("tag_mode", ["all", "any"])
+def test_tag_filter_uses_tag_index(engine, tag_mode):
+    condition = tag_filter(["a", "b"], tag_mode)
+    query = document_page_query([[*branch, condition] for branch in document_filters("alice")], None, 51)
+    plan = assert_no_full_scan(engine, query)
+    # list_documents kommt über document_filters(tags=...) zur selben Bedingung
+    assert str(query) == str(document_list(tags="a,b", tag_mode=tag_mode))
+    assert any("ux_document_tags_tag_document" in step for step in plan)
+
+@pytest.mark.parametrize("received_only", [False, True], ids=["all", "received"])
+def test_tag_counts_use_indexes(engine, received_only):
+    assert_no_full_scan(engine, tag_counts_query("alice", received_only))
+
+@pytest.mark.parametrize("received_only", [False, True], ids=["all", "received"])
+def test_document_list_needs_no_sort(engine, received_only):
+    for cursor in (None, (datetime(2024, 1, 1), "x")):
+        plan = assert_no_full_scan(engine, document_list(cursor=cursor, received_only=received_only))
+        assert not any("TEMP B-TREE" in step for step in plan), plan
+
+def test_document_list_branches_use_their_indexes(engine):
+    plan = query_plan(engine, document_list())
+    # Eigene und empfangene Dokumente: zwei Indexscans, sortiert gemischt
+    assert "MERGE (UNION ALL)" in plan
+    assert any("ix_documents_recipient_created" in step for step in plan)
+    assert any("ix_documents_owner_created" in step for step in plan)
+
+def test_document_count_uses_indexes(engine):
+    assert_no_full_scan(engine, document_count_query(document_filters("alice")))
+
+def test_blob_reference_lookup_uses_index(engine):
+    query = select(Document.document_id).where(Document.encrypted_path == "ab/cd/abcd").limit(1)
+    assert_no_full_scan(engine, query)
+
+def test_inbox_uses_recipient_index(engine):
+    query = (
+        select(*INBOX_COLUMNS)
+        .join(MessageRecipient, MessageRecipient.message_id == Message.message_id)
+        .where(MessageRecipient.user_id == "alice")
+        .order_by(MessageRecipient.created_at.desc(), MessageRecipient.message_id.desc())
+        .limit(51)
+    )
+    plan = assert_no_full_scan(engine, query)
+    assert not any("TEMP B-TREE" in step for step in plan)
+
+@pytest.mark.parametrize("query", [
+    select(RecoveryQuestions).where(RecoveryQuestions.user_id == "alice").order_by(RecoveryQuestions.question_id),
+    select(DocumentShare).where(DocumentShare.document_id == "doc"),
+    select(DocumentShare).where(DocumentShare.user_id == "alice"),
+    select(AuditLog).where(AuditLog.user_id == "alice").order_by(AuditLog.timestamp.desc()).limit(100),
+    select(Message).where(Message.group_id == "group"),
+    select(Document.document_id, Document.encrypted_key).where(
+        Document.recipient_id == "alice", or_(Document.key_id.is_(None), Document.key_id < 2)
+    ).limit(200),
+], ids=["recovery_questions", "shares_by_document", "shares_by_user", "audit_by_user", "group_messages",
+        "key_rotation"])
+def test_lookups_use_indexes(engine, query):
+    assert_no_full_scan(engine, query)
+
+def test_document_list_union_pages_without_duplicates():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    owners = [("alice", "bob"), ("bob", "alice"), ("alice", "alice"), ("bob", "carol"), (None, "alice"), ("alice", None)]
+    with engine.begin() as conn:
+        conn.execute(Document.__table__.insert(), [
+            {"document_id": f"doc-{i}", "owner_id": owner, "recipient_id": recipient,
+             "encrypted_name": "n", "created_at": datetime(2024, 1, 1 + i // 2)}
+            for i, (owner, recipient) in enumerate(owners * 2)
+        ])
+        seen, cursor = [], None
+        while True:
+            rows = conn.execute(document_page_query(document_filters("alice"), cursor, 3)).all()
+            seen += [row.document_id for row in rows]
+            if len(rows) < 3:
+                break
+            cursor = (rows[-1].created_at, rows[-1].document_id)
+        total = conn.execute(document_count_query(document_filters("alice"))).scalar_one()
+    engine.dispose()
+
+    expected = sorted(
+        ((datetime(2024, 1, 1 + i // 2), f"doc-{i}") for i, (owner, recipient) in enumerate(owners * 2)
+         if "alice" in (owner, recipient)),
+        reverse=True
+    )
+    assert seen == [document_id for _, document_id in expected]
+    assert total == len(expected) == 10
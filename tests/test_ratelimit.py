@@ -0,0 +1,123 @@
+import pytest
+from types import SimpleNamespace
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from secure_vault.core import ratelimit
+from secure_vault.core.config import get_settings
+from secure_vault.core.ratelimit import Limit, MemoryRateLimitBackend, RateLimited, RateLimiter
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    return now
+
+@pytest.fixture
+def limiter(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "login_rate_limit_per_user", 3)
+    monkeypatch.setattr(settings, "login_rate_limit_per_ip", 5)
+    monkeypatch.setattr(settings, "login_backoff_free_failures", 2)
+    return RateLimiter(MemoryRateLimitBackend(), settings)
+
+@pytest.mark.asyncio
+async def test_token_bucket_refills(clock):
+    backend = MemoryRateLimitBackend()
+    limit = Limit(2, 60)
+
+    assert await backend.take("k", limit) == 0
+    assert await backend.take("k", limit) == 0
+    assert await backend.take("k", limit) == pytest.approx(30)
+
+    clock[0] += 30
+    assert await backend.take("k", limit) == 0
+
+@pytest.mark.asyncio
+async def test_user_and_ip_buckets(limiter, clock):
+    for _ in range(3):
+        await limiter.check("login", "alice", "10.0.0.1")
+    with pytest.raises(RateLimited) as exc:
+        await limiter.check("login", "alice", "10.0.0.2")
+    assert exc.value.scope == "login:user" and exc.value.retry_after == 20
+
+    # Viele Benutzer von einer IP
+    await limiter.check("login", "bob", "10.0.0.1")
+    await limiter.check("login", "carol", "10.0.0.1")
+    with pytest.raises(RateLimited) as exc:
+        await limiter.check("login", "dave", "10.0.0.1")
+    assert exc.value.scope == "login:ip"
+
+@pytest.mark.asyncio
+async def test_failures_back_off_exponentially(limiter, clock):
+    for _ in range(2):
+        await limiter.failed("login", "alice")
+    assert await limiter.backend.locked_for("login:user:alice") == 0
+
+    delays = []
+    for _ in range(3):
+        await limiter.failed("login", "alice")
+        delays.append(await limiter.backend.locked_for("login:user:alice"))
+    assert delays == [1, 2, 4]
+
+    with pytest.raises(RateLimited) as exc:
+        await limiter.check("login", "alice", None)
+    assert exc.value.scope == "login:backoff"
+
+    await limiter.succeeded("login", "alice")
+    await limiter.check("login", "alice", None)
+
+class FakeSession:
+    """Liefert für jede Abfrage denselben Benutzer"""
+
+    def __init__(self, user):
+        self.user = user
+
+    async def execute(self, statement, *args, **kwargs):
+        return SimpleNamespace(scalar_one_or_none=lambda: self.user)
+
+    def add(self, obj):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+def test_login_is_rejected_before_any_kdf(monkeypatch):
+    from fastapi.responses import JSONResponse
+    from secure_vault.api import auth
+    from secure_vault.core.database import get_db
+    from secure_vault.models.models import User
+
+    settings = get_settings()
+    monkeypatch.setattr(settings, "login_rate_limit_per_user", 1)
+    backend = MemoryRateLimitBackend()
+    monkeypatch.setattr(auth, "get_rate_limiter", lambda: RateLimiter(backend, settings))
+    kdf_calls = []
+
+    async def verify_password_async(password, password_hash):
+        kdf_calls.append(password)
+        return False
+
+    monkeypatch.setattr(auth.crypto, "verify_password_async", verify_password_async)
+    session = FakeSession(User(user_id="alice", password_hash="x", has_recovery=True))
+
+    app = FastAPI()
+    app.include_router(auth.router)
+    # Wie in main.py
+    app.add_exception_handler(RateLimited, lambda request, exc: JSONResponse(
+        status_code=429, content={}, headers={"Retry-After": str(exc.retry_after)}
+    ))
+    app.dependency_overrides[get_db] = lambda: session
+    client = TestClient(app, raise_server_exceptions=False)
+
+    first = client.post("/auth", params={"user_id": "alice", "password": "x"})
+    assert first.status_code == 401 and kdf_calls == ["x"]
+
+    response = client.post("/auth", params={"user_id": "alice", "password": "x"})
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    # Der zweite Versuch erreicht die Passwortprüfung nicht mehr
+    assert kdf_calls == ["x"]
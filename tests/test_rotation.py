@@ -0,0 +1,185 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from cryptography.hazmat.primitives import serialization
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from secure_vault.core import rotation
+from secure_vault.core.crypto import CryptoSystem, EncryptedDocument
+from secure_vault.core.database import Base
+from secure_vault.core.keypool import generate_rsa_keypair
+from secure_vault.models.models import Document, DocumentShare, KeyRotation, MessageRecipient, Message, User
+
+class StaticKeyPool:
+    async def acquire(self):
+        return generate_rsa_keypair(2048)
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'vault.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    monkeypatch.setattr(rotation, "AsyncSessionLocal", factory)
+    monkeypatch.setattr(rotation, "get_keypair_pool", StaticKeyPool)
+    monkeypatch.setattr(rotation.get_settings(), "key_rotation_batch_size", 3)
+    yield factory
+    await engine.dispose()
+
+@pytest.fixture
+def crypto_system():
+    return CryptoSystem()
+
+async def create_user(factory, crypto_system, documents=7):
+    user_keys = crypto_system.generate_user_keys("test_password123")
+    results = [crypto_system.encrypt_document(b"doc %d" % i, user_keys['public_key']) for i in range(documents)]
+    async with factory() as session:
+        session.add(User(
+            user_id="alice",
+            password_hash="x",
+            master_key_encrypted=user_keys['master_key_encrypted'],
+            master_salt=user_keys['master_salt'],
+            master_key_wrapped=user_keys['master_key_wrapped'],
+            public_key=user_keys['public_key'],
+            key_id=user_keys['key_id']
+        ))
+        session.add_all(
+            Document(document_id=f"doc-{i}", recipient_id="alice", encrypted_name="n",
+                     encrypted_key=r['encrypted_key'], key_id=None if i % 2 else 1)
+            for i, r in enumerate(results)
+        )
+        session.add(DocumentShare(share_id="share-0", document_id="doc-0", user_id="alice",
+                                  encrypted_key=results[0]['encrypted_key']))
+        session.add(Message(message_id="msg-0", from_user="alice"))
+        session.add(MessageRecipient(message_id="msg-0", user_id="alice",
+                                     encrypted_key=results[1]['encrypted_key']))
+        await session.commit()
+    return user_keys, results
+
+async def decrypt_all(factory, crypto_system, user_keys, results):
+    async with factory() as session:
+        user = await session.get(User, "alice")
+        private_key = crypto_system.unlock_private_key(user.master_key_encrypted, user_keys['master_key'])
+        keys = dict((await session.execute(select(Document.document_id, Document.encrypted_key))).all())
+    return await crypto_system.decrypt_documents(
+        [EncryptedDocument(r['encrypted_content'], keys[f"doc-{i}"], r['metadata']) for i, r in enumerate(results)],
+        private_key
+    )
+
+@pytest.mark.asyncio
+async def test_rotation_rewraps_all_keys(session_factory, crypto_system):
+    user_keys, results = await create_user(session_factory, crypto_system)
+
+    async with session_factory() as session:
+        user = await session.get(User, "alice")
+        started = await rotation.start_rotation(session, user, user_keys['master_key'], crypto_system)
+    await rotation._running["alice"]
+
+    async with session_factory() as session:
+        done = await session.get(KeyRotation, started.rotation_id)
+        user = await session.get(User, "alice")
+        key_ids = (await session.execute(select(Document.key_id))).scalars().all()
+        share = await session.get(DocumentShare, "share-0")
+        recipient = await session.get(MessageRecipient, ("msg-0", "alice"))
+
+    assert (done.status, done.total, done.processed) == ("completed", 9, 9)
+    assert done.previous_private_key_encrypted is None
+    assert user.key_id == 2 and user.public_key != user_keys['public_key']
+    assert set(key_ids) == {2} and share.key_id == 2 and recipient.key_id == 2
+    assert await decrypt_all(session_factory, crypto_system, user_keys, results) == [
+        b"doc %d" % i for i in range(7)
+    ]
+
+@pytest.mark.asyncio
+async def test_failed_rotation_resumes(session_factory, crypto_system, monkeypatch):
+    user_keys, results = await create_user(session_factory, crypto_system)
+    original = crypto_system.rewrap_keys
+    calls = []
+
+    async def failing_rewrap(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError("worker crashed")
+        return await original(*args, **kwargs)
+
+    monkeypatch.setattr(crypto_system, "rewrap_keys", failing_rewrap)
+    async with session_factory() as session:
+        user = await session.get(User, "alice")
+        started = await rotation.start_rotation(session, user, user_keys['master_key'], crypto_system)
+    with pytest.raises(RuntimeError):
+        await rotation._running["alice"]
+
+    async with session_factory() as session:
+        failed = await session.get(KeyRotation, started.rotation_id)
+        assert (failed.status, failed.processed) == ("failed", 3)
+        # Erneuter Start setzt denselben Lauf fort statt neu zu rotieren
+        user = await session.get(User, "alice")
+        resumed = await rotation.start_rotation(session, user, user_keys['master_key'], crypto_system)
+    await rotation._running["alice"]
+
+    async with session_factory() as session:
+        done = await session.get(KeyRotation, started.rotation_id)
+        user = await session.get(User, "alice")
+    assert resumed.rotation_id == started.rotation_id
+    assert (done.status, done.processed, user.key_id) == ("completed", 9, 2)
+    assert await decrypt_all(session_factory, crypto_system, user_keys, results) == [
+        b"doc %d" % i for i in range(7)
+    ]
+
+@pytest.mark.asyncio
+async def test_documents_stay_readable_during_half_finished_rotation(session_factory, crypto_system, monkeypatch):
+    user_keys, results = await create_user(session_factory, crypto_system)
+    original = crypto_system.rewrap_keys
+    calls = []
+
+    async def failing_rewrap(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError("worker crashed")
+        return await original(*args, **kwargs)
+
+    monkeypatch.setattr(crypto_system, "rewrap_keys", failing_rewrap)
+    async with session_factory() as session:
+        user = await session.get(User, "alice")
+        await rotation.start_rotation(session, user, user_keys['master_key'], crypto_system)
+    with pytest.raises(RuntimeError):
+        await rotation._running["alice"]
+
+    contents = []
+    async with session_factory() as session:
+        user = await session.get(User, "alice")
+        rows = (await session.execute(
+            select(Document.document_id, Document.encrypted_key, Document.key_id).order_by(Document.document_id)
+        )).all()
+        assert sorted(row.key_id or 1 for row in rows) == [1, 1, 1, 1, 2, 2, 2]
+        for row in rows:
+            r = results[int(row.document_id.split("-")[1])]
+            private_key_encrypted = await rotation.private_key_for_key_id(session, user, row.key_id)
+            contents.append(crypto_system.decrypt_document(
+                r['encrypted_content'], row.encrypted_key, r['metadata'],
+                private_key_encrypted, user_keys['master_key']
+            ))
+    assert contents == [b"doc %d" % i for i in range(7)]
+
+@pytest.mark.asyncio
+async def test_concurrent_starts_swap_once(session_factory, crypto_system):
+    user_keys, results = await create_user(session_factory, crypto_system)
+
+    async def start():
+        async with session_factory() as session:
+            user = await session.get(User, "alice")
+            return await rotation.start_rotation(session, user, user_keys['master_key'], crypto_system)
+
+    outcomes = await asyncio.gather(start(), start(), return_exceptions=True)
+    await rotation._running["alice"]
+
+    assert sorted(type(o).__name__ for o in outcomes) == ["KeyRotation", "RotationInProgress"]
+    async with session_factory() as session:
+        rotations = (await session.execute(select(KeyRotation))).scalars().all()
+        user = await session.get(User, "alice")
+    assert len(rotations) == 1 and rotations[0].status == "completed"
+    assert user.key_id == 2
+    assert await decrypt_all(session_factory, crypto_system, user_keys, results) == [
+        b"doc %d" % i for i in range(7)
+    ]
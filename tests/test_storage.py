@@ -0,0 +1,189 @@
+import pytest
+import json
+import os
+import threading
+from secure_vault.core.blobstore import LocalBlobStore, BlobNotFound
+from secure_vault.utils.http import RangeNotSatisfiable, etag_matches, parse_range_header
+
+@pytest.fixture
+def blob_store(tmp_path):
+    return LocalBlobStore(str(tmp_path / "blobs"))
+
+def test_blob_roundtrip(blob_store):
+    data = os.urandom(4096)
+    key = blob_store.put(data)
+    
+    # Schlüssel ist der geshardete SHA-256 des Inhalts
+    assert key.count('/') == 2
+    assert blob_store.exists(key)
+    assert blob_store.size(key) == len(data)
+    with blob_store.open(key) as f:
+        assert f.read() == data
+
+def test_blob_deduplication(blob_store):
+    data = b"same ciphertext"
+    assert blob_store.put(data) == blob_store.put(data)
+    assert os.listdir(blob_store.tmp_dir) == []
+
+def test_blob_writer_abort_leaves_nothing(blob_store):
+    with pytest.raises(RuntimeError):
+        with blob_store.writer() as writer:
+            writer.write(b"partial")
+            raise RuntimeError("upload aborted")
+    
+    assert os.listdir(blob_store.tmp_dir) == []
+
+@pytest.mark.asyncio
+async def test_async_blob_writer_runs_io_off_the_loop(blob_store, monkeypatch):
+    loop_thread = threading.get_ident()
+    threads = []
+    original_fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: threads.append(threading.get_ident()) or original_fsync(fd))
+
+    async with blob_store.writer() as writer:
+        await writer.write_async(b"async ")
+        await writer.write_async(b"ciphertext")
+        key = await writer.commit_async()
+
+    with blob_store.open(key) as f:
+        assert f.read() == b"async ciphertext"
+    assert threads and loop_thread not in threads
+
+    with pytest.raises(RuntimeError):
+        async with blob_store.writer() as writer:
+            await writer.write_async(b"partial")
+            raise RuntimeError("upload aborted")
+    assert os.listdir(blob_store.tmp_dir) == []
+
+def test_blob_delete(blob_store):
+    key = blob_store.put(b"to be deleted")
+    blob_store.delete(key)
+    
+    assert not blob_store.exists(key)
+    with pytest.raises(BlobNotFound):
+        blob_store.open(key)
+
+def test_blob_key_rejects_path_traversal(blob_store):
+    with pytest.raises(ValueError):
+        blob_store.path_for("../../etc/passwd")
+
+@pytest.mark.parametrize("header,expected", [
+    (None, None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=0-1,5-6", None),     # Mehrere Bereiche: ganze Ressource
+    ("items=0-1", None),
+    ("bytes=abc-", None),
+])
+def test_parse_range_header(header, expected):
+    assert parse_range_header(header, 1000) == expected
+
+def test_parse_range_header_unsatisfiable():
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header("bytes=1000-", 1000)
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('"x", "abc"', '"abc"')
+    assert etag_matches('*', '"abc"')
+    assert not etag_matches('"x"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+@pytest.mark.asyncio
+async def test_upload_is_encrypted_into_the_blob_store(blob_store, monkeypatch):
+    import io
+    from fastapi import UploadFile
+    from secure_vault.api import documents
+    from secure_vault.core.streaming import StreamDecryptor
+    monkeypatch.setattr(documents, "get_blob_store", lambda: blob_store)
+    monkeypatch.setattr(documents.settings, "stream_chunk_size", 1024)
+    content = os.urandom(10_000)
+    key = os.urandom(32)
+
+    blob_key, size = await documents.encrypt_upload_to_storage(UploadFile(io.BytesIO(content)), key)
+
+    decryptor = StreamDecryptor(key)
+    with blob_store.open(blob_key) as f:
+        assert decryptor.update(f.read()) + decryptor.finalize() == content
+    assert size == len(content)
+
+@pytest.mark.asyncio
+async def test_bulk_decrypt_and_reencrypt_uploaded_documents(blob_store, monkeypatch, tmp_path):
+    import httpx
+    from fastapi import FastAPI
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+    from sqlalchemy.orm import sessionmaker
+    from secure_vault.api import documents
+    from secure_vault.api.auth import get_optional_user
+    from secure_vault.core import crypto as crypto_module
+    from secure_vault.core.crypto import CryptoSystem, EncryptedDocument
+    from secure_vault.core.database import Base, get_db
+    from secure_vault.core.keypool import generate_rsa_keypair
+    from secure_vault.core.streaming import STREAM_FORMAT
+    from secure_vault.models.models import Document, User
+    from cryptography.hazmat.primitives import serialization
+    monkeypatch.setattr(documents, "get_blob_store", lambda: blob_store)
+    monkeypatch.setattr(crypto_module, "get_blob_store", lambda: blob_store)
+    monkeypatch.setattr(documents.settings, "stream_chunk_size", 1024)
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/documents.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    crypto_system = CryptoSystem()
+    user_keys = crypto_system.generate_user_keys("test_password123")
+    async with session_factory() as session:
+        session.add(User(
+            user_id="bob",
+            password_hash="x",
+            master_key_encrypted=user_keys['master_key_encrypted'],
+            public_key=user_keys['public_key'],
+            key_id=user_keys['key_id']
+        ))
+        await session.commit()
+
+    app = FastAPI()
+    app.include_router(documents.router)
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_optional_user] = lambda: None
+    content = os.urandom(5000)
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post(
+                "/documents",
+                data={"name": "report.bin", "recipient_id": "bob"},
+                files={"file": ("report.bin", content, "application/octet-stream")}
+            )
+        assert response.status_code == 200
+        async with session_factory() as session:
+            document = (await session.execute(
+                select(
+                    Document.encrypted_content, Document.encrypted_key,
+                    Document.encryption_metadata, Document.encrypted_path
+                ).where(Document.document_id == response.json()["document_id"])
+            )).one()
+    finally:
+        await engine.dispose()
+
+    assert document.encrypted_content is None
+    stored = EncryptedDocument(*document)
+    private_key = crypto_system.unlock_private_key(user_keys['master_key_encrypted'], user_keys['master_key'])
+    assert await crypto_system.decrypt_documents([stored], private_key) == [content]
+
+    new_private_pem, new_public_pem = generate_rsa_keypair(2048)
+    [result] = await crypto_system.reencrypt_documents([stored], private_key, new_public_pem, key_id=2)
+
+    assert json.loads(result['metadata'])['format'] == STREAM_FORMAT
+    assert result['encrypted_path'] != document.encrypted_path and blob_store.exists(result['encrypted_path'])
+    new_private_key = serialization.load_pem_private_key(new_private_pem, password=None)
+    assert await crypto_system.decrypt_documents([EncryptedDocument(
+        result['encrypted_content'], result['encrypted_key'], result['metadata'], result['encrypted_path']
+    )], new_private_key) == [content]
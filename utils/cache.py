@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-sichere LRU-Cache mit optionaler TTL.
+
+    ``on_evict(key, value)`` wird aufgerufen, wenn ein Eintrag verdrängt,
+    abgelaufen, invalidiert oder ersetzt wird.
+    """
+
+    def __init__(self,
+                 maxsize: int,
+                 ttl: Optional[float] = None,
+                 on_evict: Optional[Callable[[Hashable, Any], None]] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._on_evict = on_evict
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        evicted = None
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at is not None and expires_at <= time.monotonic():
+                    del self._data[key]
+                    evicted = (key, value)
+                    entry = _MISSING
+                else:
+                    self._data.move_to_end(key)
+            if entry is _MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if evicted:
+            self._evicted(*evicted)
+        return default if entry is _MISSING else entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        evicted = []
+        with self._lock:
+            old = self._data.pop(key, _MISSING)
+            if old is not _MISSING and old[0] is not value:
+                evicted.append((key, old[0]))
+            self._data[key] = (value, expires_at)
+            while len(self._data) > self.maxsize:
+                evicted.append(self._pop_oldest())
+        for item in evicted:
+            self._evicted(*item)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        self._evicted(key, entry[0])
+        return entry[0]
+
+    def invalidate(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Entfernt alle Einträge, für die ``predicate(key, value)`` wahr ist"""
+        with self._lock:
+            keys = [k for k, (v, _) in self._data.items() if predicate(k, v)]
+            removed = [(k, self._data.pop(k)[0]) for k in keys]
+        for item in removed:
+            self._evicted(*item)
+        return len(removed)
+
+    def clear(self):
+        self.invalidate(lambda key, value: True)
+
+    def purge_expired(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            keys = [k for k, (_, exp) in self._data.items() if exp is not None and exp <= now]
+            removed = [(k, self._data.pop(k)[0]) for k in keys]
+        for item in removed:
+            self._evicted(*item)
+        return len(removed)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+    def _pop_oldest(self) -> tuple:
+        key, (value, _) = self._data.popitem(last=False)
+        return key, value
+
+    def _evicted(self, key: Hashable, value: Any):
+        if self._on_evict is not None:
+            self._on_evict(key, value)
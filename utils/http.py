@@ -0,0 +1,64 @@
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+
+class RangeNotSatisfiable(Exception):
+    """Der angefragte Byte-Bereich liegt außerhalb der Ressource"""
+
+
+def parse_range_header(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Wertet einen ``Range: bytes=...`` Header aus.
+
+    Gibt (start, end) inklusive zurück oder None, wenn der Header fehlt,
+    ungültig ist oder mehrere Bereiche verlangt (dann wird laut RFC 9110
+    die ganze Ressource geliefert).
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+
+    first, sep, last = spec.strip().partition('-')
+    if not sep:
+        return None
+    try:
+        if first == '':
+            # Suffix-Range: die letzten N Bytes
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            start, end = max(0, size - length), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if start < 0 or start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Prüft einen If-None-Match Header gegen ein (starkes) ETag"""
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def iter_file_range(f: BinaryIO, start: int, length: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Liest einen Bereich einer Datei chunkweise und schließt sie danach"""
+    try:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
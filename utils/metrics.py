@@ -0,0 +1,41 @@
+import threading
+from typing import Dict
+
+
+class MetricsRegistry:
+    """Einfache In-Process-Metriken (Zähler, Gauges, Summaries)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._summaries: Dict[str, Dict[str, float]] = {}
+
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        """Erfasst einen Messwert (z.B. Wartezeit in Sekunden)"""
+        with self._lock:
+            summary = self._summaries.setdefault(
+                name, {"count": 0, "sum": 0.0, "max": 0.0}
+            )
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["max"] = max(summary["max"], value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "summaries": {k: dict(v) for k, v in self._summaries.items()}
+            }
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,21 @@
+from datetime import datetime
+from typing import Tuple
+import base64
+import json
+
+from fastapi import HTTPException
+
+
+def encode_cursor(created_at: datetime, item_id: str) -> str:
+    """Kodiert eine Keyset-Position (created_at, id) als opaken Cursor"""
+    payload = json.dumps([created_at.isoformat(), item_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), str(item_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
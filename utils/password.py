@@ -1,50 +1,130 @@
-from typing import Tuple
+from typing import Optional, Tuple
+import hashlib
+import hmac
+import os
 import re
 from zxcvbn import zxcvbn  # Entropy-basierte Passwort-Stärke-Bewertung
 
+from secure_vault.core.executors import get_password_executor
+from secure_vault.utils.cache import LRUCache
+from secure_vault.utils.metrics import metrics
+
 class PasswordValidator:
     def __init__(self, config):
         self.config = config
         # Reasonable defaults, können via config.ini überschrieben werden
-        self.min_length = config.get('min_password_length', 12)
-        self.max_length = config.get('max_password_length', 64)
-        self.min_strength_score = config.get('min_password_strength', 3)  # zxcvbn score 0-4
-        
+        self.min_length = getattr(config, 'min_password_length', 12)
+        self.max_length = getattr(config, 'max_password_length', 64)
+        self.min_strength_score = getattr(config, 'min_password_strength', 3)  # zxcvbn score 0-4
+        # Analyse-Cache: Schlüssel ist ein HMAC mit zufälligem Prozess-Key,
+        # Klartext-Passwörter landen nie im Speicher des Caches
+        self._cache_key = os.urandom(32)
+        self._cache = LRUCache(
+            maxsize=getattr(config, 'password_strength_cache_size', 1024),
+            ttl=getattr(config, 'password_strength_cache_ttl_seconds', 600.0)
+        )
+
     def validate(self, password: str) -> Tuple[bool, str]:
         """
         Validiert ein Passwort und gibt (valid, message) zurück.
         Verwendet zxcvbn für intelligente Stärkeanalyse.
         """
+        error = self._check_basics(password)
+        if error:
+            return False, error
+        return self._verdict(self._analyze(password))
+
+    async def validate_async(self, password: str) -> Tuple[bool, str]:
+        """Wie validate, zxcvbn läuft aber im Thread-Pool"""
+        error = self._check_basics(password)
+        if error:
+            return False, error
+        return self._verdict(await self.analyze_async(password))
+
+    def generate_feedback(self, password: str) -> dict:
+        """
+        Generiert hilfreiches Feedback zur Passwortstärke.
+        """
+        return self._feedback(self._analyze(password))
+
+    async def generate_feedback_async(self, password: str) -> dict:
+        """Wie generate_feedback, zxcvbn läuft aber im Thread-Pool"""
+        return self._feedback(await self.analyze_async(password))
+
+    async def analyze_async(self, password: str) -> dict:
+        """zxcvbn-Analyse im Thread-Pool, wiederholte Anfragen aus dem Cache"""
+        key = hmac.new(self._cache_key, password.encode(), hashlib.sha256).digest()
+        analysis = self._cache.get(key)
+        if analysis is not None:
+            metrics.increment("password_strength.cache_hits")
+            return analysis
+        metrics.increment("password_strength.cache_misses")
+        analysis = await get_password_executor().run(self._analyze, password)
+        self._cache.set(key, analysis)
+        return analysis
+
+    async def warmup(self):
+        """Startet den Pool und durchläuft zxcvbn einmal, damit der erste
+        Request nicht die Initialisierung bezahlt"""
+        await get_password_executor().run(self._analyze, "Warmup-Passphrase-2024!")
+
+    def _analyze(self, password: str) -> dict:
+        """Eine zxcvbn-Analyse; nur abgeleitete Werte, keine Teile des Passworts"""
+        # Längere Eingaben sind ohnehin ungültig und kosten nur Rechenzeit
+        result = zxcvbn(password[:self.max_length])
+        return {
+            'score': result['score'],
+            'guesses': result['guesses'],
+            'crack_time': result['crack_times_display']['offline_fast_hashing_1e10_per_second'],
+            'warning': result['feedback']['warning'],
+            'suggestions': list(result['feedback']['suggestions']),
+            'too_complex': self._is_too_complex(password)
+        }
+
+    def _feedback(self, analysis: dict) -> dict:
+        return {
+            'score': analysis['score'],  # 0-4
+            'estimated_guesses': analysis['guesses'],
+            'crack_time': analysis['crack_time'],
+            'warning': analysis['warning'],
+            'suggestions': analysis['suggestions'],
+            'is_complex_enough': analysis['score'] >= self.min_strength_score,
+            'is_too_complex': analysis['too_complex']
+        }
+
+    def _verdict(self, analysis: dict) -> Tuple[bool, str]:
+        """Bewertet das Ergebnis der zxcvbn-Stärkeanalyse"""
+        if analysis['score'] < self.min_strength_score:
+            suggestions = analysis['suggestions']
+            warning = analysis['warning']
+            return False, f"Password too weak: {warning}. Suggestions: {', '.join(suggestions)}"
+
+        # Spezielle Checks für zu komplexe Passwörter
+        if analysis['too_complex']:
+            return False, "Password is too complex for practical use. Please simplify."
+
+        return True, "Password meets requirements"
+
+    def _check_basics(self, password: str) -> Optional[str]:
+        """Günstige Prüfungen vor zxcvbn; Fehlermeldung oder None"""
         # Basis-Checks
         if len(password) < self.min_length:
-            return False, f"Password must be at least {self.min_length} characters long"
+            return f"Password must be at least {self.min_length} characters long"
             
         if len(password) > self.max_length:
-            return False, f"Password cannot be longer than {self.max_length} characters"
+            return f"Password cannot be longer than {self.max_length} characters"
             
         # Check auf einfache Muster
         if password.isdigit():
-            return False, "Password cannot contain only numbers"
+            return "Password cannot contain only numbers"
             
         if password.isalpha():
-            return False, "Password must contain at least one number"
+            return "Password must contain at least one number"
             
         if password.islower() or password.isupper():
-            return False, "Password must contain mixed case letters"
-            
-        # Intelligente Stärkeanalyse mit zxcvbn
-        result = zxcvbn(password)
-        
-        if result['score'] < self.min_strength_score:
-            suggestions = result['feedback']['suggestions']
-            warning = result['feedback']['warning']
-            return False, f"Password too weak: {warning}. Suggestions: {', '.join(suggestions)}"
-            
-        # Spezielle Checks für zu komplexe Passwörter
-        if self._is_too_complex(password):
-            return False, "Password is too complex for practical use. Please simplify."
-            
-        return True, "Password meets requirements"
+            return "Password must contain mixed case letters"
+
+        return None
         
     def _is_too_complex(self, password: str) -> bool:
         """
@@ -81,22 +161,6 @@ class PasswordValidator:
             
         return False
 
-    def generate_feedback(self, password: str) -> dict:
-        """
-        Generiert hilfreiches Feedback zur Passwortstärke.
-        """
-        result = zxcvbn(password)
-        
-        return {
-            'score': result['score'],  # 0-4
-            'estimated_guesses': result['guesses'],
-            'crack_time': result['crack_times_display']['offline_fast_hashing_1e10_per_second'],
-            'warning': result['feedback']['warning'],
-            'suggestions': result['feedback']['suggestions'],
-            'is_complex_enough': result['score'] >= self.min_strength_score,
-            'is_too_complex': self._is_too_complex(password)
-        }
-
     def get_requirements(self) -> str:
         """
         Gibt eine benutzerfreundliche Beschreibung der Anforderungen zurück.